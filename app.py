@@ -9,39 +9,51 @@ from flask_restful import Api
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import or_, func, case, desc, union_all, and_
 from sqlalchemy.orm import joinedload, undefer
+from sqlalchemy.engine import make_url
 from dotenv import load_dotenv
 import boto3
-from openai import OpenAI
+from botocore.config import Config as BotoConfig
 import mimetypes
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import re # Import regular expression module
 from flask_cors import CORS # Import CORS
-from flask_limiter import Limiter # Import Limiter
-from flask_limiter.util import get_remote_address # Import default key function
 
 # Import extensions and models AFTER defining configurations
-from extensions import db, login_manager, migrate
+from extensions import db, login_manager, migrate, limiter
 # Import models here if they don't depend on the app instance directly at import time
 # If models.py imports 'app', this needs further adjustment.
-from models import User, Post, Comment, FriendRequest, InviteCode, UserInterest, PostPrivacy, Ampersound, UserType
+from models import User, Post, Comment, FriendRequest, InviteCode, UserInterest, PostPrivacy, Ampersound, UserType, UPSERT_INSERTS
 
 # Import Resources AFTER defining configurations and extensions
 from resources.auth import UserRegistration, UserLogin, UserLogout
 from resources.post import PostListResource, PostResource, PostLikeResource
 from resources.comment import CommentListResource, CommentResource
-from resources.profile import ProfileResource, MyProfileResource, profile_data_fields
+from resources.profile import ProfileResource, ProfilePostsResource, MyProfileResource
 from resources.friendship import FriendRequestListResource, FriendRequestResource, FriendshipResource
 from resources.feed import FeedResource
 from resources.category import CategoryResource
 from resources.invite import InviteResource
-from resources.report import ReportResource, ReportListResource, AdminReportListResource, AdminReportActionResource
-from resources.notification import NotificationListResource, NotificationResource, UnreadCountResource
+from resources.report import ReportResource, ReportListResource, AdminReportListResource, AdminReportActionResource, AdminReportQueueResource, AdminReportQueueActionResource
+from resources.notification import NotificationListResource, NotificationResource, UnreadCountResource, NotificationStreamResource, NotificationMarkReadResource
 from resources.image_generation import ImageGenerationResource # Added import
 from resources.image_remix import ImageRemixResource # Added import for image remixing
 from resources.ampersound import AmpersoundListResource, AmpersoundResource, MyAmpersoundsResource, AmpersoundSearchResource # Added Ampersound resources
 from resources.ampersound_youtube import AmpersoundFromYoutubeResource # New resource for YouTube to Ampersound
-from resources.admin import AdminAmpersoundApprovalList, AdminAmpersoundApprovalAction # Added Admin Ampersound resources
+from resources.admin import AdminAmpersoundApprovalList, AdminAmpersoundApprovalAction, AdminAmpersoundBulkAction, AdminUserContentRestore # Added Admin Ampersound resources
+from resources.upload import UploadRequestResource, UploadConfirmResource # Presigned direct-to-storage uploads
+from resources.generation_job import GenerationJobResource # Polling for asynchronous generation/remix jobs
 from utils import generate_s3_file_url # Import the utility function
+from storage import init_storage, StorageError
+from http_clients import init_http_clients
+from disk_cache import DiskLRUCache
+from generation_jobs import init_generation_scheduler
+from user_cache import load_session_user, init_user_cache
+from events import init_event_broker
+from serializers import output_json
+from compression import compress_response
+from static_assets import init_static_assets, lookup_asset, send_asset
+from image_processing import queue_profile_picture_variants, prepare_image_for_classification
 
 # Import for password hashing if not already globally available in this scope
 from werkzeug.security import generate_password_hash
@@ -67,6 +79,42 @@ class Config:
     S3_REGION = os.environ.get("S3_REGION", "auto")
     S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
     DOMAIN_NAME_IMAGES = os.environ.get("DOMAIN_NAME_IMAGES")
+    UPLOAD_URL_EXPIRES_IN = int(os.environ.get("UPLOAD_URL_EXPIRES_IN", 900)) # Presigned PUT URL lifetime (seconds)
+    UPLOAD_CONFIRM_WINDOW = 3600 # How long after issuing a URL the upload can still be confirmed (seconds)
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") # 's3', 'local', or unset to pick S3 when credentials exist
+    LOCAL_STORAGE_ROOT = os.environ.get("LOCAL_STORAGE_ROOT") # Defaults to <instance>/storage
+    LOCAL_STORAGE_URL = os.environ.get("LOCAL_STORAGE_URL", "/storage") # Public URL prefix for locally stored files (served by /storage/<key>)
+    REMIX_SOURCE_CACHE_DIR = os.environ.get("REMIX_SOURCE_CACHE_DIR") # Defaults to <instance>/remix_source_cache
+    REMIX_SOURCE_CACHE_MAX_BYTES = int(os.environ.get("REMIX_SOURCE_CACHE_MAX_BYTES", 256 * 1024 * 1024)) # Bound for the whole cache directory, shared by all worker processes
+    GENERATION_MAX_CONCURRENCY = int(os.environ.get("GENERATION_MAX_CONCURRENCY", 4)) # Concurrent outbound generation/remix calls per process
+    GENERATION_MAX_ACTIVE_JOBS_PER_USER = 3 # Queued + running jobs allowed per user
+    GENERATION_JOB_TIMEOUT = 600 # Seconds before a queued/running job is reported as failed
+    BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 4)) # Threads for post-response work (image variants)
+    NOTIFICATION_FANOUT_INLINE_LIMIT = 200 # Comment threads larger than this notify participants in the background
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 30)) # Seconds other workers may serve a stale session user; 0 disables
+    PROFILE_HEADER_CACHE_TTL = 60 # Seconds other workers may serve a stale profile header (user fields + interests); 0 disables
+    NOTIFICATION_COUNT_TTL = 60 # Seconds a cached unread count is served without a COUNT query
+    NOTIFICATION_STREAM_HEARTBEAT = 25 # Seconds between keepalive comments on an idle event stream
+    NOTIFICATION_STREAM_RESYNC = 60 # Idle streams re-send the unread count this often (covers writes in other workers)
+    NOTIFICATION_STREAM_MAX_AGE = 600 # Streams close after this many seconds and the browser reconnects
+    # Open streams per process. Each pins one of gunicorn's request threads (Procfile: --threads 32),
+    # so keep this well below the thread count; extra clients get 503 and poll the unread count instead.
+    NOTIFICATION_STREAM_MAX_OPEN = int(os.environ.get("NOTIFICATION_STREAM_MAX_OPEN", 8))
+    NOTIFICATION_STREAM_RETRY_AFTER = 60 # Seconds a refused client waits before trying the stream again
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", 90)) # Read notifications older than this are pruned (scripts/prune_notifications.py)
+    NOTIFICATION_PRUNE_BATCH_SIZE = 1000 # Rows deleted per transaction when pruning
+    STORAGE_SWEEP_BATCH_SIZE = 1000 # Outbox keys per delete_many call (S3 DeleteObjects takes up to 1000)
+    STORAGE_DELETE_MAX_ATTEMPTS = 8 # Failed deletions are retried with backoff this many times (scripts/sweep_storage.py)
+    # Rate limit counters live in a SQLite file shared by all gunicorn workers on the host.
+    # Any Flask-Limiter storage URI works (e.g. redis://) when running on several hosts.
+    RATELIMIT_STORAGE_URI = os.environ.get("RATELIMIT_STORAGE_URI", "sqlite:///ratelimit.db")
+    RATELIMIT_HEADERS_ENABLED = True # Add rate limit headers to responses
+    LOGIN_RATE_LIMIT = os.environ.get("LOGIN_RATE_LIMIT", "10 per minute;100 per hour") # Login attempts per client IP
+    # Proxies in front of the app whose X-Forwarded-For is trusted (the Heroku router is one);
+    # without this every anonymous client has the router's address and shares one rate limit bucket
+    PROXY_FIX_X_FOR = int(os.environ.get("PROXY_FIX_X_FOR", 1))
+    COMPRESS_MIN_SIZE = 1024 # JSON responses at least this many bytes are gzip/br compressed when the client accepts it
+    COMPRESS_LEVEL = 6
 
     # Other Config
     MODEL_NAME = os.environ.get("MODEL_NAME", "google/gemma-3-4b-it")
@@ -75,6 +123,8 @@ class Config:
     DEEPINFRA_API_BASE = "https://api.deepinfra.com/v1/openai" # Centralize this
     DEEPINFRA_API_KEY = os.environ.get('DEEPINFRA_API_KEY') # Added DeepInfra API Key
     RUNWARE_API_KEY = os.environ.get('RUNWARE_API_KEY') # Added Runware API Key for image remixing
+    CLASSIFIER_IMAGE_MAX_EDGE = 896 # Gemma 3 vision input resolution; larger images are downscaled before classification
+    CLASSIFIER_IMAGE_QUALITY = 85
 
     @staticmethod
     def init_app(app):
@@ -104,6 +154,9 @@ class TestingConfig(Config):
     # Disable external services for testing if possible
     S3_BUCKET = None
     OPENAI_API_KEY = None
+    BACKGROUND_TASKS_EAGER = True # Run background tasks inline so tests see their results
+    RATELIMIT_STORAGE_URI = "memory://"
+    RATELIMIT_ENABLED = False # Test clients share one IP; limits are covered by tests/test_rate_limiting.py
 
 # Define production configuration
 class ProductionConfig(Config):
@@ -165,13 +218,13 @@ class GemmaClassification:
         self.model = app_config.get('MODEL_NAME')
         self.openai_api_key = app_config.get('OPENAI_API_KEY')
         self.deepinfra_api_base = app_config.get('DEEPINFRA_API_BASE')
+        self.image_max_edge = app_config.get('CLASSIFIER_IMAGE_MAX_EDGE', 896)
+        self.image_quality = app_config.get('CLASSIFIER_IMAGE_QUALITY', 85)
 
-        # Initialize OpenAI client only if API key is available
-        if self.openai_api_key and self.deepinfra_api_base:
-             self.openai_client = OpenAI(
-                api_key=self.openai_api_key,
-                base_url=self.deepinfra_api_base,
-             )
+        # Use the app's shared, pooled client only if API key is available
+        http_clients = app_config.get('HTTP_CLIENTS')
+        if self.openai_api_key and self.deepinfra_api_base and http_clients:
+             self.openai_client = http_clients.openai('deepinfra', api_key=self.openai_api_key, base_url=self.deepinfra_api_base)
              print(f"INFO: OpenAI client initialized for model {self.model}")
         else:
              self.openai_client = None
@@ -261,6 +314,9 @@ class GemmaClassification:
         print(f"INFO: Classifying image of size {len(image_data)} bytes...")
         
         try:
+            # Downscale to the model's input resolution before encoding; the full upload is not needed
+            image_data, content_type = prepare_image_for_classification(image_data, self.image_max_edge, self.image_quality)
+
             # Encode the image data to base64
             base64_image = base64.b64encode(image_data).decode('utf-8')
             
@@ -269,7 +325,7 @@ class GemmaClassification:
                 {"role": "system", "content": "You are a classifier that analyzes images and returns results only as a valid JSON object."},
                 {"role": "user", "content": [
                     {"type": "text", "text": self.prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                    {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{base64_image}"}}
                 ]}
             ]
             
@@ -293,6 +349,10 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
 
         config[config_name].init_app(app) # Call static init_app if defined
 
+        # Client IPs (rate limits, logs) come from the trusted proxy's X-Forwarded-For
+        if app.config.get('PROXY_FIX_X_FOR'):
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
         # Initialize CORS
         # Adjust origins and supports_credentials as needed for your setup.
         # FRONTEND_URL should be in your .env file, e.g., FRONTEND_URL=http://localhost:5173
@@ -302,24 +362,23 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
         print(f"INFO: App created with config: {config_name}")
         print(f"INFO: Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
 
+        # Counters, quotas and the storage outbox rely on ON CONFLICT upserts
+        backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        if backend not in UPSERT_INSERTS:
+            raise RuntimeError(f"Unsupported database '{backend}': use PostgreSQL or SQLite.")
+
         # Initialize extensions with the app instance
         db.init_app(app)
         login_manager.init_app(app)
         migrate.init_app(app, db)
 
-        # Initialize Flask-Limiter
-        limiter = Limiter(
-            get_remote_address, # Use the client's IP address as the key
-            app=app,
-            default_limits=["20000 per day", "5000 per hour"], # Default limits for all routes (optional)
-            storage_uri="memory://", # Use in-memory storage (consider Redis/Memcached for production)
-            # strategy="fixed-window" # Optional: Define strategy (fixed-window, moving-window)
-        )
-        app.config['RATELIMIT_HEADERS_ENABLED'] = True # Add rate limit headers to responses
+        # Initialize Flask-Limiter (storage from RATELIMIT_STORAGE_URI)
+        limiter.init_app(app)
         app.config['limiter'] = limiter # Store limiter instance in app config for access elsewhere
 
         # Initialize Flask-Restful AFTER app is created
         api = Api(app)
+        api.representation('application/json')(output_json) # orjson-encoded responses
 
         # Configure Flask-Login
         login_manager.init_app(app)
@@ -333,7 +392,7 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
 
         @login_manager.user_loader
         def load_user(user_id):
-            return db.session.get(User, int(user_id))
+            return load_session_user(int(user_id))
 
         # Initialize S3 client if config is present
         s3_client = None
@@ -343,13 +402,58 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
                 aws_access_key_id=app.config['S3_KEY'],
                 aws_secret_access_key=app.config['S3_SECRET'],
                 region_name=app.config['S3_REGION'],
+                config=BotoConfig(signature_version='s3v4'), # Required for presigned URLs on R2
             )
             app.config['S3_CLIENT'] = s3_client
             print(f"INFO: S3 Client initialized for bucket {app.config['S3_BUCKET']} in region {app.config['S3_REGION']} (Config: {config_name})")
         else:
             app.config['S3_CLIENT'] = None
-            print(f"WARN: S3 credentials not found or disabled for config '{config_name}'. Image upload may be limited.")
+            print(f"WARN: S3 credentials not found or disabled for config '{config_name}'. Falling back to local storage unless STORAGE_BACKEND is set.")
 
+        storage = init_storage(app, s3_client)
+
+        if storage.name == 'local':
+            # Serve local objects and accept presigned uploads, standing in for the bucket.
+            @app.route('/storage/<path:key>', methods=['GET', 'PUT'])
+            def local_storage_object(key):
+                try:
+                    path = storage.file_path(key)
+                except StorageError:
+                    return jsonify({"message": "Not found."}), 404
+
+                if request.method == 'PUT':
+                    claims = storage.verify_put_token(request.args.get('token', ''), key)
+                    if not claims:
+                        return jsonify({"message": "Upload URL is invalid or has expired."}), 403
+                    content_type = (request.content_type or '').lower()
+                    if content_type != claims['content_type'] or request.content_length != claims['size']:
+                        return jsonify({"message": "Upload does not match the signed content type and size."}), 400
+                    storage.put_stream(key, request.stream, content_type)
+                    return '', 200
+
+                meta = storage.head(key)
+                if not meta:
+                    return jsonify({"message": "Not found."}), 404
+                return send_from_directory(storage.root, key, mimetype=meta['content_type'], max_age=3600)
+
+
+        # Long-lived pooled HTTP clients for DeepInfra, Runware and image downloads
+        init_http_clients(app)
+
+        # Fair per-user queue for image generation/remix calls, capped at GENERATION_MAX_CONCURRENCY
+        init_generation_scheduler(app)
+        init_user_cache(app)
+        # In-process pub/sub behind the notification event stream
+        init_event_broker(app)
+        # Manifest of the built frontend and its precompressed variants
+        init_static_assets(app)
+        app.after_request(compress_response)
+
+        # Local LRU cache of remix source images read from storage
+        app.config['REMIX_SOURCE_CACHE'] = DiskLRUCache(
+            app.config.get('REMIX_SOURCE_CACHE_DIR') or os.path.join(app.instance_path, 'remix_source_cache'),
+            app.config.get('REMIX_SOURCE_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        )
 
         # Initialize GemmaClassification and store in app.config
         # It now takes the already populated app.config
@@ -367,6 +471,7 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
         api.add_resource(CommentListResource, '/api/v1/posts/<int:post_id>/comments')
         api.add_resource(CommentResource, '/api/v1/comments/<int:comment_id>')
         api.add_resource(ProfileResource, '/api/v1/profiles/<string:username>')
+        api.add_resource(ProfilePostsResource, '/api/v1/profiles/<string:username>/posts')
         api.add_resource(FriendRequestListResource, '/api/v1/friend-requests')
         api.add_resource(FriendRequestResource, '/api/v1/friend-requests/<int:request_id>')
         api.add_resource(FriendshipResource, '/api/v1/friendships/<int:user_id>')
@@ -374,20 +479,32 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
         api.add_resource(CategoryResource, '/api/v1/categories/<string:category_name>/posts')
         api.add_resource(InviteResource, '/api/v1/invites', '/api/v1/invites/<string:code>')
         api.add_resource(ReportResource, '/api/v1/reports')
+        api.add_resource(ReportListResource, '/api/v1/reports/mine')
+        api.add_resource(AdminReportListResource, '/api/v1/admin/reports')
+        api.add_resource(AdminReportQueueResource, '/api/v1/admin/reports/queue')
+        api.add_resource(AdminReportQueueActionResource, '/api/v1/admin/reports/queue/<string:content_type>/<int:content_id>')
+        api.add_resource(AdminReportActionResource, '/api/v1/admin/reports/<int:report_id>')
         api.add_resource(NotificationListResource, '/api/v1/notifications')
         api.add_resource(NotificationResource, '/api/v1/notifications/<int:notif_id>')
         api.add_resource(UnreadCountResource, '/api/v1/notifications/unread_count')
+        api.add_resource(NotificationStreamResource, '/api/v1/notifications/stream') # Server-Sent Events
+        api.add_resource(NotificationMarkReadResource, '/api/v1/notifications/read') # Bulk mark-read
         api.add_resource(ImageGenerationResource, '/api/v1/generate_image') # Added route for image generation
         api.add_resource(ImageRemixResource, '/api/v1/remix_image') # Added route for image remixing
+        api.add_resource(GenerationJobResource, '/api/v1/generation_jobs/<string:job_id>') # Poll generation/remix jobs
         api.add_resource(AmpersoundListResource, '/api/v1/ampersounds')
         api.add_resource(AmpersoundFromYoutubeResource, '/api/v1/ampersounds/from_youtube') # New route for YouTube to Ampersound
         api.add_resource(AmpersoundResource, '/api/v1/ampersounds/<int:sound_id>', '/api/v1/ampersounds/<string:username>/<string:sound_name>')
         api.add_resource(MyAmpersoundsResource, '/api/v1/ampersounds/my')
         api.add_resource(AmpersoundSearchResource, '/api/v1/ampersounds/search')
+        api.add_resource(UploadRequestResource, '/api/v1/uploads')
+        api.add_resource(UploadConfirmResource, '/api/v1/uploads/<string:upload_id>/confirm')
 
         # Add Admin Ampersound Approval Resources
         api.add_resource(AdminAmpersoundApprovalList, '/api/v1/admin/ampersounds/pending')
         api.add_resource(AdminAmpersoundApprovalAction, '/api/v1/admin/ampersounds/<int:ampersound_id>/action')
+        api.add_resource(AdminAmpersoundBulkAction, '/api/v1/admin/ampersounds/bulk-action')
+        api.add_resource(AdminUserContentRestore, '/api/v1/admin/users/<int:user_id>/restore-content')
 
 
         # --- Manually add routes for MyProfileResource --- 
@@ -397,20 +514,14 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
         @app.route('/api/v1/profiles/me', methods=['GET'])
         @login_required
         def get_my_profile():
-            # Manually call the resource's get method
-            # Note: marshal_with won't apply automatically, but resource method returns dict.
-            # Return data with default 200 status.
-            response_data = my_profile_view.get()
-            return jsonify(response_data), 200
+            # Manually call the resource's get method; it returns the response (with ETag) itself
+            return my_profile_view.get()
 
         @app.route('/api/v1/profiles/me', methods=['PATCH'])
         @login_required
         def patch_my_profile():
-            # Manually call the resource's patch method
-            # Note: marshal_with won't apply automatically, resource method returns dict.
-            # Return data with default 200 status.
-            response_data = my_profile_view.patch()
-            return jsonify(response_data), 200
+            # Manually call the resource's patch method; it returns the response itself
+            return my_profile_view.patch()
 
         # --- Method Override (can stay as is) ---
         @app.before_request
@@ -424,30 +535,20 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
         @app.route('/')
         @app.route('/<path:path>')
         def serve_react_app(path=None): # Optional path parameter
-            # Ensure os is available (it's imported at the top of app.py)
-            # Ensure send_from_directory is available (imported from flask at the top)
-            
-            # app.static_folder is 'frontend/dist'
-            # app.root_path is the absolute path to the directory where app.py is.
-            static_dir_abs = os.path.join(app.root_path, app.static_folder)
-
-            if path:
-                # Check if the requested path corresponds to an existing file
-                # in the static directory (e.g., /assets/main.js -> PROJECT_ROOT/frontend/dist/assets/main.js)
-                requested_file_abs = os.path.join(static_dir_abs, path)
-                # Ensure it's a file and not a directory to prevent issues
-                if os.path.exists(requested_file_abs) and os.path.isfile(requested_file_abs):
-                    # send_from_directory uses app.static_folder (which is 'frontend/dist')
-                    # and correctly resolves it relative to app.root_path.
-                    return send_from_directory(app.static_folder, path)
-            
+            # Files of frontend/dist come from the manifest built at startup (no filesystem checks per request);
+            # e.g. /assets/main-<hash>.js -> PROJECT_ROOT/frontend/dist/assets/main-<hash>.js
+            asset = lookup_asset(path) if path else None
+            if asset is not None:
+                return send_asset(asset)
+
             # If 'path' is None (root URL /) or if 'path' does not point to an existing file,
             # serve the index.html for client-side routing.
-            index_html_abs = os.path.join(static_dir_abs, 'index.html')
-            if os.path.exists(index_html_abs): # index.html must be a file
-                return send_from_directory(app.static_folder, 'index.html')
+            index = lookup_asset('index.html')
+            if index is not None:
+                return send_asset(index)
             else:
                 # Fallback if index.html itself is missing, with more detailed logging
+                index_html_abs = os.path.join(app.root_path, app.static_folder, 'index.html')
                 app.logger.error(f"CRITICAL: index.html not found at {index_html_abs} (app.static_folder='{app.static_folder}', app.root_path='{app.root_path}')")
                 return jsonify({"error": "React app not found. Build the frontend first.", "detail": f"Looked for index.html at {index_html_abs}"}), 404
 
@@ -473,29 +574,26 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
             if not file.content_type.startswith('image/'):
                 return jsonify({"message": "File must be an image"}), 400
 
-            s3_client = app.config.get('S3_CLIENT')
-            if file and s3_client:
+            storage = app.config.get('STORAGE')
+            if file and storage:
                 try:
                     # Generate a filename with user ID to ensure uniqueness
                     filename = secure_filename(file.filename)
                     # Extract extension
                     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
                     s3_filename = f"profile_pictures/{current_user.id}/{uuid.uuid4()}.{ext}"
-                    s3_bucket = app.config['S3_BUCKET']
-
-                    s3_client.upload_fileobj(
-                        file,
-                        s3_bucket,
-                        s3_filename,
-                        ExtraArgs={'ContentType': file.content_type}
-                    )
+
+                    storage.put_stream(s3_filename, file, file.content_type)
                     
                     # Generate file URL using the utility function
                     file_url = generate_s3_file_url(app.config, s3_filename)
                     
-                    # Update user's profile_picture field
-                    current_user.profile_picture = file_url
+                    # Update user's profile_picture field; resized versions are rendered in the background
+                    user = current_user.record()
+                    user.profile_picture = file_url
+                    user.profile_picture_variants = None
                     db.session.commit()
+                    queue_profile_picture_variants(current_user.id, s3_filename)
                     
                     return jsonify({
                         "message": "Profile picture updated successfully",
@@ -503,10 +601,10 @@ def create_app(config_name='default', overrides=None): # Add overrides parameter
                     }), 200
                     
                 except Exception as e:
-                    app.logger.error(f"Error uploading profile picture to S3: {e}")
-                    return jsonify({"message": "Error uploading file to S3."}), 500
-            elif not s3_client:
-                return jsonify({"message": "File storage (S3) is not configured on the server."}), 500
+                    app.logger.error(f"Error uploading profile picture to storage: {e}")
+                    return jsonify({"message": "Error uploading file to storage."}), 500
+            elif not storage:
+                return jsonify({"message": "File storage is not configured on the server."}), 500
             else:
                 return jsonify({"message": "Invalid file."}), 400
             
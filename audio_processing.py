@@ -0,0 +1,125 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from array import array
+
+# Normalized output format for stored ampersounds. AAC in an MP4 container plays
+# natively in every browser we support, and +faststart moves the index to the front
+# of the file so playback can begin before the whole clip has downloaded.
+NORMALIZED_AUDIO_EXTENSION = '.m4a'
+NORMALIZED_AUDIO_CONTENT_TYPE = 'audio/mp4'
+
+# Sample rate used for the analysis (waveform/duration) decode. Low on purpose:
+# we only need the envelope, not the audio itself.
+ANALYSIS_SAMPLE_RATE = 8000
+
+
+def ffmpeg_available():
+    """Returns True if the ffmpeg binary can be found on PATH."""
+    return shutil.which('ffmpeg') is not None
+
+
+def compute_waveform_peaks(pcm_data, buckets=64):
+    """
+    Builds a compact waveform summary from signed 16-bit mono PCM.
+    Returns a list of `buckets` integers between 0 and 100 (peak amplitude per bucket),
+    or an empty list if there is no audio.
+    """
+    samples = array('h')
+    samples.frombytes(pcm_data[:len(pcm_data) - (len(pcm_data) % 2)])
+    if not samples or buckets <= 0:
+        return []
+
+    bucket_size = max(1, len(samples) // buckets)
+    peaks = []
+    for start in range(0, bucket_size * buckets, bucket_size):
+        chunk = samples[start:start + bucket_size]
+        if not chunk:
+            peaks.append(0)
+            continue
+        peak = max(max(chunk), -min(chunk))
+        peaks.append(peak)
+
+    loudest = max(peaks) or 1
+    return [round(p * 100 / loudest) for p in peaks]
+
+
+def normalize_audio(source_path, app_config=None):
+    """
+    Transcodes an audio file into the compact normalized ampersound format
+    (loudness-normalized AAC/m4a) and extracts its duration and waveform summary.
+
+    Input: path to the source file (any container/codec ffmpeg understands).
+    Returns: dict with 'data' (bytes), 'content_type', 'extension', 'duration_ms' and
+    'waveform', or None if ffmpeg is unavailable or the transcode fails.
+    """
+    app_config = app_config or {}
+    if not app_config.get('AMPERSOUND_TRANSCODE', True):
+        return None
+    if not ffmpeg_available():
+        print("WARN: ffmpeg not found on PATH. Ampersound will be stored without normalization.")
+        return None
+
+    bitrate = app_config.get('AMPERSOUND_AUDIO_BITRATE', '64k')
+    loudness = app_config.get('AMPERSOUND_LOUDNESS_TARGET', -16)
+    waveform_buckets = app_config.get('AMPERSOUND_WAVEFORM_BUCKETS', 64)
+    loudnorm_filter = f"loudnorm=I={loudness}:TP=-1.5:LRA=11"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output_path = os.path.join(tmpdir, f"normalized{NORMALIZED_AUDIO_EXTENSION}")
+        pcm_path = os.path.join(tmpdir, 'analysis.pcm')
+
+        # One ffmpeg run, two outputs: the normalized file we store, and a low-rate
+        # mono PCM stream of the same normalized signal used for duration/waveform.
+        ffmpeg_command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', source_path,
+            '-vn', '-af', loudnorm_filter, '-ac', '1', '-ar', '44100',
+            '-c:a', 'aac', '-b:a', bitrate, '-movflags', '+faststart',
+            output_path,
+            '-vn', '-af', loudnorm_filter, '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE),
+            '-f', 's16le', pcm_path,
+        ]
+        try:
+            process = subprocess.run(ffmpeg_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"ERROR: ffmpeg failed to run for audio normalization: {e}")
+            return None
+
+        if process.returncode != 0 or not os.path.exists(output_path):
+            print(f"ERROR: ffmpeg audio normalization failed: {process.stderr.decode('utf-8', 'ignore')[:500]}")
+            return None
+
+        with open(output_path, 'rb') as f:
+            normalized_data = f.read()
+        pcm_data = b''
+        if os.path.exists(pcm_path):
+            with open(pcm_path, 'rb') as f:
+                pcm_data = f.read()
+
+    if not normalized_data:
+        print("ERROR: ffmpeg produced an empty normalized audio file.")
+        return None
+
+    return {
+        'data': normalized_data,
+        'content_type': NORMALIZED_AUDIO_CONTENT_TYPE,
+        'extension': NORMALIZED_AUDIO_EXTENSION,
+        'duration_ms': int(len(pcm_data) / 2 * 1000 / ANALYSIS_SAMPLE_RATE),
+        'waveform': compute_waveform_peaks(pcm_data, waveform_buckets),
+    }
+
+
+def normalize_audio_upload(file_storage, app_config=None):
+    """
+    Convenience wrapper around normalize_audio for werkzeug FileStorage uploads.
+    Leaves the upload's stream rewound so the caller can fall back to storing the original.
+    """
+    suffix = os.path.splitext(file_storage.filename or '')[1] or '.audio'
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        file_storage.seek(0)
+        shutil.copyfileobj(file_storage, tmp)
+        tmp.flush()
+        file_storage.seek(0)
+        return normalize_audio(tmp.name, app_config)
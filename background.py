@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+# Shared worker pool for post-response work (image derivatives, etc.).
+# Created lazily so importing this module never starts threads.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='background')
+        return _executor
+
+
+def _run_in_app_context(app, fn, args, kwargs):
+    with app.app_context():
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            app.logger.error(f"Background task {fn.__name__} failed: {e}")
+            raise
+
+
+def submit_task(fn, *args, **kwargs):
+    """
+    Runs fn(*args, **kwargs) on the background worker pool inside an app context.
+    Must be called from within an app/request context. Pass ids, not ORM objects:
+    the task runs in its own session. With BACKGROUND_TASKS_EAGER (tests) the task
+    runs synchronously before returning. Returns a Future, or None when run eagerly.
+    """
+    app = current_app._get_current_object()
+    if app.config.get('BACKGROUND_TASKS_EAGER'):
+        try:
+            _run_in_app_context(app, fn, args, kwargs)
+        except Exception:
+            pass # Already logged; eager mode mirrors fire-and-forget semantics
+        return None
+    executor = _get_executor(app.config.get('BACKGROUND_WORKERS', 4))
+    return executor.submit(_run_in_app_context, app, fn, args, kwargs)
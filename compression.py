@@ -0,0 +1,62 @@
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError: # brotli is optional; without it responses are compressed with gzip only
+    brotli = None
+
+# Content-Encoding -> suffix of the precompressed file written by the frontend build
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+DEFAULT_COMPRESS_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+
+def preferred_encoding(available):
+    """
+    The best of the `available` content codings the client accepts (Accept-Encoding),
+    brotli before gzip, or None for the identity encoding.
+    """
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def _compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compress_response(response):
+    """
+    after_request hook: compresses JSON responses of at least COMPRESS_MIN_SIZE bytes
+    when the client accepts br (if the brotli package is installed) or gzip.
+    Streamed responses (the notification stream) and files are left alone.
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    config = current_app.config
+    body = response.get_data()
+    if len(body) < config.get('COMPRESS_MIN_SIZE', DEFAULT_COMPRESS_MIN_SIZE):
+        return response
+    encoding = preferred_encoding(('br', 'gzip') if brotli is not None else ('gzip',))
+    if encoding is None:
+        return response
+
+    response.set_data(_compress(body, encoding, config.get('COMPRESS_LEVEL', DEFAULT_COMPRESS_LEVEL)))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True) # Same content, different bytes
+    return response
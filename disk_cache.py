@@ -0,0 +1,103 @@
+import os
+import time
+import hashlib
+import threading
+
+
+class DiskLRUCache:
+    """
+    Bounded least-recently-used cache of byte blobs on local disk.
+    Entries are files named by the SHA-256 of their key; a file's mtime is its last use,
+    set on every write and hit. The directory itself is the index: eviction rescans it,
+    so the cache survives restarts and max_bytes bounds the whole directory even when
+    several processes (gunicorn workers) share it.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._last_used_ns = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.root, name)) # Leftover from an interrupted write
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._evict()
+
+    def _filename(self, key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _touch(self, path):
+        # Strictly increasing within this process, so uses in the same clock tick keep their order
+        with self._lock:
+            self._last_used_ns = max(time.time_ns(), self._last_used_ns + 1)
+            stamp = self._last_used_ns
+        os.utime(path, ns=(stamp, stamp))
+
+    def _scan(self):
+        """(mtime_ns, name, size) of every entry, including other processes' writes."""
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp'):
+                    continue # Another process is still writing it
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # Evicted by another process meanwhile
+                    continue
+                entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # Caller holds the lock
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get(self, key):
+        """Returns the cached bytes for `key`, or None."""
+        path = os.path.join(self.root, self._filename(key))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._touch(path)
+        except FileNotFoundError: # Never cached, or evicted by any process
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Stores `data` under `key`, evicting least recently used entries to stay within max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        path = os.path.join(self.root, self._filename(key))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        try:
+            self._touch(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._evict()
+
+    @property
+    def size_bytes(self):
+        return sum(size for _, _, size in self._scan())
@@ -0,0 +1,39 @@
+import hashlib
+import json
+
+from flask import current_app, request
+from werkzeug.http import quote_etag
+
+# Clients may keep responses but must revalidate them; a matching ETag gets an empty 304.
+REVALIDATE = 'private, no-cache'
+
+
+def compute_etag(*parts):
+    """
+    An ETag over everything a response body depends on: row ids and versions
+    (updated_at, counts, author fields), query arguments, cursors. Computed from
+    rows already loaded for the response, so checking it costs no extra queries
+    and happens before rendering and marshalling.
+    """
+    payload = json.dumps(parts, default=str, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def etag_headers(etag):
+    """Headers for a full response carrying `etag`; return them as the third tuple item of a resource."""
+    return {'ETag': quote_etag(etag), 'Cache-Control': REVALIDATE}
+
+
+def not_modified(etag):
+    """An empty 304 response if the request's If-None-Match matches `etag`, otherwise None."""
+    # Weak comparison: compressed responses carry the weak form of the ETag (see compression.py)
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return current_app.response_class(status=304, headers=etag_headers(etag))
+
+
+def author_version(user):
+    """The author fields embedded in post, comment and ampersound responses."""
+    if user is None:
+        return None
+    return (user.id, user.username, user.profile_picture, user.profile_picture_variants)
@@ -0,0 +1,147 @@
+import json
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, Notification
+
+
+class EventBroker:
+    """
+    In-process publish/subscribe of per-user events for the notification stream,
+    plus a cache of each user's unread notification count.
+    Every open stream (browser tab) has its own bounded queue; a subscriber that stops
+    reading loses events rather than blocking the publisher. Only streams served by this
+    process receive its events, so streams also re-read the unread count periodically
+    (see NOTIFICATION_STREAM_RESYNC) to pick up writes made by other workers.
+    Each stream holds a request thread for its whole life, so at most `max_streams`
+    are open at once; the rest of the thread pool stays free for API requests.
+    """
+
+    def __init__(self, count_ttl, max_queue=100, max_streams=None):
+        self.count_ttl = count_ttl
+        self.max_queue = max_queue
+        self.max_streams = max_streams
+        self._stream_count = 0
+        self._subscribers = {} # user_id -> set of queues
+        self._counts = {} # user_id -> (expires_at, unread count)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """A queue of the user's events, or None if max_streams streams are already open."""
+        events = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.max_streams is not None and self._stream_count >= self.max_streams:
+                return None
+            self._stream_count += 1
+            self._subscribers.setdefault(user_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None and events in subscribers:
+                self._stream_count -= 1
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscribed(self, user_ids):
+        """The subset of user_ids with at least one open stream in this process."""
+        with self._lock:
+            return [user_id for user_id in user_ids if user_id in self._subscribers]
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for events in subscribers:
+            try:
+                events.put_nowait((event, data))
+            except queue.Full:
+                pass # Stalled stream; its next unread_count event or resync brings it up to date
+
+    def cached_count(self, user_id):
+        entry = self._counts.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def store_count(self, user_id, count):
+        with self._lock:
+            self._counts[user_id] = (time.monotonic() + self.count_ttl, count)
+
+    def forget_count(self, user_id):
+        with self._lock:
+            self._counts.pop(user_id, None)
+
+
+def init_event_broker(app):
+    """Creates the broker for notification streams (app.config['EVENT_BROKER'])."""
+    broker = EventBroker(app.config.get('NOTIFICATION_COUNT_TTL', 60), max_streams=app.config.get('NOTIFICATION_STREAM_MAX_OPEN'))
+    app.config['EVENT_BROKER'] = broker
+    return broker
+
+
+def _broker():
+    return current_app.config.get('EVENT_BROKER')
+
+
+def _count_unread(user_ids):
+    rows = (
+        db.session.query(Notification.user_id, func.count(Notification.id))
+        .filter(Notification.user_id.in_(user_ids), Notification.is_read == False)
+        .group_by(Notification.user_id)
+        .all()
+    )
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(rows)
+    return counts
+
+
+def unread_count(user_id, refresh=False):
+    """The user's unread notification count, from the cache when fresh (at most one COUNT per TTL)."""
+    broker = _broker()
+    if broker is None:
+        return _count_unread([user_id])[user_id]
+    count = None if refresh else broker.cached_count(user_id)
+    if count is None:
+        count = _count_unread([user_id])[user_id]
+        broker.store_count(user_id, count)
+    return count
+
+
+def publish_unread_counts(user_ids):
+    """
+    Call after committing a change to these users' notifications. Users with an open
+    stream get their new count pushed (one grouped COUNT for all of them); the cached
+    count of everyone else is dropped and recomputed on next use.
+    """
+    broker = _broker()
+    if broker is None or not user_ids:
+        return
+    user_ids = set(user_ids)
+    listening = broker.subscribed(user_ids)
+    for user_id in user_ids.difference(listening):
+        broker.forget_count(user_id)
+    if not listening:
+        return
+    for user_id, count in _count_unread(listening).items():
+        broker.store_count(user_id, count)
+        broker.publish(user_id, 'unread_count', {'unread_count': count})
+
+
+def publish_new_notification(user_ids, data):
+    """Pushes a 'notification' event (a small dict, e.g. post and comment ids) to these users' streams."""
+    broker = _broker()
+    if broker is None:
+        return
+    for user_id in broker.subscribed(user_ids):
+        broker.publish(user_id, 'notification', data)
+
+
+def format_sse(event, data):
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -5,7 +5,7 @@ from sqlalchemy import event
 from sqlalchemy.engine import Engine
 import sqlite3
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from rate_limiting import rate_limit_key # Also registers the sqlite:// rate limit storage
 
 db = SQLAlchemy()
 login_manager = LoginManager()
@@ -13,7 +13,7 @@ migrate = Migrate()
 
 # Define limiter instance globally but initialize it later with the app
 limiter = Limiter(
-    key_func=get_remote_address,
+    key_func=rate_limit_key,
     # You might want to adjust default limits or remove them
     # if you prefer defining all limits where they are used.
     default_limits=["20000 per day", "5000 per hour"] 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import {
   BrowserRouter as Router,
   Routes,
@@ -26,25 +26,9 @@ import './hooks/Autocomplete.css'; // Import autocomplete styles
 import Spinner from './components/Spinner'; // Import Spinner
 
 function App() {
-  const { currentUser, loading, logout } = useAuth(); // Get user and logout
-  const [unreadCount, setUnreadCount] = useState(0);
+  const { currentUser, loading, logout, unreadCount } = useAuth(); // Get user, logout and the pushed unread count
   const [isNavOpen, setIsNavOpen] = useState(false); // State for mobile nav
 
-  // Fetch unread notifications count when user logs in
-  useEffect(() => {
-    async function fetchUnread() {
-      try {
-        const resp = await fetch('/api/v1/notifications/unread_count', { credentials: 'include' });
-        if (!resp.ok) return;
-        const data = await resp.json();
-        setUnreadCount(data.unread_count || 0);
-      } catch (err) {
-        console.error('Failed to fetch unread count', err);
-      }
-    }
-    if (currentUser) fetchUnread();
-  }, [currentUser]);
-
   // Handle logout directly in nav for simplicity here
   const handleLogout = async () => {
     await logout();
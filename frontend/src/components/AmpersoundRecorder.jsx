@@ -1,5 +1,6 @@
 import React, { useState, useRef } from 'react';
 import './AmpersoundRecorder.css'; // Import the CSS file
+import { uploadDirect } from '../utils/directUpload';
 
 const AmpersoundRecorder = () => {
     const [isRecording, setIsRecording] = useState(false);
@@ -102,7 +103,6 @@ const AmpersoundRecorder = () => {
         setError(null);
         setSuccessMessage(null);
 
-        const formData = new FormData();
         // Determine file extension based on the recorder's actual mimeType
         const actualMimeType = mediaRecorderRef.current?.mimeType || 'audio/webm';
         let fileExtension = '.webm';
@@ -115,29 +115,17 @@ const AmpersoundRecorder = () => {
         }
         // Add more conditions if other mimeTypes are expected from the fallback chain
         
-        formData.append('audio_file', audioBlob, `${ampersoundName.trim()}${fileExtension}`);
-        formData.append('name', ampersoundName.trim());
-        formData.append('privacy', privacy);
+        const uploadFile = new File([audioBlob], `${ampersoundName.trim()}${fileExtension}`, { type: actualMimeType });
 
         try {
-            const response = await fetch('/api/v1/ampersounds', {
-                method: 'POST',
-                body: formData,
-                credentials: 'include' 
-            });
-
-            const data = await response.json();
-
-            if (response.ok) {
-                setSuccessMessage(`Ampersound "${ampersoundName}" saved successfully! Tag: &${ampersoundName}`);
-                setAmpersoundName('');
-                setAudioBlob(null);
-            } else {
-                setError(data.message || "Failed to save Ampersound.");
-            }
+            // Upload the recording straight to storage; confirm creates the Ampersound
+            await uploadDirect('ampersound', uploadFile, { name: ampersoundName.trim(), privacy });
+            setSuccessMessage(`Ampersound "${ampersoundName}" saved successfully! Tag: &${ampersoundName}`);
+            setAmpersoundName('');
+            setAudioBlob(null);
         } catch (err) {
             console.error("Error saving Ampersound:", err);
-            setError("An error occurred while saving the Ampersound. Please try again.");
+            setError(err.message || "An error occurred while saving the Ampersound. Please try again.");
         } finally {
             setIsLoading(false);
         }
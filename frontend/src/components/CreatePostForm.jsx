@@ -3,6 +3,7 @@ import { useAuth } from '../context/AuthContext'; // To ensure user is logged in
 import Spinner from './Spinner'; // Implied import for Spinner component
 import { useAmpersoundAutocomplete } from '../hooks/useAmpersoundAutocomplete'; // Import the custom hook
 import { FaPlay } from 'react-icons/fa'; // Import play icon for preview
+import { uploadDirect } from '../utils/directUpload';
 
 function CreatePostForm({ onPostCreated }) { // Accept callback to refresh post list
   const { currentUser } = useAuth();
@@ -99,19 +100,27 @@ function CreatePostForm({ onPostCreated }) { // Accept callback to refresh post
     const formData = new FormData();
     formData.append('content', content);
     formData.append('privacy', privacy);
-    if (imageFile) {
-      formData.append('image', imageFile);
-    }
 
     try {
-      const response = await fetch('/api/v1/posts', {
-        method: 'POST',
-        // No 'Content-Type': 'application/json' header for FormData
-        // The browser will set the correct multipart/form-data header
-        body: formData,
-      });
-
-      const data = await response.json(); // Still expect JSON response
+      let response = { ok: true };
+      let data;
+      if (imageFile) {
+        // Images go straight to storage; the confirm call creates the post
+        try {
+          data = await uploadDirect('post_image', imageFile, { content, privacy });
+        } catch (uploadErr) {
+          response = { ok: false };
+          data = { message: uploadErr.message };
+        }
+      } else {
+        response = await fetch('/api/v1/posts', {
+          method: 'POST',
+          // No 'Content-Type': 'application/json' header for FormData
+          // The browser will set the correct multipart/form-data header
+          body: formData,
+        });
+        data = await response.json(); // Still expect JSON response
+      }
 
       if (!response.ok) {
         setError(data.message || 'Failed to create post.');
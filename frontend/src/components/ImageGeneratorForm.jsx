@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { useAuth } from '../context/AuthContext';
 import Spinner from './Spinner';
+import { runGenerationJob } from '../utils/generationJobs';
 import './ImageGeneratorForm.css'; // We'll create this CSS file next
 
 function ImageGeneratorForm({ onImagePostCreated }) {
@@ -21,20 +22,8 @@ function ImageGeneratorForm({ onImagePostCreated }) {
     setLoading(true);
 
     try {
-      const response = await fetch('/api/v1/generate_image', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          // Credentials 'include' should be handled by default fetch behavior or AuthContext if needed for CSRF
-        },
-        body: JSON.stringify({ prompt }),
-      });
-
-      const data = await response.json();
-
-      if (!response.ok) {
-        throw new Error(data.message || 'Failed to generate image.');
-      }
+      // Queued server-side; resolves once the job has created the post
+      const data = await runGenerationJob('/api/v1/generate_image', { prompt });
 
       setSuccessMessage(`Image generated and posted successfully! Post ID: ${data.post_id}`);
       setPrompt(''); // Clear prompt on success
@@ -3,9 +3,19 @@ import { useAuth } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { formatToLocalDateTime, formatToLocalDate } from '../utils/dateUtils';
 
+// "alice", "alice and bob", "alice, bob and 3 others"
+function describeActors(notif) {
+  const names = (notif.actors && notif.actors.length ? notif.actors : [notif.actor]).map(a => a.username);
+  const others = Math.max(0, (notif.actor_count || names.length) - names.length);
+  if (others > 0) return `${names.join(', ')} and ${others} other${others === 1 ? '' : 's'}`;
+  if (names.length === 1) return names[0];
+  return `${names.slice(0, -1).join(', ')} and ${names[names.length - 1]}`;
+}
+
 function Notifications() {
-  const { currentUser, setUnreadCount } = useAuth(); // Assuming setUnreadCount is available from AuthContext
+  const { currentUser, setUnreadCount, latestNotification } = useAuth();
   const [notifications, setNotifications] = useState([]);
+  const [latestCursor, setLatestCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const navigate = useNavigate();
@@ -15,16 +25,19 @@ function Notifications() {
       setLoading(true);
       setError('');
       try {
-        const resp = await fetch('/api/v1/notifications', { credentials: 'include' });
+        // Unread entries are already coalesced per post by the server
+        const resp = await fetch('/api/v1/notifications?unread=true', { credentials: 'include' });
         if (!resp.ok) {
           const data = await resp.json();
           throw new Error(data.message || 'Failed to fetch notifications');
         }
         const data = await resp.json();
-        setNotifications(data);
-        // After fetching, update the unread count based on the fresh data
-        const currentUnread = data.filter(n => !n.is_read).length;
-        setUnreadCount(currentUnread);
+        setNotifications(data.notifications);
+        setLatestCursor(data.latest_cursor);
+        // The first page is the whole unread list unless more pages exist
+        if (!data.has_more) {
+          setUnreadCount(data.notifications.length);
+        }
       } catch (err) {
         console.error(err);
         setError(err.message || 'Error loading notifications');
@@ -35,7 +48,7 @@ function Notifications() {
     if (currentUser) {
       fetchNotifications();
     }
-  }, [currentUser, setUnreadCount]); // Add setUnreadCount to dependency array
+  }, [currentUser, setUnreadCount, latestNotification]); // Refetch when the stream reports a new notification
 
   const handleNotificationClick = async (notif) => {
     // Optimistically mark as read on the frontend and update count
@@ -68,6 +81,22 @@ function Notifications() {
     navigate(`/posts/${notif.post_id}`);
   };
 
+  // Marks everything listed read in one request; notifications that arrived since stay unread
+  const handleMarkAllRead = async () => {
+    try {
+      const resp = await fetch('/api/v1/notifications/read', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        credentials: 'include',
+        body: JSON.stringify({ up_to: latestCursor })
+      });
+      if (!resp.ok) throw new Error('Failed to mark notifications as read');
+      setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
+    } catch (err) {
+      console.error(err);
+    }
+  };
+
   if (loading) return <p>Loading notifications...</p>;
   if (error) return <p className="error-message">Error: {error}</p>;
 
@@ -78,6 +107,7 @@ function Notifications() {
   return (
     <div className="card">
       <h3>Notifications</h3>
+      <button type="button" onClick={handleMarkAllRead}>Mark all as read</button>
       <ul className="notifications-list">
         {unreadNotifications.map((notif) => (
           <li
@@ -86,7 +116,7 @@ function Notifications() {
             className="notification-item"
             // No need for fontWeight style as we are only showing unread
           >
-            {notif.actor.username} {notif.notification_type === 'comment' ? 'commented on your post' : notif.notification_type}
+            {describeActors(notif)} {notif.notification_type === 'comment' ? 'commented on your post' : notif.notification_type}
             <span className="notification-timestamp">
               {formatToLocalDateTime(notif.timestamp)}
             </span>
@@ -9,6 +9,8 @@ import PlayableContentViewer from './PlayableContentViewer'; // Import the new c
 import { useAmpersoundAutocomplete } from '../hooks/useAmpersoundAutocomplete'; // Import the hook
 import ReportButton from './ReportButton'; // Import the ReportButton component
 import { formatToLocalDateTime, formatToLocalDate } from '../utils/dateUtils';
+import { variantSrcSet, variantUrl } from '../utils/imageVariants';
+import { runGenerationJob } from '../utils/generationJobs';
 
 function Post({ post, onDelete }) { // Accept post object and onDelete callback
   const { currentUser } = useAuth();
@@ -16,6 +18,7 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
   const [loadingComments, setLoadingComments] = useState(false);
   const [errorComments, setErrorComments] = useState('');
   const [showComments, setShowComments] = useState(false);
+  const [nextCommentsCursor, setNextCommentsCursor] = useState(null);
   const [newCommentContent, setNewCommentContent] = useState('');
   const [postingComment, setPostingComment] = useState(false);
 
@@ -152,18 +155,27 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
   console.log(`Post ${post.id} - comments_count from API:`, post.comments_count);
 
   // Fetch comments function
-  const fetchComments = async () => {
+  // Comments are paginated oldest-first; `cursor` continues after the last page loaded
+  const fetchComments = async (cursor = null) => {
     if (!showComments) return; // Only fetch if section is open
     setLoadingComments(true);
     setErrorComments('');
     try {
-      const response = await fetch(`/api/v1/posts/${post.id}/comments`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`/api/v1/posts/${post.id}/comments${query}`);
       if (!response.ok) {
         const data = await response.json();
         throw new Error(data.message || 'Failed to fetch comments');
       }
       const data = await response.json();
-      setComments(data || []); // API returns list directly
+      const page = data.comments || [];
+      setComments(prevComments => {
+        if (!cursor) return page;
+        // A comment posted here may come back again in a later page
+        const loadedIds = new Set(prevComments.map(comment => comment.id));
+        return [...prevComments, ...page.filter(comment => !loadedIds.has(comment.id))];
+      });
+      setNextCommentsCursor(data.has_more ? data.next_cursor : null);
     } catch (error) {
       console.error("Error fetching comments:", error);
       setErrorComments(error.message || 'Could not load comments.');
@@ -255,22 +267,11 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
     setRemixError('');
     
     try {
-      const response = await fetch('/api/v1/remix_image', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        credentials: 'include',
-        body: JSON.stringify({
-          post_id: post.id,
-          prompt: remixPrompt
-        })
+      // Queued server-side; resolves once the job has created the remix post
+      const result = await runGenerationJob('/api/v1/remix_image', {
+        post_id: post.id,
+        prompt: remixPrompt
       });
-      
-      if (!response.ok) {
-        const data = await response.json();
-        throw new Error(data.message || 'Failed to remix image');
-      }
-      
-      const result = await response.json();
       console.log('Image remixed successfully:', result);
       
       // Close modal and reset
@@ -369,7 +370,7 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
       <div className="post-header">
           <Link to={`/profile/${post.author?.username}`} className="post-author-link">
             <img 
-                src={post.author?.profile_picture || '/default-profile.png'} 
+                src={variantUrl(post.author?.profile_picture_variants, 'small', post.author?.profile_picture) || '/default-profile.png'} 
                 alt={post.author?.username || 'User'} 
                 className="post-author-img" 
             />
@@ -388,7 +389,21 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
 
       {/* Post Image */}
       {post.image_url && (
-        <img src={post.image_url} alt="Post image" className="post-image" />
+        <picture>
+          {post.image_variants && (
+            <source type="image/webp" srcSet={variantSrcSet(post.image_variants, 'webp')} sizes="(max-width: 700px) 100vw, 700px" />
+          )}
+          <img
+            src={variantUrl(post.image_variants, 'feed', post.image_url)}
+            srcSet={variantSrcSet(post.image_variants, 'jpeg')}
+            sizes="(max-width: 700px) 100vw, 700px"
+            width={post.image_variants?.feed?.width}
+            height={post.image_variants?.feed?.height}
+            loading="lazy"
+            alt="Post image"
+            className="post-image"
+          />
+        </picture>
       )}
       
       {/* Post Content - Updated to use PlayableContentViewer */}
@@ -429,7 +444,7 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
         <div className="post-actions">
             {/* Toggle Comments Button */}
             <button onClick={() => setShowComments(!showComments)} className="icon-button" title={showComments ? "Hide Comments" : "Show Comments"}>
-                <FaRegCommentDots /> <span className="post-action-label">{showComments ? 'Hide' : 'Comments'} ({!showComments ? (post.comments_count || 0) : comments.length})</span>
+                <FaRegCommentDots /> <span className="post-action-label">{showComments ? 'Hide' : 'Comments'} ({Math.max(post.comments_count || 0, comments.length)})</span>
             </button>
 
             {/* Like Button */}
@@ -474,12 +489,12 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
             {errorComments && !postingComment && <p className="error-message">{errorComments}</p>}
             
             {/* Comment List */}
-            {!loadingComments && comments.map(comment => (
+            {comments.map(comment => ( // Kept visible while a further page loads
               // Apply comment class
               <div key={comment.id} className="comment"> 
                  <Link to={`/profile/${comment.author?.username}`} className="comment-author-link">
                     <img 
-                        src={comment.author?.profile_picture || '/default-profile.png'} 
+                        src={variantUrl(comment.author?.profile_picture_variants, 'small', comment.author?.profile_picture) || '/default-profile.png'} 
                         alt={comment.author?.username || 'User'} 
                         className="comment-author-img" 
                     />
@@ -508,6 +523,11 @@ function Post({ post, onDelete }) { // Accept post object and onDelete callback
                  )}
               </div>
             ))}
+            {!loadingComments && nextCommentsCursor && (
+              <button onClick={() => fetchComments(nextCommentsCursor)} className="load-more-comments-button">
+                Load more comments
+              </button>
+            )}
             {!loadingComments && comments.length === 0 && !errorComments && <p>No comments yet.</p>} 
 
             {/* Add Comment Form */}
@@ -8,6 +8,8 @@ import Spinner from './Spinner'; // Import Spinner
 import AmpersoundRecorder from './AmpersoundRecorder'; // Import AmpersoundRecorder
 import { FaTrashAlt, FaPlay, FaPause, FaCamera } from 'react-icons/fa'; // Import icons
 import { formatToLocalDateTime, formatToLocalDate } from '../utils/dateUtils';
+import { uploadDirect } from '../utils/directUpload';
+import { variantUrl } from '../utils/imageVariants';
 
 function Profile() {
   const { username } = useParams(); // Get username from URL parameter
@@ -17,6 +19,12 @@ function Profile() {
   const [error, setError] = useState('');
   const [actionLoading, setActionLoading] = useState(false); // Loading state for friend actions
 
+  // Posts are paginated separately from the profile header
+  const [posts, setPosts] = useState([]);
+  const [postsCursor, setPostsCursor] = useState(null);
+  const [hasMorePosts, setHasMorePosts] = useState(false);
+  const [loadingPosts, setLoadingPosts] = useState(false);
+
   // State for user's ampersounds
   const [myAmpersounds, setMyAmpersounds] = useState([]);
   const [loadingAmpersounds, setLoadingAmpersounds] = useState(false);
@@ -54,10 +62,36 @@ function Profile() {
     }
   }, [username]);
 
+  // Fetches one page of posts; without a cursor, starts over from the newest
+  const fetchPosts = useCallback(async (cursor = null) => {
+    setLoadingPosts(true);
+    try {
+      const params = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`/api/v1/profiles/${username}/posts${params}`);
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.message || 'Failed to fetch posts');
+      }
+      setPosts(prev => {
+        if (!cursor) return data.posts;
+        const seen = new Set(prev.map(p => p.id));
+        return [...prev, ...data.posts.filter(p => !seen.has(p.id))];
+      });
+      setPostsCursor(data.next_cursor);
+      setHasMorePosts(data.has_more);
+    } catch (err) {
+      console.error("Error fetching profile posts:", err);
+      setError(err.message || 'Could not load posts.');
+    } finally {
+      setLoadingPosts(false);
+    }
+  }, [username]);
+
   useEffect(() => {
     fetchProfile();
+    fetchPosts();
     // Dependency array includes username to re-fetch if URL changes
-  }, [fetchProfile]);
+  }, [fetchProfile, fetchPosts]);
 
   // Fetch user's ampersounds if it's their own profile
   useEffect(() => {
@@ -160,13 +194,7 @@ function Profile() {
   // <<< Add handler for deleting posts from the profile view >>>
   const handlePostDeleted = (deletedPostId) => {
      console.log("Post deleted from profile, removing from list:", deletedPostId);
-     setProfileData(prevData => {
-         if (!prevData) return null;
-         return {
-             ...prevData,
-             posts: prevData.posts.filter(post => post.id !== deletedPostId)
-         };
-     });
+     setPosts(prevPosts => prevPosts.filter(post => post.id !== deletedPostId));
   };
 
   // Handler for deleting an Ampersound
@@ -278,29 +306,17 @@ function Profile() {
     setUploading(true);
     setUploadError('');
 
-    const formData = new FormData();
-    formData.append('file', file);
-
     try {
-      const response = await fetch('/api/v1/profiles/upload_picture', {
-        method: 'POST',
-        credentials: 'include', // Include session cookie
-        body: formData,
-      });
-
-      if (!response.ok) {
-        const data = await response.json();
-        throw new Error(data.message || 'Failed to upload profile picture');
-      }
-
-      const data = await response.json();
+      // Upload straight to storage; the confirm call updates the profile picture
+      const data = await uploadDirect('profile_picture', file);
       
       // Update profile data with new profile picture URL
       setProfileData(prevData => ({
         ...prevData,
         user: {
           ...prevData.user,
-          profile_picture: data.profile_picture
+          profile_picture: data.profile_picture,
+          profile_picture_variants: null // Regenerated in the background for the new picture
         }
       }));
 
@@ -328,7 +344,7 @@ function Profile() {
   if (profileError) return <p className="error-message">Error: {error}</p>;
   if (!profileData) return <p>Profile not found.</p>; // Should be caught by error usually
 
-  const { user, posts, interests, friendship_status } = profileData;
+  const { user, interests, friendship_status } = profileData;
 
   // Helper function to render friendship buttons
   const renderFriendshipActions = () => {
@@ -362,7 +378,7 @@ function Profile() {
       <div className="profile-header">
         <div className="profile-picture-container">
           <img 
-            src={user.profile_picture || '/default-profile.png'} 
+            src={variantUrl(user.profile_picture_variants, 'medium', user.profile_picture) || '/default-profile.png'} 
             alt={`${user.username}'s profile`} 
             className="profile-picture"
           />
@@ -519,13 +535,17 @@ function Profile() {
         {/* Posts Section (will be main area) */}
         <div className="profile-section profile-posts">
           <h3>Posts</h3>
-          {posts.length === 0 ? (
+          {posts.length === 0 && !loadingPosts ? (
             <p>No posts to display.</p>
           ) : (
             posts.map(post => (
               <Post key={post.id} post={post} onDelete={handlePostDeleted} />
             ))
           )}
+          {loadingPosts && <Spinner contained={true} />}
+          {hasMorePosts && !loadingPosts && (
+            <button onClick={() => fetchPosts(postsCursor)}>Load more posts</button>
+          )}
         </div>
       </div> {/* End of profile-main-content */}
     </div>
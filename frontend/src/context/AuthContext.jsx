@@ -9,20 +9,58 @@ export const AuthProvider = ({ children }) => {
   const [loading, setLoading] = useState(true); // Start loading true
   const [unreadCount, setUnreadCount] = useState(0); // Add unreadCount state
 
-  // Function to fetch unread notification count
-  const fetchUnreadCount = async () => {
-    try {
-      const resp = await fetch('/api/v1/notifications/unread_count', { credentials: 'include' });
-      if (resp.ok) {
-        const data = await resp.json();
-        setUnreadCount(data.unread_count || 0);
+  const [latestNotification, setLatestNotification] = useState(null); // Last 'notification' event from the stream
+
+  // While logged in, the server pushes the unread count (on connect and on every change)
+  // and new notifications over one Server-Sent Events stream; EventSource reconnects by itself.
+  // If the server refuses the stream (503 when too many are open), EventSource gives up:
+  // poll the unread count instead and try the stream again later.
+  useEffect(() => {
+    if (!currentUser) return undefined;
+    let source = null;
+    let pollTimer = null;
+    let retryTimer = null;
+
+    const pollUnreadCount = async () => {
+      try {
+        const response = await fetch('/api/v1/notifications/unread_count', { credentials: 'include' });
+        if (response.ok) {
+          setUnreadCount((await response.json()).unread_count || 0);
+        }
+      } catch (error) {
+        console.error('Unread count poll failed:', error);
       }
-    } catch (err) {
-      console.error('Failed to fetch unread count in AuthContext', err);
-      // Potentially set to 0 or handle error appropriately
-      setUnreadCount(0);
-    }
-  };
+    };
+
+    const connect = () => {
+      source = new EventSource('/api/v1/notifications/stream', { withCredentials: true });
+      source.addEventListener('open', () => {
+        clearInterval(pollTimer);
+        pollTimer = null;
+      });
+      source.addEventListener('unread_count', (event) => {
+        setUnreadCount(JSON.parse(event.data).unread_count || 0);
+      });
+      source.addEventListener('notification', (event) => {
+        setLatestNotification(JSON.parse(event.data));
+      });
+      source.addEventListener('error', () => {
+        if (source.readyState !== EventSource.CLOSED) return; // Reconnecting by itself
+        if (!pollTimer) {
+          pollUnreadCount();
+          pollTimer = setInterval(pollUnreadCount, 30000);
+        }
+        retryTimer = setTimeout(connect, 60000);
+      });
+    };
+    connect();
+
+    return () => {
+      if (source) source.close();
+      clearInterval(pollTimer);
+      clearTimeout(retryTimer);
+    };
+  }, [currentUser]);
 
   // Check for existing session on initial load
   useEffect(() => {
@@ -37,8 +75,7 @@ export const AuthProvider = ({ children }) => {
           console.log('AuthContext Session Check Response Data:', data); // Log API response
           // Check if user data is nested under 'user' key, otherwise assume it's top-level
           const userData = data.user || data;
-          setCurrentUser(userData);
-          fetchUnreadCount(); // Fetch count after session check
+          setCurrentUser(userData); // The notification stream delivers the unread count
         } else {
           // If status is 401 or other error, assume not logged in
           setCurrentUser(null);
@@ -58,7 +95,6 @@ export const AuthProvider = ({ children }) => {
   // Function to handle login - expects user data from API
   const login = (userData) => {
     setCurrentUser(userData);
-    fetchUnreadCount(); // Fetch count on login
     // TODO: Maybe store token or session info if applicable
   };
 
@@ -111,6 +147,7 @@ export const AuthProvider = ({ children }) => {
     refreshUserProfile, // Expose the refresh function
     unreadCount, // Expose unreadCount
     setUnreadCount, // Expose setUnreadCount
+    latestNotification, // Changes whenever a new notification arrives
   };
 
   return (
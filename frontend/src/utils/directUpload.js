@@ -0,0 +1,42 @@
+// Two-step direct-to-storage upload:
+// 1. ask the API for a presigned PUT URL (size and content type are signed into it),
+// 2. PUT the file straight to storage,
+// 3. confirm, which creates the post / ampersound / profile picture record.
+// Resolves with the confirm response body; throws an Error with the server message on failure.
+export const uploadDirect = async (kind, file, confirmBody = null, filename = file.name) => {
+  const contentType = (file.type || '').split(';')[0]; // Drop codec parameters, e.g. 'audio/webm;codecs=opus'
+
+  const issueResponse = await fetch('/api/v1/uploads', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    credentials: 'include',
+    body: JSON.stringify({ kind, content_type: contentType, size: file.size, filename }),
+  });
+  const issued = await issueResponse.json();
+  if (!issueResponse.ok) {
+    throw new Error(issued.message || 'Could not start upload.');
+  }
+
+  const putResponse = await fetch(issued.upload_url, {
+    method: issued.method,
+    headers: issued.headers,
+    body: file,
+  });
+  if (!putResponse.ok) {
+    throw new Error(`Upload to storage failed (${putResponse.status}).`);
+  }
+
+  const confirmResponse = await fetch(`/api/v1/uploads/${issued.upload_id}/confirm`, {
+    method: 'POST',
+    credentials: 'include',
+    ...(confirmBody ? {
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(confirmBody),
+    } : {}),
+  });
+  const confirmed = await confirmResponse.json();
+  if (!confirmResponse.ok) {
+    throw new Error(confirmed.message || 'Could not finalize upload.');
+  }
+  return confirmed;
+};
@@ -0,0 +1,37 @@
+// Image generation and remix run as background jobs: the POST returns 202 with a job id,
+// and the result (a post id) is fetched by polling /api/v1/generation_jobs/<id>.
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Resolves with the finished job ({ post_id, image_url, ... }); throws an Error if the job fails.
+export const waitForGenerationJob = async (jobId, { intervalMs = 2000, maxIntervalMs = 8000, timeoutMs = 10 * 60 * 1000 } = {}) => {
+  const deadline = Date.now() + timeoutMs;
+  let delay = intervalMs;
+  while (Date.now() < deadline) {
+    const response = await fetch(`/api/v1/generation_jobs/${jobId}`, { credentials: 'include' });
+    const job = await response.json();
+    if (!response.ok) {
+      throw new Error(job.message || 'Could not check job status.');
+    }
+    if (job.status === 'succeeded') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Image generation failed.');
+    await sleep(delay);
+    delay = Math.min(delay * 1.5, maxIntervalMs); // Back off while the job waits in the queue
+  }
+  throw new Error('Timed out waiting for the image. It may still appear on your profile.');
+};
+
+// POSTs a job request and waits for it to finish.
+export const runGenerationJob = async (url, body) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    credentials: 'include',
+    body: JSON.stringify(body),
+  });
+  const data = await response.json();
+  if (!response.ok) {
+    throw new Error(data.message || 'Failed to start image generation.');
+  }
+  return waitForGenerationJob(data.job_id);
+};
@@ -0,0 +1,18 @@
+// Helpers for the resized image versions the API returns as `image_variants`
+// (posts: thumb/feed/full) and `profile_picture_variants` (users: small/medium/large).
+// Each variant is { width, height, webp, jpeg }. Variants are generated in the
+// background, so they may be missing for a short time after upload.
+
+// srcSet string for one format, e.g. "a.thumb.webp 320w, a.feed.webp 1080w"
+export const variantSrcSet = (variants, format) => {
+  if (!variants) return undefined;
+  return Object.values(variants)
+    .filter((v) => v && v[format])
+    .sort((a, b) => a.width - b.width)
+    .map((v) => `${v[format]} ${v.width}w`)
+    .join(', ') || undefined;
+};
+
+// Best single URL for a named size, falling back to the original image.
+export const variantUrl = (variants, name, fallback, format = 'jpeg') =>
+  (variants && variants[name] && variants[name][format]) || fallback;
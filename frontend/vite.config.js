@@ -1,10 +1,36 @@
 /// <reference types="vitest" />
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react'
+import { brotliCompressSync, gzipSync, constants } from 'node:zlib'
+
+// Writes .br and .gz next to each text asset of the build; the Flask app
+// serves them by Accept-Encoding (see static_assets.py)
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json|txt|map|webmanifest)$/
+const MIN_SIZE = 1024
+
+function precompress() {
+  return {
+    name: 'precompress',
+    apply: 'build',
+    enforce: 'post', // After index.html is added to the bundle
+    generateBundle(_, bundle) {
+      for (const file of Object.values(bundle)) {
+        if (!COMPRESSIBLE.test(file.fileName)) continue
+        const source = file.type === 'chunk' ? file.code : file.source
+        const data = Buffer.from(source)
+        if (data.length < MIN_SIZE) continue
+        const brotli = brotliCompressSync(data, { params: { [constants.BROTLI_PARAM_QUALITY]: 11 } })
+        const gzip = gzipSync(data, { level: 9 })
+        this.emitFile({ type: 'asset', fileName: `${file.fileName}.br`, source: brotli })
+        this.emitFile({ type: 'asset', fileName: `${file.fileName}.gz`, source: gzip })
+      }
+    },
+  }
+}
 
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), precompress()],
   server: {
     proxy: {
       '/api': {
@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import update, func, and_, or_
+
+from models import db, GenerationJob, GenerationJobKind, GenerationJobStatus, UserImageGenerationStats
+
+
+class GenerationJobError(Exception):
+    """A job failure whose message is safe to show to the user."""
+    pass
+
+
+class FairJobScheduler:
+    """
+    In-process scheduler for outbound generation calls.
+    Each user has a FIFO queue; workers take jobs from users in round-robin order,
+    so one user queueing many jobs cannot starve everyone else. The number of worker
+    threads is the global cap on concurrent generation calls for this process.
+    """
+
+    def __init__(self, app, max_concurrency):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self._queues = OrderedDict() # user_id -> deque of job ids, in round-robin order
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def submit(self, user_id, job_id):
+        with self._cond:
+            self._queues.setdefault(user_id, deque()).append(job_id)
+            self._start_workers()
+            self._cond.notify()
+
+    def _start_workers(self):
+        # Caller holds the lock. Threads start on first use so idle processes (CLI, tests) have none;
+        # a worker that died is replaced on the next submit.
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(target=self._work, name=f"generation-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def next_job(self):
+        """Pops the next job id in round-robin user order, or None if nothing is queued."""
+        with self._cond:
+            return self._pop_next()
+
+    def _pop_next(self):
+        if not self._queues:
+            return None
+        user_id, jobs = self._queues.popitem(last=False)
+        job_id = jobs.popleft()
+        if jobs:
+            self._queues[user_id] = jobs # Back of the line until every other user had a turn
+        return job_id
+
+    def pending_count(self):
+        with self._cond:
+            return sum(len(jobs) for jobs in self._queues.values())
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                job_id = self._pop_next()
+            try:
+                with self.app.app_context():
+                    run_generation_job(job_id)
+            except Exception as e: # e.g. the database was unreachable; keep the worker alive
+                self.app.logger.error(f"Generation worker could not run job {job_id}: {e}", exc_info=True)
+
+
+def run_generation_job(job_id):
+    """Runs one job to completion, recording the resulting post or the failure on the job row."""
+    # Imported here: the resources import this module to enqueue jobs
+    from resources.image_generation import generate_image_post
+    from resources.image_remix import remix_image_post
+    runners = {GenerationJobKind.GENERATE: generate_image_post, GenerationJobKind.REMIX: remix_image_post}
+
+    # Every status change is conditional on the status we expect, because a poll may
+    # expire the job (and refund its quota) at any point while it is queued or running.
+    started = _transition_job(job_id, GenerationJobStatus.QUEUED, status=GenerationJobStatus.RUNNING, started_at=datetime.now(timezone.utc))
+    db.session.commit()
+    if not started:
+        return
+    job = db.session.get(GenerationJob, job_id)
+
+    try:
+        runners[job.kind](job) # Marks the job succeeded with mark_job_succeeded() in the post's transaction
+    except Exception as e:
+        db.session.rollback()
+        if isinstance(e, GenerationJobError):
+            message = str(e)
+        else:
+            current_app.logger.error(f"Generation job {job_id} failed: {e}", exc_info=True)
+            message = "An unexpected error occurred while generating the image."
+        job = db.session.get(GenerationJob, job_id)
+        failed = _transition_job(job_id, GenerationJobStatus.RUNNING, status=GenerationJobStatus.FAILED,
+                                 error=message[:500], finished_at=datetime.now(timezone.utc))
+        if failed:
+            release_job_quota(job)
+        db.session.commit()
+
+
+def _transition_job(job_id, expected_status, **values):
+    """UPDATE of a job that only applies while it is in `expected_status`. Returns True if it applied. Does not commit."""
+    result = db.session.execute(
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.status == expected_status)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def mark_job_succeeded(job_id, post_id):
+    """
+    Records the job's post, to be committed together with the post. Returns False if the
+    job is no longer running (it timed out and its quota was refunded); the caller must
+    then roll back the post.
+    """
+    return _transition_job(job_id, GenerationJobStatus.RUNNING, status=GenerationJobStatus.SUCCEEDED,
+                           result_post_id=post_id, finished_at=datetime.now(timezone.utc))
+
+
+def release_job_quota(job):
+    """Gives back the daily quota slot reserved when the job was queued (failed jobs do not count)."""
+    UserImageGenerationStats.release(job.user_id, job.created_at.date())
+
+
+def init_generation_scheduler(app):
+    scheduler = FairJobScheduler(app, app.config.get('GENERATION_MAX_CONCURRENCY', 4))
+    app.config['GENERATION_SCHEDULER'] = scheduler
+    return scheduler
+
+
+def enqueue_generation_job(job):
+    """
+    Queues a committed job. With BACKGROUND_TASKS_EAGER (tests) it runs inline
+    in a fresh app context, like background.submit_task.
+    """
+    app = current_app._get_current_object()
+    if app.config.get('BACKGROUND_TASKS_EAGER'):
+        with app.app_context():
+            run_generation_job(job.id)
+        db.session.expire(job) # The caller's session still holds the job as queued
+        return
+    app.config['GENERATION_SCHEDULER'].submit(job.user_id, job.id)
+
+
+def active_job_count(user_id):
+    """Jobs of this user that are queued or running. Call expire_stale_jobs() first so lost jobs do not count."""
+    return GenerationJob.query.filter(
+        GenerationJob.user_id == user_id,
+        GenerationJob.status.in_([GenerationJobStatus.QUEUED, GenerationJobStatus.RUNNING])
+    ).count()
+
+
+def expire_stale_job(job):
+    """
+    Marks a job failed if it has been queued, or running, longer than GENERATION_JOB_TIMEOUT
+    (measured from started_at once it runs), e.g. because the process holding it restarted.
+    Conditional on the status read, so a job the runner just finished is left alone.
+    Returns True if the job was changed.
+    """
+    if job.status not in (GenerationJobStatus.QUEUED, GenerationJobStatus.RUNNING):
+        return False
+    since = job.started_at if job.status == GenerationJobStatus.RUNNING and job.started_at else job.created_at
+    if since.tzinfo is None: # SQLite returns naive datetimes
+        since = since.replace(tzinfo=timezone.utc)
+    age = (datetime.now(timezone.utc) - since).total_seconds()
+    if age <= current_app.config.get('GENERATION_JOB_TIMEOUT', 600):
+        return False
+    expired = _transition_job(job.id, job.status, status=GenerationJobStatus.FAILED,
+                              error="Image generation timed out. Please try again.", finished_at=datetime.now(timezone.utc))
+    if expired:
+        release_job_quota(job)
+    db.session.commit() # Also expires `job`, so the caller sees the current row
+    return expired
+
+
+def expire_stale_jobs(user_id=None):
+    """
+    expire_stale_job() for every queued or running job past GENERATION_JOB_TIMEOUT, with
+    one UPDATE ... RETURNING, refunding each job's quota. Jobs live only in the pool of the
+    process that queued them, so this is how jobs lost to a restart are failed. Limited to
+    one user if `user_id` is given. Commits. Returns the number of jobs expired.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None) # Stored as naive UTC
+    cutoff = now - timedelta(seconds=current_app.config.get('GENERATION_JOB_TIMEOUT', 600))
+    stmt = update(GenerationJob).where(or_(
+        and_(GenerationJob.status == GenerationJobStatus.QUEUED, GenerationJob.created_at < cutoff),
+        and_(GenerationJob.status == GenerationJobStatus.RUNNING, func.coalesce(GenerationJob.started_at, GenerationJob.created_at) < cutoff),
+    ))
+    if user_id is not None:
+        stmt = stmt.where(GenerationJob.user_id == user_id)
+    stmt = stmt.values(status=GenerationJobStatus.FAILED, error="Image generation timed out. Please try again.", finished_at=now)
+    jobs = db.session.execute(
+        stmt.returning(GenerationJob.user_id, GenerationJob.created_at).execution_options(synchronize_session=False)
+    ).all()
+    for job in jobs:
+        release_job_quota(job)
+    db.session.commit()
+    return len(jobs)
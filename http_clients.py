@@ -0,0 +1,116 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import OpenAI, DefaultHttpxClient, Timeout
+
+try:
+    import httpx # openai's transport; only needed to bound its connection pool
+except ImportError:
+    httpx = None
+
+# Per-endpoint pool and timeout settings (seconds). Override any entry with
+# app.config['HTTP_CLIENT_SETTINGS'] = {'runware': {'read_timeout': 120}, ...}.
+# Billed endpoints (DeepInfra, Runware) never retry: every call is a POST that may be billed twice.
+DEFAULT_HTTP_CLIENT_SETTINGS = {
+    # DeepInfra OpenAI-compatible API: classification (chat) and FLUX image generation
+    'deepinfra': {'connect_timeout': 5, 'read_timeout': 120, 'max_connections': 32, 'max_retries': 0},
+    # Runware image remixing; inference takes tens of seconds
+    'runware': {'connect_timeout': 5, 'read_timeout': 60, 'max_connections': 16, 'max_retries': 0},
+    # Fetching stored images (remix sources) over HTTP
+    'downloads': {'connect_timeout': 5, 'read_timeout': 30, 'max_connections': 32, 'max_retries': 2},
+}
+
+
+class HttpClients:
+    """
+    Registry of long-lived HTTP clients, one per upstream endpoint. Clients are created
+    lazily and reused for the life of the process, so requests share keep-alive
+    connections instead of paying a TCP+TLS handshake per call.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = {name: dict(values) for name, values in DEFAULT_HTTP_CLIENT_SETTINGS.items()}
+        for name, values in (settings or {}).items():
+            self.settings.setdefault(name, {}).update(values)
+        self._sessions = {}
+        self._openai_clients = {}
+        self._lock = threading.Lock()
+
+    def _settings_for(self, name):
+        if name not in self.settings:
+            raise KeyError(f"No HTTP client settings for '{name}'.")
+        return self.settings[name]
+
+    def timeout(self, name):
+        """(connect, read) timeout tuple for requests calls to this endpoint."""
+        settings = self._settings_for(name)
+        return (settings['connect_timeout'], settings['read_timeout'])
+
+    def session(self, name):
+        """Pooled requests.Session for an endpoint. Use with `timeout=clients.timeout(name)`."""
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                settings = self._settings_for(name)
+                retries = Retry(
+                    total=settings['max_retries'],
+                    backoff_factor=0.5,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'HEAD']), # Never replay POSTs: they may be billed twice
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=settings['max_connections'],
+                    pool_block=True, # Wait for a free connection instead of opening unbounded extras
+                    max_retries=retries,
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[name] = session
+            return session
+
+    def openai(self, name, api_key, base_url=None):
+        """Shared OpenAI-compatible client for an endpoint, keyed by name and credentials."""
+        cache_key = (name, api_key, base_url)
+        with self._lock:
+            client = self._openai_clients.get(cache_key)
+            if client is None:
+                settings = self._settings_for(name)
+                timeout = Timeout(settings['read_timeout'], connect=settings['connect_timeout'])
+                http_client = None
+                if httpx is not None:
+                    http_client = DefaultHttpxClient(
+                        timeout=timeout,
+                        limits=httpx.Limits(
+                            max_connections=settings['max_connections'],
+                            max_keepalive_connections=settings['max_connections'],
+                        ),
+                    )
+                client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=timeout,
+                    max_retries=settings['max_retries'], # openai retries POSTs, so billed endpoints use 0
+                    http_client=http_client,
+                )
+                self._openai_clients[cache_key] = client
+            return client
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for client in self._openai_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._openai_clients.clear()
+
+
+def init_http_clients(app):
+    """Creates the app's HTTP client registry and stores it in app.config['HTTP_CLIENTS']."""
+    clients = HttpClients(app.config.get('HTTP_CLIENT_SETTINGS'))
+    app.config['HTTP_CLIENTS'] = clients
+    return clients
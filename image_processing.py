@@ -0,0 +1,186 @@
+import io
+import os
+from flask import current_app
+
+from models import db, Post, User
+from background import submit_task
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # Pillow is optional; without it images are only served at original size
+    Image = None
+    ImageOps = None
+
+# (name, longest edge in px). Images are never upscaled, so small originals
+# produce variants at their own size.
+POST_IMAGE_SIZES = (('thumb', 320), ('feed', 1080), ('full', 2048))
+# Profile pictures are shown at 32-100 px; 'medium' covers the 100 px header at 2x.
+PROFILE_PICTURE_SIZES = (('small', 64), ('medium', 200), ('large', 400))
+
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpeg', 'JPEG', 'image/jpeg'),
+)
+
+
+def pillow_available():
+    """Returns True if Pillow is installed."""
+    return Image is not None
+
+
+def variant_key(source_key, name, fmt):
+    """Storage key of a derivative, e.g. images/abc.png -> images/abc.thumb.webp."""
+    root, _ = os.path.splitext(source_key)
+    return f"{root}.{name}.{fmt}"
+
+
+def _flatten_for_jpeg(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_image_variants(image_bytes, sizes, webp_quality=80, jpeg_quality=82):
+    """
+    Decodes an image once and renders each size as WebP and JPEG.
+    Returns {name: {'width', 'height', 'webp': bytes, 'jpeg': bytes}}.
+    Raises if Pillow is unavailable or the bytes are not a readable image.
+    """
+    if not pillow_available():
+        raise RuntimeError("Pillow is not installed.")
+
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        source = ImageOps.exif_transpose(source) # Apply camera rotation before resizing
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'transparency' in source.info or source.mode in ('LA', 'PA') else 'RGB')
+
+        variants = {}
+        # Largest first so each smaller size is resampled from the previous one (cheaper, same quality)
+        working = source
+        for name, edge in sorted(sizes, key=lambda s: s[1], reverse=True):
+            resized = working.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            working = resized
+
+            webp_buffer = io.BytesIO()
+            resized.save(webp_buffer, 'WEBP', quality=webp_quality, method=4)
+            jpeg_buffer = io.BytesIO()
+            _flatten_for_jpeg(resized).save(jpeg_buffer, 'JPEG', quality=jpeg_quality, optimize=True, progressive=True)
+
+            variants[name] = {
+                'width': resized.width,
+                'height': resized.height,
+                'webp': webp_buffer.getvalue(),
+                'jpeg': jpeg_buffer.getvalue(),
+            }
+    return variants
+
+
+def store_image_variants(storage, source_key, sizes, app_config):
+    """
+    Reads the original from storage, writes every derivative next to it and returns
+    {name: {'width', 'height', 'webp': url, 'jpeg': url}} ready to save on the model.
+    """
+    original = storage.get(source_key)
+    rendered = build_image_variants(
+        original,
+        sizes,
+        webp_quality=app_config.get('IMAGE_VARIANT_WEBP_QUALITY', 80),
+        jpeg_quality=app_config.get('IMAGE_VARIANT_JPEG_QUALITY', 82),
+    )
+
+    variants = {}
+    stored_bytes = 0
+    for name, data in rendered.items():
+        entry = {'width': data['width'], 'height': data['height']}
+        for fmt, _, content_type in VARIANT_FORMATS:
+            key = variant_key(source_key, name, fmt)
+            storage.put(key, data[fmt], content_type)
+            entry[fmt] = storage.url(key)
+            stored_bytes += len(data[fmt])
+        variants[name] = entry
+    print(f"INFO: Stored {len(variants)} variants for {source_key} ({len(original)} bytes original, {stored_bytes} bytes derivatives)")
+    return variants
+
+
+def sniff_image_content_type(image_bytes):
+    """Best-effort content type from the file signature; defaults to image/jpeg."""
+    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    if image_bytes[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'image/jpeg'
+
+
+def prepare_image_for_classification(image_bytes, max_edge=896, quality=85):
+    """
+    Shrinks an image to the classifier's useful resolution and re-encodes it as JPEG.
+    The vision encoder works at 896x896, so anything larger only costs upload time and memory.
+    Returns (bytes, content_type). Falls back to the original bytes (with their real
+    content type) if Pillow is unavailable, decoding fails or re-encoding would not help.
+    """
+    original_type = sniff_image_content_type(image_bytes)
+    if not pillow_available():
+        return image_bytes, original_type
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            source.draft('RGB', (max_edge, max_edge)) # JPEG only: decode at reduced scale, saves memory and time
+            source = ImageOps.exif_transpose(source)
+            source.thumbnail((max_edge, max_edge), Image.BILINEAR) # Bilinear is plenty for classification
+            buffer = io.BytesIO()
+            _flatten_for_jpeg(source).save(buffer, 'JPEG', quality=quality)
+    except Exception as e:
+        print(f"WARN: Could not downscale image for classification, sending original: {e}")
+        return image_bytes, original_type
+
+    prepared = buffer.getvalue()
+    if len(prepared) >= len(image_bytes) and original_type == 'image/jpeg':
+        return image_bytes, original_type
+    print(f"INFO: Classifier image prepared: {len(image_bytes)} -> {len(prepared)} bytes ({len(image_bytes) - len(prepared)} saved)")
+    return prepared, 'image/jpeg'
+
+
+# --- Background tasks ---
+
+def generate_post_image_variants(post_id, source_key):
+    """Task: render derivatives for a post image and record them on the post."""
+    storage = current_app.config.get('STORAGE')
+    variants = store_image_variants(storage, source_key, POST_IMAGE_SIZES, current_app.config)
+
+    post = db.session.get(Post, post_id)
+    if not post:
+        return # Post was deleted while the task was queued
+    post.image_variants = variants
+    db.session.commit()
+
+
+def generate_profile_picture_variants(user_id, source_key):
+    """Task: render derivatives for a profile picture, unless it was replaced in the meantime."""
+    storage = current_app.config.get('STORAGE')
+    variants = store_image_variants(storage, source_key, PROFILE_PICTURE_SIZES, current_app.config)
+
+    user = db.session.get(User, user_id)
+    if not user or user.profile_picture != storage.url(source_key):
+        return
+    user.profile_picture_variants = variants
+    db.session.commit()
+
+
+def queue_post_image_variants(post_id, source_key):
+    """Schedules derivative generation for a post image. Call after the post is committed."""
+    if not pillow_available() or not current_app.config.get('STORAGE'):
+        return
+    submit_task(generate_post_image_variants, post_id, source_key)
+
+
+def queue_profile_picture_variants(user_id, source_key):
+    """Schedules derivative generation for a new profile picture. Call after the user is committed."""
+    if not pillow_available() or not current_app.config.get('STORAGE'):
+        return
+    submit_task(generate_profile_picture_variants, user_id, source_key)
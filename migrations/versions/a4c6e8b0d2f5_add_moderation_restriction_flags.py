@@ -0,0 +1,34 @@
+"""Track content restricted by admin reports; index comment.user_id
+
+Revision ID: a4c6e8b0d2f5
+Revises: f1b3d5e7a9c2
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c6e8b0d2f5'
+down_revision = 'f1b3d5e7a9c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('post', 'comment', 'ampersound'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('restricted_by_moderation', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_user_id')
+
+    for table in ('ampersound', 'comment', 'post'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('restricted_by_moderation')
@@ -0,0 +1,34 @@
+"""Add report.admin_notes and moderation queue indexes
+
+Revision ID: b5d7f9a1c3e6
+Revises: a4c6e8b0d2f5
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d7f9a1c3e6'
+down_revision = 'a4c6e8b0d2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('admin_notes', sa.Text(), nullable=True))
+        batch_op.create_index('ix_report_queue', ['status', 'content_type', 'content_id', 'timestamp'], unique=False)
+
+    with op.batch_alter_table('ampersound', schema=None) as batch_op:
+        batch_op.create_index('ix_ampersound_status_timestamp', ['status', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ampersound', schema=None) as batch_op:
+        batch_op.drop_index('ix_ampersound_status_timestamp')
+
+    with op.batch_alter_table('report', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_queue')
+        batch_op.drop_column('admin_notes')
@@ -0,0 +1,38 @@
+"""Add storage_deletion outbox table
+
+Revision ID: c8e0a2b4d6f7
+Revises: b5d7f9a1c3e6
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e0a2b4d6f7'
+down_revision = 'b5d7f9a1c3e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('storage_deletion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=512), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    with op.batch_alter_table('storage_deletion', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_storage_deletion_next_attempt_at'), ['next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('storage_deletion', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_storage_deletion_next_attempt_at'))
+
+    op.drop_table('storage_deletion')
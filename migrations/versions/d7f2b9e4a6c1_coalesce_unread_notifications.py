@@ -0,0 +1,49 @@
+"""Coalesce unread notifications per (user, post, type)
+
+Revision ID: d7f2b9e4a6c1
+Revises: c4e8a1d3f6b9
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f2b9e4a6c1'
+down_revision = 'c4e8a1d3f6b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('first_comment_id', sa.Integer(), nullable=True))
+
+    # Collapse existing unread notifications: the newest row of each group survives
+    # and covers the comments from the group's earliest one onwards.
+    op.execute(
+        "UPDATE notification SET first_comment_id = ("
+        " SELECT MIN(n2.comment_id) FROM notification n2"
+        " WHERE n2.user_id = notification.user_id AND n2.post_id = notification.post_id"
+        " AND n2.notification_type = notification.notification_type AND n2.is_read = notification.is_read"
+        ") WHERE is_read = false"
+    )
+    op.execute(
+        "DELETE FROM notification WHERE is_read = false AND id NOT IN ("
+        " SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM notification WHERE is_read = false"
+        " GROUP BY user_id, post_id, notification_type) AS latest"
+        ")"
+    )
+
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_user_timestamp', ['user_id', 'timestamp', 'id'], unique=False)
+        batch_op.create_index('uq_notification_unread_group', ['user_id', 'post_id', 'notification_type'], unique=True,
+                              sqlite_where=sa.text('is_read = 0'), postgresql_where=sa.text('is_read = false'))
+
+
+def downgrade():
+    with op.batch_alter_table('notification', schema=None) as batch_op:
+        batch_op.drop_index('uq_notification_unread_group')
+        batch_op.drop_index('ix_notification_user_timestamp')
+        batch_op.drop_column('first_comment_id')
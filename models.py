@@ -4,7 +4,8 @@ from extensions import db # Added import from extensions
 from datetime import datetime, timezone
 import uuid # Add uuid for code generation
 import enum # Import enum for FriendRequestStatus and PostPrivacy
-from sqlalchemy import select, func, Date # Added for comments_count and UserImageGenerationStats
+from sqlalchemy import select, func, Date, update, false # Added for comments_count and UserImageGenerationStats
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import column_property # Added for comments_count
 
 # Enum for Friend Request Status
@@ -42,11 +43,35 @@ class AmpersoundStatus(enum.Enum):
     APPROVED = 'approved'
     REJECTED = 'rejected'
 
+# Enum for direct-to-storage upload kinds
+class UploadKind(enum.Enum):
+    POST_IMAGE = 'post_image'
+    AMPERSOUND = 'ampersound'
+    PROFILE_PICTURE = 'profile_picture'
+
+# Enums for asynchronous image generation / remix jobs
+class GenerationJobKind(enum.Enum):
+    GENERATE = 'generate'
+    REMIX = 'remix'
+
+class GenerationJobStatus(enum.Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
 # Enum for Comment Visibility
 class CommentVisibility(enum.Enum):
     PUBLIC = 'public'
     FRIENDS_ONLY = 'friends_only'
 
+# Dialects with ON CONFLICT upserts; create_app refuses to start on any other database
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def dialect_insert():
+    """The INSERT construct of the bound database's dialect, for ON CONFLICT upserts."""
+    return UPSERT_INSERTS[db.session.get_bind().dialect.name]
+
 # New FriendRequest model
 class FriendRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,6 +96,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     profile_picture = db.Column(db.String(512), nullable=True) # Add profile picture URL field
+    profile_picture_variants = db.Column(db.JSON, nullable=True) # Resized WebP/JPEG versions, see image_processing.py
     user_type = db.Column(db.Enum(UserType), default=UserType.USER, nullable=False) # Added user_type
     posts = db.relationship('Post', backref='author', lazy=True)
     comments = db.relationship('Comment', backref='author', lazy=True)
@@ -89,6 +115,10 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+    def record(self):
+        """Returns self, so current_user.record() works whether current_user is a User or a user_cache.SessionUser."""
+        return self
+
     # --- Friendship Methods ---
 
     def get_friends(self):
@@ -117,9 +147,14 @@ class User(UserMixin, db.Model):
 
     def is_friend(self, user):
         """Checks if this user is friends with another user (accepted request exists)."""
+        return User.are_friends(self.id, user.id)
+
+    @staticmethod
+    def are_friends(user_id, other_user_id):
+        """Friendship check by ids, for callers that do not have both User objects loaded."""
         return FriendRequest.query.filter(
-            ((FriendRequest.sender_id == self.id) & (FriendRequest.receiver_id == user.id) |
-             (FriendRequest.sender_id == user.id) & (FriendRequest.receiver_id == self.id)),
+            ((FriendRequest.sender_id == user_id) & (FriendRequest.receiver_id == other_user_id) |
+             (FriendRequest.sender_id == other_user_id) & (FriendRequest.receiver_id == user_id)),
             FriendRequest.status == FriendRequestStatus.ACCEPTED
         ).count() > 0
 
@@ -199,9 +234,17 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     visibility = db.Column(db.Enum(CommentVisibility), default=CommentVisibility.PUBLIC, nullable=False) # Added visibility
+    restricted_by_moderation = db.Column(db.Boolean, default=False, server_default=false(), nullable=False) # See Post
     # Add relationship to Notification with cascade delete
     notifications = db.relationship('Notification', backref='comment', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # Keyset pagination of a post's comments (see CommentListResource.get)
+        db.Index('ix_comment_post_timestamp', 'post_id', 'timestamp', 'id'),
+        # Per-user bulk updates (moderation.py)
+        db.Index('ix_comment_user_id', 'user_id'),
+    )
+
     def __repr__(self):
         return f'<Comment {self.content[:30]}...>'
 
@@ -218,8 +261,7 @@ class Comment(db.Model):
         # If comment is friends_only, check friendship with comment author
         if self.visibility == CommentVisibility.FRIENDS_ONLY:
             # Check friendship between the viewing user and the comment author
-            comment_author = User.query.get(self.user_id)
-            if comment_author and comment_author.is_friend(user):
+            if User.are_friends(self.user_id, user.id):
                 return True
             # Also allow post author to see friends_only comments on their post
             if post_author and post_author.id == user.id:
@@ -246,16 +288,25 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=lambda: datetime.now(timezone.utc))
+    # Bumped on every UPDATE of the row (content, privacy, image variants); part of the post's ETag
+    updated_at = db.Column(db.DateTime, nullable=True, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     image_url = db.Column(db.String(512), nullable=True) # URL for the image stored in S3
+    image_variants = db.Column(db.JSON, nullable=True) # Resized WebP/JPEG versions (thumb/feed/full), see image_processing.py
     classification_scores = db.Column(db.JSON, nullable=True) # Store combined classification results as JSON
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
     category_scores = db.relationship('PostCategoryScore', lazy=True, cascade='all, delete-orphan')
     privacy = db.Column(db.Enum(PostPrivacy), default=PostPrivacy.PUBLIC, nullable=False)  # Default to public
+    # Set when an admin report made the post friends-only; restore_user_content() reverts exactly these rows
+    restricted_by_moderation = db.Column(db.Boolean, default=False, server_default=false(), nullable=False)
     likes = db.relationship('PostLike', backref='post', lazy=True, cascade='all, delete-orphan')
     parent_post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=True)  # For tracking remixed posts
     parent_post = db.relationship('Post', remote_side=[id], backref='remixes')
 
+    __table_args__ = (
+        db.Index('ix_post_user_timestamp', 'user_id', 'timestamp', 'id'), # Profile post pages
+    )
+
     comments_count = column_property(
         select(func.count(Comment.id))
         .where(Comment.post_id == id)
@@ -294,8 +345,7 @@ class Post(db.Model):
             
         # If friends-only, check friendship
         if self.privacy == PostPrivacy.FRIENDS:
-            author = User.query.get(self.user_id)
-            return author.is_friend(user)
+            return User.are_friends(self.user_id, user.id)
             
         # Default fallback - shouldn't reach here with proper enum constraints
         return False
@@ -346,11 +396,15 @@ class Ampersound(db.Model):
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     play_count = db.Column(db.Integer, default=0, nullable=False, index=True) # New field for tracking plays
     privacy = db.Column(db.String(50), default='public', nullable=False) # 'public' or 'friends'
+    restricted_by_moderation = db.Column(db.Boolean, default=False, server_default=false(), nullable=False) # See Post
     status = db.Column(db.Enum(AmpersoundStatus), default=AmpersoundStatus.PENDING_APPROVAL, nullable=False) # New status field
+    duration_ms = db.Column(db.Integer, nullable=True) # Set by the audio normalization pipeline
+    waveform = db.Column(db.JSON, nullable=True) # Precomputed peak summary (list of 0-100 ints) for the UI
 
     # Define a unique constraint for user_id and name
     __table_args__ = (
         db.UniqueConstraint('user_id', 'name', name='uq_user_ampersound_name'),
+        db.Index('ix_ampersound_status_timestamp', 'status', 'timestamp', 'id'), # Admin approval queue pages
     )
 
     # Relationship to User
@@ -381,10 +435,7 @@ class Ampersound(db.Model):
         if self.privacy == 'friends':
             if not user: # Anonymous users cannot see friends-only content
                 return False
-            amp_author = User.query.get(self.user_id)
-            if not amp_author: # Should not happen if data is consistent
-                return False
-            return amp_author.is_friend(user)
+            return User.are_friends(self.user_id, user.id)
             
         return False
 
@@ -401,6 +452,7 @@ class Report(db.Model):
     reason = db.Column(db.Text, nullable=True) # Optional reason
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     status = db.Column(db.Enum(ReportStatus), default=ReportStatus.PENDING, nullable=False)
+    admin_notes = db.Column(db.Text, nullable=True)
 
     reporter = db.relationship('User', foreign_keys=[reporter_id], backref='filed_reports')
     reported_user = db.relationship('User', foreign_keys=[reported_user_id], backref='reports_against')
@@ -412,11 +464,26 @@ class Report(db.Model):
     __table_args__ = (
         # A user can only report a specific piece of content once
         db.UniqueConstraint('reporter_id', 'content_type', 'content_id', name='uq_report_once_per_content'),
+        # Moderation queue: pending reports grouped per reported item (see moderation.py)
+        db.Index('ix_report_queue', 'status', 'content_type', 'content_id', 'timestamp'),
     )
 
     def __repr__(self):
         return f'<Report {self.id} by User {self.reporter_id} on {self.content_type.value} {self.content_id}>'
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'reporter_id': self.reporter_id,
+            'reported_user_id': self.reported_user_id,
+            'content_type': self.content_type.value,
+            'content_id': self.content_id,
+            'reason': self.reason,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'status': self.status.value,
+            'admin_notes': self.admin_notes,
+        }
+
 # Enum for Notification types
 class NotificationType(enum.Enum):
     COMMENT = 'comment'
@@ -429,9 +496,19 @@ class Notification(db.Model):
     notification_type = db.Column(db.Enum(NotificationType), default=NotificationType.COMMENT, nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
     comment_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'), nullable=False) # Added ondelete='CASCADE'
+    # Unread notifications are coalesced per (user, post, type): comment_id is the latest
+    # comment and first_comment_id the earliest one the row covers. No FK, the comment may be gone.
+    first_comment_id = db.Column(db.Integer, nullable=True)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
 
+    __table_args__ = (
+        # At most one unread row per group; new comments update it in place
+        db.Index('uq_notification_unread_group', 'user_id', 'post_id', 'notification_type', unique=True,
+                 sqlite_where=db.text('is_read = 0'), postgresql_where=db.text('is_read = false')),
+        db.Index('ix_notification_user_timestamp', 'user_id', 'timestamp', 'id'),
+    )
+
     # Relationships
     user = db.relationship('User', foreign_keys=[user_id], backref='notifications_received')
     actor = db.relationship('User', foreign_keys=[actor_id], backref='notifications_sent')
@@ -445,5 +522,86 @@ class UserImageGenerationStats(db.Model):
 
     __table_args__ = (db.UniqueConstraint('user_id', 'generation_date', name='uq_user_generation_date'),)
 
+    @classmethod
+    def reserve(cls, user_id, limit, generation_date=None):
+        """
+        Atomically takes one generation from the user's daily quota with a single
+        INSERT ... ON CONFLICT DO UPDATE ... WHERE count < limit RETURNING count,
+        so concurrent requests cannot both take the last slot and the first request
+        of the day cannot hit the unique constraint.
+        Returns the new count, or None if the limit was already reached.
+        Runs in the current transaction; the caller commits (or releases on failure).
+        """
+        generation_date = generation_date or datetime.now(timezone.utc).date()
+        insert = dialect_insert()
+        table = cls.__table__
+        stmt = insert(table).values(user_id=user_id, generation_date=generation_date, count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.generation_date],
+            set_={'count': table.c.count + 1},
+            where=table.c.count < limit,
+        ).returning(table.c.count)
+        return db.session.execute(stmt).scalar()
+
+    @classmethod
+    def release(cls, user_id, generation_date):
+        """Gives back a reservation made by reserve() for a generation that did not produce a post."""
+        table = cls.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.generation_date == generation_date, table.c.count > 0)
+            .values(count=table.c.count - 1)
+        )
+
+    def __repr__(self):
+        return f'<UserImageGenerationStats UserID: {self.user_id} Date: {self.generation_date} Count: {self.count}>'
+
+# Presigned upload issued to a client, waiting for the client's confirm call
+class PendingUpload(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.Enum(UploadKind), nullable=False)
+    s3_key = db.Column(db.String(512), nullable=False, unique=True)
+    content_type = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.Integer, nullable=False) # Declared size in bytes, signed into the upload URL
+    timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    user = db.relationship('User', backref=db.backref('pending_uploads', lazy=True))
+
+    def __repr__(self):
+        return f'<PendingUpload {self.id} {self.kind.value} User: {self.user_id} Key: {self.s3_key}>'
+
+# Outbox of stored objects to delete, written in the same transaction as the row that
+# referenced them and drained in batches by storage_cleanup.sweep_storage_deletions()
+class StorageDeletion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(512), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<StorageDeletion {self.key} attempts={self.attempts}>'
+
+# Image generation or remix request, processed by the fair job scheduler (generation_jobs.py)
+class GenerationJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.Enum(GenerationJobKind), nullable=False)
+    status = db.Column(db.Enum(GenerationJobStatus), default=GenerationJobStatus.QUEUED, nullable=False)
+    prompt = db.Column(db.Text, nullable=False)
+    source_post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='SET NULL'), nullable=True) # Remix source
+    result_post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='SET NULL'), nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_generation_job_user_status', 'user_id', 'status'),)
+
+    user = db.relationship('User', backref=db.backref('generation_jobs', lazy=True))
+    result_post = db.relationship('Post', foreign_keys=[result_post_id])
+
     def __repr__(self):
-        return f'<UserImageGenerationStats UserID: {self.user_id} Date: {self.generation_date} Count: {self.count}>'
\ No newline at end of file
+        return f'<GenerationJob {self.id} {self.kind.value} {self.status.value} User: {self.user_id}>'
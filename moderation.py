@@ -0,0 +1,224 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import update, func, and_, or_, tuple_
+from sqlalchemy.orm import load_only
+
+from models import db, User, Post, Comment, Ampersound, Report, PostPrivacy, CommentVisibility, ReportContentType, ReportStatus, AmpersoundStatus
+from storage_cleanup import queue_storage_deletions, schedule_storage_sweep
+
+# Reasons shown per queue entry; the rest are in the admin report list
+RECENT_REASONS_SHOWN = 3
+PREVIEW_LENGTH = 200
+
+CONTENT_MODELS = {
+    ReportContentType.POST: Post,
+    ReportContentType.COMMENT: Comment,
+    ReportContentType.AMPERSOUND: Ampersound,
+}
+
+
+def _bulk_update(stmt):
+    return db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def restrict_user_content(user_id):
+    """
+    Makes all of a user's posts, comments and ampersounds friends-only with three
+    set-based UPDATEs, flagging the rows that were public so restore_user_content()
+    can undo exactly this. Does not commit; the caller commits it together with the
+    report. Returns the number of rows changed per kind.
+    """
+    return {
+        'posts': _bulk_update(
+            update(Post)
+            .where(Post.user_id == user_id, Post.privacy != PostPrivacy.FRIENDS)
+            .values(privacy=PostPrivacy.FRIENDS, restricted_by_moderation=True)
+        ),
+        'comments': _bulk_update(
+            update(Comment)
+            .where(Comment.user_id == user_id, Comment.visibility != CommentVisibility.FRIENDS_ONLY)
+            .values(visibility=CommentVisibility.FRIENDS_ONLY, restricted_by_moderation=True)
+        ),
+        'ampersounds': _bulk_update(
+            update(Ampersound)
+            .where(Ampersound.user_id == user_id, Ampersound.privacy != 'friends') # Ampersound uses string 'friends'
+            .values(privacy='friends', restricted_by_moderation=True)
+        ),
+    }
+
+
+def restore_user_content(user_id):
+    """
+    Reverts restrict_user_content(): rows it made friends-only become public again.
+    Content the user had made friends-only themselves stays as it is. Does not commit.
+    Returns the number of rows changed per kind.
+    """
+    return {
+        'posts': _bulk_update(
+            update(Post)
+            .where(Post.user_id == user_id, Post.restricted_by_moderation == True)
+            .values(privacy=PostPrivacy.PUBLIC, restricted_by_moderation=False)
+        ),
+        'comments': _bulk_update(
+            update(Comment)
+            .where(Comment.user_id == user_id, Comment.restricted_by_moderation == True)
+            .values(visibility=CommentVisibility.PUBLIC, restricted_by_moderation=False)
+        ),
+        'ampersounds': _bulk_update(
+            update(Ampersound)
+            .where(Ampersound.user_id == user_id, Ampersound.restricted_by_moderation == True)
+            .values(privacy='public', restricted_by_moderation=False)
+        ),
+    }
+
+
+def _encode_queue_cursor(group):
+    raw = f"{group.report_count}|{group.first_reported_at.isoformat()}|{group.content_type.name}|{group.content_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_queue_cursor(cursor):
+    try:
+        count, first, content_type, content_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return int(count), datetime.fromisoformat(first), ReportContentType[content_type], int(content_id)
+    except (ValueError, KeyError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+
+def pending_report_groups(cursor=None, limit=50):
+    """
+    One page of the moderation queue: pending reports grouped by reported item, most
+    reported first, then longest waiting. Keyset paginated on (report_count,
+    first_reported_at, content_type, content_id), so deep pages cost the same as the
+    first. Returns (groups, next_cursor); raises ValueError for a malformed cursor.
+    """
+    groups = (
+        db.session.query(
+            Report.content_type.label('content_type'),
+            Report.content_id.label('content_id'),
+            func.max(Report.reported_user_id).label('reported_user_id'),
+            func.count(Report.id).label('report_count'),
+            func.min(Report.timestamp).label('first_reported_at'),
+            func.max(Report.timestamp).label('last_reported_at'),
+        )
+        .filter(Report.status == ReportStatus.PENDING)
+        .group_by(Report.content_type, Report.content_id)
+        .subquery()
+    )
+    c = groups.c
+    query = db.session.query(groups)
+    if cursor:
+        count, first, content_type, content_id = _decode_queue_cursor(cursor)
+        query = query.filter(or_(
+            c.report_count < count,
+            and_(c.report_count == count, c.first_reported_at > first),
+            and_(c.report_count == count, c.first_reported_at == first, c.content_type > content_type),
+            and_(c.report_count == count, c.first_reported_at == first, c.content_type == content_type, c.content_id > content_id),
+        ))
+    rows = (
+        query.order_by(c.report_count.desc(), c.first_reported_at.asc(), c.content_type.asc(), c.content_id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = _encode_queue_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return describe_report_groups(rows[:limit]), next_cursor
+
+
+def describe_report_groups(rows):
+    """
+    Queue entries for grouped rows, with the reported user, a preview of the content and
+    its latest reasons. One query per content type, one for users and one (windowed) for
+    reasons, whatever the page size.
+    """
+    if not rows:
+        return []
+
+    ids_by_type = {}
+    for row in rows:
+        ids_by_type.setdefault(row.content_type, []).append(row.content_id)
+    previews = {}
+    for content_type, ids in ids_by_type.items():
+        model = CONTENT_MODELS[content_type]
+        text_column = model.name if model is Ampersound else model.content
+        for row_id, text in db.session.query(model.id, text_column).filter(model.id.in_(ids)):
+            previews[(content_type, row_id)] = (text or '')[:PREVIEW_LENGTH]
+
+    user_ids = {row.reported_user_id for row in rows}
+    users = {user.id: user for user in User.query.options(load_only(User.id, User.username)).filter(User.id.in_(user_ids))}
+
+    position = func.row_number().over(
+        partition_by=(Report.content_type, Report.content_id),
+        order_by=(Report.timestamp.desc(), Report.id.desc()),
+    ).label('position')
+    latest = (
+        db.session.query(Report.content_type, Report.content_id, Report.reason, position)
+        .filter(
+            Report.status == ReportStatus.PENDING,
+            Report.reason.isnot(None), Report.reason != '',
+            tuple_(Report.content_type, Report.content_id).in_([(row.content_type, row.content_id) for row in rows]),
+        )
+        .subquery()
+    )
+    reasons = {}
+    for content_type, content_id, reason in (
+        db.session.query(latest.c.content_type, latest.c.content_id, latest.c.reason)
+        .filter(latest.c.position <= RECENT_REASONS_SHOWN)
+        .order_by(latest.c.position)
+    ):
+        reasons.setdefault((content_type, content_id), []).append(reason)
+
+    entries = []
+    for row in rows:
+        key = (row.content_type, row.content_id)
+        user = users.get(row.reported_user_id)
+        entries.append({
+            'content_type': row.content_type.value,
+            'content_id': row.content_id,
+            'report_count': row.report_count,
+            'first_reported_at': row.first_reported_at.isoformat(),
+            'last_reported_at': row.last_reported_at.isoformat(),
+            'reported_user': {'id': user.id, 'username': user.username} if user else None,
+            'preview': previews.get(key), # None if the content was deleted
+            'recent_reasons': reasons.get(key, []),
+        })
+    return entries
+
+
+def resolve_report_group(content_type, content_id, status, admin_notes=None):
+    """Sets `status` (and notes) on every pending report of one item with one UPDATE. Does not commit."""
+    values = {'status': status}
+    if admin_notes is not None:
+        values['admin_notes'] = admin_notes
+    return _bulk_update(
+        update(Report)
+        .where(Report.content_type == content_type, Report.content_id == content_id, Report.status == ReportStatus.PENDING)
+        .values(**values)
+    )
+
+
+def review_pending_ampersounds(status, ids=None, user_id=None, before=None):
+    """
+    Approves or rejects pending ampersounds with one UPDATE ... RETURNING: those in `ids`,
+    or those matching the filter (uploader `user_id`, uploaded `before` a datetime).
+    Rows no longer pending are left alone. The files of rejected ampersounds go into the
+    storage deletion outbox in the same transaction and are swept after the commit.
+    Returns the ids changed.
+    """
+    stmt = update(Ampersound).where(Ampersound.status == AmpersoundStatus.PENDING_APPROVAL)
+    if ids is not None:
+        stmt = stmt.where(Ampersound.id.in_(ids))
+    if user_id is not None:
+        stmt = stmt.where(Ampersound.user_id == user_id)
+    if before is not None:
+        stmt = stmt.where(Ampersound.timestamp < before)
+    stmt = stmt.values(status=status).returning(Ampersound.id, Ampersound.file_path)
+    rows = db.session.execute(stmt.execution_options(synchronize_session=False)).all()
+    queued = 0
+    if status == AmpersoundStatus.REJECTED:
+        queued = queue_storage_deletions(file_path for _, file_path in rows)
+    db.session.commit()
+
+    if queued:
+        schedule_storage_sweep()
+    return [row_id for row_id, _ in rows]
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, literal, union, and_, or_, func, update, delete
+
+from models import db, Comment, Notification, NotificationType, User, dialect_insert
+from background import submit_task
+from events import publish_unread_counts, publish_new_notification
+
+# Threads with more comments than this are fanned out on the background pool,
+# so creating a comment does not wait on a large INSERT.
+DEFAULT_FANOUT_INLINE_LIMIT = 200
+
+# How many of the latest actors a coalesced notification lists by name
+RECENT_ACTORS_SHOWN = 3
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_PRUNE_BATCH_SIZE = 1000
+
+
+def fan_out_comment_notifications(comment_id, post_id, post_author_id, actor_id):
+    """
+    Notifies the post author and everyone who commented on the post before, except the
+    commenter, with one INSERT ... SELECT. A recipient who still has an unread notification
+    for the post gets that row moved forward to this comment (ON CONFLICT DO UPDATE on the
+    unread-group index) instead of a new row. Open notification streams of the recipients
+    are told afterwards. Returns the number of rows inserted or updated.
+    """
+    recipients = union(
+        select(Comment.user_id.label('user_id')).where(Comment.post_id == post_id),
+        select(literal(post_author_id).label('user_id')),
+    ).subquery() # UNION also removes duplicate user ids
+
+    table = Notification.__table__
+    rows = select(
+        recipients.c.user_id,
+        literal(actor_id),
+        literal(NotificationType.COMMENT, type_=table.c.notification_type.type),
+        literal(post_id),
+        literal(comment_id),
+        literal(comment_id),
+        literal(datetime.now(timezone.utc), type_=table.c.timestamp.type),
+        literal(False, type_=table.c.is_read.type),
+    ).where(recipients.c.user_id != actor_id) # The WHERE also keeps SQLite's upsert parser unambiguous
+
+    stmt = dialect_insert()(table).from_select(
+        ['user_id', 'actor_id', 'notification_type', 'post_id', 'comment_id', 'first_comment_id', 'timestamp', 'is_read'],
+        rows,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.post_id, table.c.notification_type],
+        index_where=table.c.is_read == False,
+        set_={
+            'actor_id': stmt.excluded.actor_id,
+            'comment_id': stmt.excluded.comment_id,
+            'timestamp': stmt.excluded.timestamp,
+        },
+    ).returning(table.c.user_id)
+    notified = db.session.execute(stmt).scalars().all()
+    db.session.commit()
+
+    publish_unread_counts(notified)
+    publish_new_notification(notified, {'post_id': post_id, 'comment_id': comment_id, 'actor_id': actor_id})
+    return len(notified)
+
+
+def _is_large_thread(post_id, limit):
+    # Looks at most limit + 1 index entries instead of counting the whole thread
+    return db.session.query(Comment.id).filter(Comment.post_id == post_id).offset(limit).limit(1).first() is not None
+
+
+def notify_new_comment(comment, post):
+    """
+    Creates the notifications for a just-committed comment on `post`: inline for ordinary
+    threads, on the background pool for threads above NOTIFICATION_FANOUT_INLINE_LIMIT comments.
+    """
+    args = (comment.id, post.id, post.user_id, comment.user_id)
+    limit = current_app.config.get('NOTIFICATION_FANOUT_INLINE_LIMIT', DEFAULT_FANOUT_INLINE_LIMIT)
+    if _is_large_thread(post.id, limit):
+        submit_task(fan_out_comment_notifications, *args)
+    else:
+        fan_out_comment_notifications(*args)
+
+
+def summarize_actors(notifications):
+    """
+    Sets `actor_count` and `actors` (the latest RECENT_ACTORS_SHOWN distinct commenters,
+    newest first) on each notification of a page. A coalesced notification covers the
+    comments from first_comment_id to comment_id on its post; one grouped query finds the
+    commenters of every notification in the page and one more loads their users.
+    """
+    if not notifications:
+        return notifications
+    window_start = func.coalesce(Notification.first_comment_id, Notification.comment_id)
+    rows = (
+        db.session.query(Notification.id, Comment.user_id, func.max(Comment.id))
+        .join(Comment, and_(
+            Comment.post_id == Notification.post_id,
+            Comment.id >= window_start,
+            Comment.id <= Notification.comment_id,
+            Comment.user_id != Notification.user_id,
+        ))
+        .filter(Notification.id.in_([n.id for n in notifications]))
+        .group_by(Notification.id, Comment.user_id)
+        .all()
+    )
+
+    actors_by_notification = {}
+    for notification_id, user_id, latest_comment_id in rows:
+        actors_by_notification.setdefault(notification_id, []).append((latest_comment_id, user_id))
+    recent_ids = {}
+    for notification_id, actors in actors_by_notification.items():
+        actors.sort(reverse=True)
+        recent_ids[notification_id] = [user_id for _, user_id in actors[:RECENT_ACTORS_SHOWN]]
+    wanted = {user_id for ids in recent_ids.values() for user_id in ids}
+    users = {user.id: user for user in User.query.filter(User.id.in_(wanted))} if wanted else {}
+
+    for notification in notifications:
+        actors = [users[user_id] for user_id in recent_ids.get(notification.id, []) if user_id in users]
+        notification.actors = actors or [notification.actor]
+        notification.actor_count = max(len(actors_by_notification.get(notification.id, [])), 1)
+    return notifications
+
+
+def mark_notifications_read(user_id, up_to=None):
+    """
+    Marks the user's unread notifications read with one UPDATE: all of them, or only
+    those at or before `up_to`, a (timestamp, id) position in the newest-first list,
+    so notifications that arrived after the client loaded the list stay unread.
+    Returns the number of notifications marked.
+    """
+    table = Notification.__table__
+    stmt = update(table).where(table.c.user_id == user_id, table.c.is_read == False)
+    if up_to is not None:
+        timestamp, row_id = up_to
+        stmt = stmt.where(or_(table.c.timestamp < timestamp, and_(table.c.timestamp == timestamp, table.c.id <= row_id)))
+    marked = db.session.execute(stmt.values(is_read=True)).rowcount
+    db.session.commit()
+    if marked:
+        publish_unread_counts([user_id])
+    return marked
+
+
+def prune_read_notifications(older_than_days=None, batch_size=None):
+    """
+    Deletes read notifications older than `older_than_days` (NOTIFICATION_RETENTION_DAYS),
+    `batch_size` rows per transaction so no single DELETE holds long locks.
+    Unread notifications are kept regardless of age. Returns the number deleted.
+    """
+    config = current_app.config
+    if older_than_days is None:
+        older_than_days = config.get('NOTIFICATION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    if batch_size is None:
+        batch_size = config.get('NOTIFICATION_PRUNE_BATCH_SIZE', DEFAULT_PRUNE_BATCH_SIZE)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+
+    table = Notification.__table__
+    deleted = 0
+    while True:
+        batch = select(table.c.id).where(table.c.is_read == True, table.c.timestamp < cutoff).limit(batch_size)
+        count = db.session.execute(delete(table).where(table.c.id.in_(batch.scalar_subquery()))).rowcount
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
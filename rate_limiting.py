@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+
+from flask_login import current_user
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+# Expired counters are deleted every this many increments (per process)
+PRUNE_EVERY = 1000
+
+
+class SQLiteStorage(Storage):
+    """
+    Rate limit storage in a local SQLite file, shared by every worker process on the host.
+    Usable with Flask-Limiter as storage_uri="sqlite:////abs/path/ratelimit.db"
+    (or "sqlite:///relative/path.db"). Fixed-window strategy only.
+
+    The database runs in WAL mode so readers never block the writer, and each hit is a
+    single INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement, so concurrent
+    workers cannot lose increments. Each thread keeps its own connection.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        path = uri.split('://', 1)[1][1:] if uri else ''
+        if not path or path == ':memory:':
+            raise ValueError("SQLiteStorage needs a file path, e.g. sqlite:////var/run/app/ratelimit.db")
+        self.path = os.path.abspath(path)
+        self.timeout = float(options.get('timeout', 5))
+        self._local = threading.local()
+        self._incr_count = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._connection() # Create the schema eagerly so configuration errors surface at startup
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # New thread, or a forked worker that must not reuse its parent's connection
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # Counters may lose the last writes on power loss; acceptable
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_counters ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        row = self._connection().execute(
+            "INSERT INTO rate_limit_counters (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            " count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END,"
+            " expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()
+
+        self._incr_count += 1
+        if self._incr_count % PRUNE_EVERY == 0:
+            self._connection().execute("DELETE FROM rate_limit_counters WHERE expires_at <= ?", (now,))
+        return row[0]
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM rate_limit_counters WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limit_counters WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limit_counters").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limit_counters WHERE key = ?", (key,))
+
+
+def rate_limit_key():
+    """Limits authenticated requests per user (across IPs) and anonymous ones per client IP."""
+    if current_user and current_user.is_authenticated:
+        return f"user:{current_user.get_id()}"
+    return get_remote_address()
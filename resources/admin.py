@@ -1,7 +1,29 @@
 \
-from flask_restful import Resource, reqparse
+from datetime import datetime, timezone
+
+from flask_restful import Resource, reqparse, abort
 from flask_login import current_user, login_required
-from models import db, Ampersound, AmpersoundStatus, UserType
+from sqlalchemy.orm import joinedload, load_only
+from models import db, User, Ampersound, AmpersoundStatus, UserType
+from moderation import restore_user_content, review_pending_ampersounds
+from utils import keyset_page
+
+PENDING_PAGE_SIZE = 50
+MAX_PENDING_PAGE_SIZE = 200
+
+pending_list_parser = reqparse.RequestParser()
+pending_list_parser.add_argument('limit', type=int, default=PENDING_PAGE_SIZE, location='args')
+pending_list_parser.add_argument('cursor', type=str, location='args')
+
+MAX_BULK_IDS = 1000
+
+bulk_action_parser = reqparse.RequestParser()
+bulk_action_parser.add_argument('action', type=str, required=True, help="Action must be 'approve' or 'reject'", choices=('approve', 'reject'), location='json')
+bulk_action_parser.add_argument('ids', type=int, action='append', location='json', help='Ampersound ids')
+bulk_action_parser.add_argument('user_id', type=int, location='json', help='Only pending ampersounds of this uploader')
+bulk_action_parser.add_argument('before', type=str, location='json', help='Only pending ampersounds uploaded before this ISO 8601 time')
+
+ACTION_STATUSES = {'approve': AmpersoundStatus.APPROVED, 'reject': AmpersoundStatus.REJECTED}
 
 def admin_required(func):
     @login_required
@@ -14,8 +36,16 @@ def admin_required(func):
 class AdminAmpersoundApprovalList(Resource):
     @admin_required
     def get(self):
-        """List all ampersounds pending approval."""
-        pending_ampersounds = Ampersound.query.filter_by(status=AmpersoundStatus.PENDING_APPROVAL).order_by(Ampersound.timestamp.asc()).all()
+        """Ampersounds pending approval, oldest first. ?limit=N (max 200), ?cursor=<next_cursor>."""
+        args = pending_list_parser.parse_args()
+        limit = min(max(args['limit'], 1), MAX_PENDING_PAGE_SIZE)
+        query = Ampersound.query.filter_by(status=AmpersoundStatus.PENDING_APPROVAL).options(
+            joinedload(Ampersound.user).load_only(User.id, User.username) # One query, not one per uploader
+        )
+        try:
+            pending_ampersounds, next_cursor = keyset_page(query, Ampersound.timestamp, Ampersound.id, args['cursor'], limit, newest_first=False)
+        except ValueError:
+            abort(400, message="Invalid cursor.")
         
         results = []
         for ampersound in pending_ampersounds:
@@ -23,12 +53,12 @@ class AdminAmpersoundApprovalList(Resource):
                 'id': ampersound.id,
                 'name': ampersound.name,
                 'user_id': ampersound.user_id,
-                'username': ampersound.user.username, # Assuming relationship is loaded or accessible
+                'username': ampersound.user.username, # Eager-loaded above
                 'file_path': ampersound.file_path,
                 'timestamp': ampersound.timestamp.isoformat(),
                 'privacy': ampersound.privacy
             })
-        return results, 200
+        return {'ampersounds': results, 'next_cursor': next_cursor, 'has_more': next_cursor is not None}, 200
 
 class AdminAmpersoundApprovalAction(Resource):
     @admin_required
@@ -46,16 +76,47 @@ class AdminAmpersoundApprovalAction(Resource):
             return {"message": f"Ampersound is not pending approval. Current status: {ampersound.status.value}"}, 400
 
         action = args['action']
-        if action == 'approve':
-            ampersound.status = AmpersoundStatus.APPROVED
-            db.session.commit()
-            return {"message": f"Ampersound '{ampersound.name}' approved."}, 200
-        elif action == 'reject':
-            ampersound.status = AmpersoundStatus.REJECTED
-            # Optionally, you might want to delete the S3 object for rejected ampersounds
-            # or mark it for deletion later. For now, just updating status.
-            db.session.commit()
-            return {"message": f"Ampersound '{ampersound.name}' rejected."}, 200
-        
-        return {"message": "Invalid action."}, 400 # Should be caught by choices in parser
+        if action not in ACTION_STATUSES:
+            return {"message": "Invalid action."}, 400 # Should be caught by choices in parser
+        # Same path as the bulk action, so rejected files are deleted too
+        status = ACTION_STATUSES[action]
+        if not review_pending_ampersounds(status, ids=[ampersound.id]):
+            # Reviewed (or deleted) by someone else since it was read above
+            return {"message": "Ampersound is no longer pending approval."}, 409
+        return {"message": f"Ampersound '{ampersound.name}' {status.value}."}, 200
+
+class AdminAmpersoundBulkAction(Resource):
+    @admin_required
+    def post(self):
+        """
+        Approves or rejects many pending ampersounds in one UPDATE: {"action", "ids": [...]}
+        (at most MAX_BULK_IDS), or a filter {"action", "user_id", "before"}. Ampersounds
+        that are not pending are skipped.
+        """
+        args = bulk_action_parser.parse_args()
+        ids, user_id, before = args['ids'], args['user_id'], args['before']
+        if ids is None and user_id is None and before is None:
+            return {"message": "Provide ids or a filter (user_id, before)."}, 400
+        if ids is not None and len(ids) > MAX_BULK_IDS:
+            return {"message": f"At most {MAX_BULK_IDS} ids per request; use a filter for more."}, 400
+        if before is not None:
+            try:
+                before = datetime.fromisoformat(before)
+            except ValueError:
+                return {"message": "before must be an ISO 8601 timestamp."}, 400
+            if before.tzinfo is not None: # Timestamps are stored as naive UTC
+                before = before.astimezone(timezone.utc).replace(tzinfo=None)
 
+        status = ACTION_STATUSES[args['action']]
+        changed = review_pending_ampersounds(status, ids=ids, user_id=user_id, before=before)
+        return {"message": f"{len(changed)} ampersound(s) {status.value}.", "ids": changed}, 200
+
+class AdminUserContentRestore(Resource):
+    @admin_required
+    def post(self, user_id):
+        """Makes public again the content an admin report restricted (see moderation.py)."""
+        if db.session.get(User, user_id) is None:
+            return {"message": "User not found"}, 404
+        restored = restore_user_content(user_id)
+        db.session.commit()
+        return {"message": "User's restricted content restored.", "restored": restored}, 200
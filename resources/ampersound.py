@@ -9,6 +9,28 @@ from sqlalchemy.orm import joinedload
 
 from models import db, User, Ampersound, AmpersoundStatus, UserType
 from utils import generate_s3_file_url
+from audio_processing import normalize_audio_upload
+from etags import compute_etag, etag_headers, not_modified
+from storage_cleanup import queue_storage_deletions, schedule_storage_sweep
+
+def clean_ampersound_name(name):
+    """Returns the lowercased tag name, or None if `name` is not a valid Ampersound name."""
+    clean_name = secure_filename(name).lower()
+    if not clean_name or clean_name != name.lower() or '&' in clean_name or ' ' in clean_name:
+        return None
+    return clean_name
+
+def ampersound_key(user_id, clean_name, extension):
+    """
+    Storage key for a new ampersound file. Unique per upload, so a deleted ampersound's
+    key (still queued for deletion) is never reused by a new one with the same name.
+    """
+    return f"ampersounds/{user_id}/{clean_name}-{uuid.uuid4().hex}{extension}"
+
+def ampersound_version(sound, owner_username=None):
+    """What a serialized ampersound depends on, for list ETags (the waveform never changes after upload)."""
+    return (sound.id, sound.name, sound.file_path, sound.play_count, sound.privacy, sound.status.value,
+            sound.duration_ms, owner_username)
 
 class AmpersoundListResource(Resource):
     @login_required
@@ -27,8 +49,8 @@ class AmpersoundListResource(Resource):
         if not name:
             return {"message": "Ampersound name is required"}, 400
 
-        clean_name = secure_filename(name).lower()
-        if not clean_name or clean_name != name.lower() or '&' in clean_name or ' ' in clean_name:
+        clean_name = clean_ampersound_name(name)
+        if not clean_name:
             return {"message": "Invalid Ampersound name. Use alphanumeric characters without spaces or '&'."}, 400
 
         if file.filename == '':
@@ -63,8 +85,8 @@ class AmpersoundListResource(Resource):
         if existing_ampersound:
             return {"message": f"You already have an Ampersound named '{clean_name}'."}, 409
 
-        s3_client = current_app.config.get('S3_CLIENT')
-        if file and s3_client:
+        storage = current_app.config.get('STORAGE')
+        if file and storage:
             filename = secure_filename(file.filename)
             content_type = file.mimetype
             extension = mimetypes.guess_extension(content_type)
@@ -73,24 +95,31 @@ class AmpersoundListResource(Resource):
                 elif 'wav' in content_type: extension = '.wav'
                 elif 'ogg' in content_type: extension = '.ogg'
                 else: extension = '.mp3'
+
+            # Transcode to the compact normalized format. If ffmpeg is unavailable or
+            # the transcode fails, fall back to storing the browser recording as-is.
+            normalized = normalize_audio_upload(file, current_app.config)
+            if normalized:
+                extension = normalized['extension']
+                content_type = normalized['content_type']
+                current_app.logger.info(f"Normalized ampersound '{clean_name}': {file_size} -> {len(normalized['data'])} bytes, {normalized['duration_ms']} ms")
             
-            s3_filename = f"ampersounds/{current_user.id}/{clean_name}{extension}"
-            s3_bucket = current_app.config['S3_BUCKET']
+            s3_filename = ampersound_key(current_user.id, clean_name, extension)
 
             try:
-                s3_client.upload_fileobj(
-                    file,
-                    s3_bucket,
-                    s3_filename,
-                    ExtraArgs={'ContentType': content_type}
-                )
+                if normalized:
+                    storage.put(s3_filename, normalized['data'], content_type)
+                else:
+                    storage.put_stream(s3_filename, file, content_type)
                 file_url = generate_s3_file_url(current_app.config, s3_filename)
                 
                 ampersound = Ampersound(
                     user_id=current_user.id,
                     name=clean_name,
                     file_path=s3_filename,
-                    privacy=privacy
+                    privacy=privacy,
+                    duration_ms=normalized['duration_ms'] if normalized else None,
+                    waveform=normalized['waveform'] if normalized else None
                 )
                 db.session.add(ampersound)
                 db.session.commit()
@@ -99,13 +128,15 @@ class AmpersoundListResource(Resource):
                     "name": clean_name, 
                     "url": file_url, 
                     "ampersound_id": ampersound.id,
-                    "status": ampersound.status.value
+                    "status": ampersound.status.value,
+                    "duration_ms": ampersound.duration_ms,
+                    "waveform": ampersound.waveform
                 }, 201
             except Exception as e:
-                current_app.logger.error(f"Error uploading ampersound to S3: {e}")
-                return {"message": "Error uploading file to S3."}, 500
-        elif not s3_client:
-            return {"message": "File storage (S3) is not configured on the server."}, 500
+                current_app.logger.error(f"Error uploading ampersound to storage: {e}")
+                return {"message": "Error uploading file to storage."}, 500
+        elif not storage:
+            return {"message": "File storage is not configured on the server."}, 500
         else:
             return {"message": "Invalid file."}, 400
 
@@ -145,6 +176,11 @@ class AmpersoundListResource(Resource):
             .all()
         )
 
+        etag = compute_etag('ampersounds', [ampersound_version(a, a.user.username) for a in all_ampersounds])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         results = []
         for ampersound in all_ampersounds:
             file_url = generate_s3_file_url(current_app.config, ampersound.file_path)
@@ -159,9 +195,11 @@ class AmpersoundListResource(Resource):
                 'timestamp': ampersound.timestamp.isoformat(),
                 'play_count': ampersound.play_count,
                 'privacy': ampersound.privacy,
-                'status': ampersound.status.value
+                'status': ampersound.status.value,
+                'duration_ms': ampersound.duration_ms,
+                'waveform': ampersound.waveform
             })
-        return results, 200
+        return results, 200, etag_headers(etag)
 
 class AmpersoundResource(Resource):
     def get(self, sound_id=None, username=None, sound_name=None):
@@ -176,7 +214,7 @@ class AmpersoundResource(Resource):
             clean_sound_name = secure_filename(sound_name).lower()
             ampersound = Ampersound.query.filter_by(user_id=user.id, name=clean_sound_name).first()
         
-        if not ampersound:
+        if not ampersound or ampersound.status == AmpersoundStatus.REJECTED: # Rejected files are deleted
             return {"message": "Ampersound not found"}, 404
 
         if not ampersound.is_visible_to(current_user): 
@@ -208,7 +246,9 @@ class AmpersoundResource(Resource):
             "user": ampersound.user.username, 
             "play_count": ampersound.play_count,
             "privacy": ampersound.privacy,
-            "status": ampersound.status.value
+            "status": ampersound.status.value,
+            "duration_ms": ampersound.duration_ms,
+            "waveform": ampersound.waveform
         }, 200
 
     @login_required
@@ -221,21 +261,14 @@ class AmpersoundResource(Resource):
         if not (current_user.user_type == UserType.ADMIN or ampersound.user_id == current_user.id):
             return {"message": "You do not have permission to delete this Ampersound"}, 403
 
-        s3_client = current_app.config.get('S3_CLIENT')
-        s3_bucket = current_app.config.get('S3_BUCKET')
-        s3_key_to_delete = ampersound.file_path
-
         try:
+            # The file is removed by the storage sweeper, once this commit has gone through
+            queued = queue_storage_deletions([ampersound.file_path])
             db.session.delete(ampersound)
             db.session.commit()
+            if queued:
+                schedule_storage_sweep()
 
-            if s3_client and s3_bucket and s3_key_to_delete:
-                try:
-                    s3_client.delete_object(Bucket=s3_bucket, Key=s3_key_to_delete)
-                    current_app.logger.info(f"Successfully deleted S3 object: {s3_key_to_delete}")
-                except Exception as s3_error:
-                    current_app.logger.error(f"Error deleting S3 object {s3_key_to_delete} for deleted ampersound {sound_id}: {s3_error}")
-            
             return {"message": "Ampersound deleted successfully"}, 200
         except Exception as e:
             db.session.rollback()
@@ -246,7 +279,16 @@ class MyAmpersoundsResource(Resource):
     @login_required
     def get(self):
         """List Ampersounds owned by the current user."""
-        user_ampersounds = Ampersound.query.filter_by(user_id=current_user.id).order_by(Ampersound.timestamp.desc()).all()
+        # Rejected ampersounds are left out: their files were deleted when they were rejected
+        user_ampersounds = (
+            Ampersound.query.filter(Ampersound.user_id == current_user.id, Ampersound.status != AmpersoundStatus.REJECTED)
+            .order_by(Ampersound.timestamp.desc())
+            .all()
+        )
+        etag = compute_etag('my_ampersounds', [ampersound_version(a) for a in user_ampersounds])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         results = []
         for ampersound in user_ampersounds:
             file_url = generate_s3_file_url(current_app.config, ampersound.file_path)
@@ -257,9 +299,11 @@ class MyAmpersoundsResource(Resource):
                 'url': file_url,
                 'timestamp': ampersound.timestamp.isoformat(),
                 'privacy': ampersound.privacy,
-                'status': ampersound.status.value
+                'status': ampersound.status.value,
+                'duration_ms': ampersound.duration_ms,
+                'waveform': ampersound.waveform
             })
-        return results, 200
+        return results, 200, etag_headers(etag)
 
 class AmpersoundSearchResource(Resource):
     def get(self):
@@ -314,7 +358,12 @@ class AmpersoundSearchResource(Resource):
             .limit(limit)
         )
         found_ampersounds = ampersounds_query.all()
-        
+
+        etag = compute_etag('ampersound_search', [ampersound_version(s, s.user.username) for s in found_ampersounds])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         results = []
         for sound in found_ampersounds:
             tag = f"&{sound.user.username}.{sound.name}"
@@ -329,6 +378,7 @@ class AmpersoundSearchResource(Resource):
                 "name": sound.name,
                 "url": file_url,
                 "privacy": sound.privacy,
-                "status": sound.status.value
+                "status": sound.status.value,
+                "duration_ms": sound.duration_ms
             })
-        return results, 200
+        return results, 200, etag_headers(etag)
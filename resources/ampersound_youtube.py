@@ -12,6 +12,8 @@ from cryptography.fernet import Fernet
 
 from models import db, Ampersound, AmpersoundStatus
 from utils import generate_s3_file_url
+from audio_processing import normalize_audio
+from resources.ampersound import ampersound_key
 
 class AmpersoundFromYoutubeResource(Resource):
     @login_required
@@ -46,10 +48,10 @@ class AmpersoundFromYoutubeResource(Resource):
         if existing_ampersound:
             return {"message": f"You already have an Ampersound named '{clean_name}'."}, 409
 
-        s3_client = current_app.config.get('S3_CLIENT')
-        if not s3_client:
-            current_app.logger.error("S3 client not configured.")
-            return {"message": "File storage (S3) is not configured on the server."}, 500
+        storage = current_app.config.get('STORAGE')
+        if not storage:
+            current_app.logger.error("Storage backend not configured.")
+            return {"message": "File storage is not configured on the server."}, 500
 
         decrypted_cookie_temp_file = None
         try:
@@ -151,16 +153,19 @@ class AmpersoundFromYoutubeResource(Resource):
                 if file_size > MAX_AUDIO_SIZE:
                     return {"message": f"Processed audio file size ({file_size // 1024}KB) exceeds the limit of {MAX_AUDIO_SIZE / 1024 / 1024}MB."}, 413
 
-                s3_filename = f"ampersounds/{current_user.id}/{clean_name}.mp3"
-                s3_bucket = current_app.config['S3_BUCKET']
-                
-                with open(extracted_audio_path, 'rb') as f_upload:
-                    s3_client.upload_fileobj(
-                        f_upload,
-                        s3_bucket,
-                        s3_filename,
-                        ExtraArgs={'ContentType': 'audio/mpeg'}
-                    )
+                # Run the extracted clip through the same normalization stage as direct uploads.
+                # Falls back to the 128k mp3 cut above if normalization is unavailable.
+                normalized = normalize_audio(extracted_audio_path, current_app.config)
+                extension = normalized['extension'] if normalized else '.mp3'
+                content_type = normalized['content_type'] if normalized else 'audio/mpeg'
+
+                s3_filename = ampersound_key(current_user.id, clean_name, extension)
+
+                if normalized:
+                    storage.put(s3_filename, normalized['data'], content_type)
+                else:
+                    with open(extracted_audio_path, 'rb') as f_upload:
+                        storage.put_stream(s3_filename, f_upload, content_type)
                 
                 file_url = generate_s3_file_url(current_app.config, s3_filename)
                 
@@ -169,7 +174,9 @@ class AmpersoundFromYoutubeResource(Resource):
                     name=clean_name,
                     file_path=s3_filename,
                     privacy=privacy,
-                    status=AmpersoundStatus.PENDING_APPROVAL
+                    status=AmpersoundStatus.PENDING_APPROVAL,
+                    duration_ms=normalized['duration_ms'] if normalized else duration * 1000,
+                    waveform=normalized['waveform'] if normalized else None
                 )
                 db.session.add(ampersound)
                 db.session.commit()
@@ -179,7 +186,9 @@ class AmpersoundFromYoutubeResource(Resource):
                     "name": clean_name, 
                     "url": file_url,
                     "ampersound_id": ampersound.id,
-                    "status": ampersound.status.value
+                    "status": ampersound.status.value,
+                    "duration_ms": ampersound.duration_ms,
+                    "waveform": ampersound.waveform
                 }, 201
         except IntegrityError as e:
             db.session.rollback()
@@ -3,6 +3,7 @@ from flask_restful import Resource
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User, InviteCode # Import InviteCode
 from flask_login import login_user, logout_user, login_required
+from flask_limiter.util import get_remote_address
 from extensions import limiter # Import the limiter instance
 import os
 
@@ -76,8 +77,8 @@ class UserRegistration(Resource):
             return {'message': 'An error occurred during registration.'}, 500 
 
 class UserLogin(Resource):
-    # Apply rate limit using method_decorators and the imported limiter
-    method_decorators = {'post': [limiter.limit("20 per day")]}
+    # Login attempts are limited per client IP (LOGIN_RATE_LIMIT), whoever is logged in
+    method_decorators = {'post': [limiter.limit(lambda: current_app.config.get('LOGIN_RATE_LIMIT', "10 per minute"), key_func=get_remote_address)]}
 
     def post(self):
         data = request.get_json()
@@ -14,13 +14,15 @@ from resources.post import FormattedContent # Import FormattedContent
 author_fields = {
     'id': fields.Integer,
     'username': fields.String,
-    'profile_picture': fields.String
+    'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw
 }
 
 post_category_fields = {
     'id': fields.Integer,
     'content': FormattedContent(attribute=lambda x: x), # Use FormattedContent for safety/consistency
     'image_url': fields.String,
+    'image_variants': fields.Raw,
     'timestamp': fields.DateTime(dt_format='iso8601'),
     'privacy': fields.String(attribute='privacy.name'), 
     'author': fields.Nested(author_fields),
@@ -1,16 +1,26 @@
 from flask import request, current_app
-from flask_restful import Resource, reqparse, fields, marshal_with
+from flask_restful import Resource, reqparse, fields, marshal_with, marshal, abort
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
 
-from models import db, Post, Comment, User, PostPrivacy, Notification # Import Notification
+from models import db, Post, Comment, User, PostPrivacy
+from notifications import notify_new_comment
+from etags import compute_etag, etag_headers, not_modified, author_version
+from serializers import compile_fields
 # Import the formatter function
-from utils import format_text_with_ampersounds 
+from utils import format_text_with_ampersounds, resolve_ampersound_tags, keyset_page
+
+COMMENTS_PAGE_SIZE = 50
+MAX_COMMENTS_PAGE_SIZE = 100
+MAX_COMMENTS_PREVIEW = 10
 
 # --- Field definitions for Marshaling --- 
 # Re-use author_fields if defined elsewhere or define here
 author_fields = {
     'id': fields.Integer,
-    'username': fields.String
+    'username': fields.String,
+    'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw
 }
 
 # Formatted content field for Ampersounds in comments
@@ -18,6 +28,10 @@ class FormattedCommentContent(fields.Raw):
     def format(self, value):
         # 'value' here is the comment object itself, passed via attribute
         comment_object = value
+        # Lists are rendered up front by render_comments() with one batch of tag lookups
+        rendered = getattr(comment_object, 'rendered_content', None)
+        if rendered is not None:
+            return rendered
         # Ensure author is loaded. If not, this will cause a lazy load.
         # It's better if author is eager-loaded in the query.
         if not comment_object.content or not comment_object.author:
@@ -32,15 +46,43 @@ comment_fields = {
     'post_id': fields.Integer
 }
 
+comment_page_fields = {
+    'comments': fields.List(fields.Nested(comment_fields)),
+    'next_cursor': fields.String,
+    'has_more': fields.Boolean
+}
+
+serialize_comment_page = compile_fields(comment_page_fields)
+
 # Parser for creating a comment
 comment_parser = reqparse.RequestParser()
 comment_parser.add_argument('content', type=str, required=True, help='Comment content cannot be empty', location='json')
 
+# Parser for listing comments
+comment_list_parser = reqparse.RequestParser()
+comment_list_parser.add_argument('order', type=str, choices=('oldest', 'newest'), default='oldest', location='args', help="order must be 'oldest' or 'newest'")
+comment_list_parser.add_argument('limit', type=int, default=COMMENTS_PAGE_SIZE, location='args')
+comment_list_parser.add_argument('cursor', type=str, location='args')
+comment_list_parser.add_argument('preview', type=int, location='args', help='Number of latest comments to return for inline display')
+
+
+def render_comments(comments):
+    """Formats ampersound tags for a whole page of comments with one batch of lookups."""
+    resolved_tags = resolve_ampersound_tags([comment.content for comment in comments])
+    for comment in comments:
+        comment.rendered_content = format_text_with_ampersounds(comment.content, comment.author.username, resolved_tags)
+    return comments
+
 class CommentListResource(Resource):
     # Get comments for a specific post
     # @login_required # Removed for public comment viewing
-    @marshal_with(comment_fields) # Use marshal_with for list items
     def get(self, post_id):
+        """
+        Comments on a post, one page at a time (keyset pagination on timestamp, id).
+        ?order=oldest|newest, ?limit=N (max 100), ?cursor=<next_cursor of the previous page>.
+        ?preview=N returns the latest N comments in chronological order, for inline display;
+        its next_cursor continues with order=newest.
+        """
         post = Post.query.get_or_404(post_id)
         
         # --- BEGIN PERMISSION CHECK ---
@@ -71,8 +113,34 @@ class CommentListResource(Resource):
             return {'message': 'Cannot view comments.'}, 403
         # --- END PERMISSION CHECK ---
 
-        comments = Comment.query.filter_by(post_id=post_id).order_by(Comment.timestamp.asc()).all()
-        return comments # Marshal list of comments
+        args = comment_list_parser.parse_args()
+        if args['preview'] is not None:
+            limit = min(max(args['preview'], 1), MAX_COMMENTS_PREVIEW)
+            newest_first = True
+        else:
+            limit = min(max(args['limit'], 1), MAX_COMMENTS_PAGE_SIZE)
+            newest_first = args['order'] == 'newest'
+
+        query = Comment.query.filter_by(post_id=post_id).options(joinedload(Comment.author))
+        try:
+            comments, next_cursor = keyset_page(query, Comment.timestamp, Comment.id, args['cursor'], limit, newest_first)
+        except ValueError:
+            abort(400, message="Invalid cursor.")
+        has_more = next_cursor is not None
+        if args['preview'] is not None:
+            comments.reverse() # Latest N, shown oldest to newest
+
+        # Comments are immutable, so ids and author fields identify the page; checked before rendering
+        etag = compute_etag('comments', next_cursor, [(c.id, author_version(c.author)) for c in comments])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        return serialize_comment_page({
+            'comments': render_comments(comments),
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200, etag_headers(etag)
 
     # Create a new comment for a specific post
     @login_required
@@ -108,20 +176,10 @@ class CommentListResource(Resource):
             db.session.commit()
             # Create notifications: notify post author and previous commenters
             try:
-                # Notify post author if commenter is not the author
-                if post.user_id != current_user.id:
-                    notif = Notification(user_id=post.user_id, actor_id=current_user.id, post_id=post_id, comment_id=new_comment.id)
-                    db.session.add(notif)
-                # Notify other previous commenters
-                prev_user_ids = {c.user_id for c in Comment.query.filter_by(post_id=post_id).all()}
-                prev_user_ids.discard(current_user.id)
-                prev_user_ids.discard(post.user_id)
-                for uid in prev_user_ids:
-                    notif = Notification(user_id=uid, actor_id=current_user.id, post_id=post_id, comment_id=new_comment.id)
-                    db.session.add(notif)
-                db.session.commit()
-            except Exception:
+                notify_new_comment(new_comment, post)
+            except Exception as e:
                 db.session.rollback()
+                current_app.logger.error(f"Failed to create notifications for comment {new_comment.id}: {e}")
             return new_comment, 201 # Return created comment with 201 status
         except Exception as e:
             db.session.rollback()
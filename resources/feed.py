@@ -1,5 +1,5 @@
 from flask import current_app, jsonify
-from flask_restful import Resource, fields, marshal_with, reqparse, abort
+from flask_restful import Resource, fields, reqparse, abort, inputs
 from flask_login import current_user, login_required
 from sqlalchemy.orm import joinedload, undefer
 from sqlalchemy import desc, func, union_all, or_, and_, case # Added case
@@ -7,20 +7,24 @@ import math # For ceiling division in pagination calculation
 import sys # Added for print statements
 
 from models import db, User, Post, UserInterest, PostCategoryScore, PostPrivacy, FriendRequest, FriendRequestStatus
-from resources.post import FormattedContent  # Import formatted content field for ampersounds
+from resources.post import FormattedContent, post_version, render_posts  # Import formatted content field for ampersounds
+from etags import compute_etag, etag_headers, not_modified
+from serializers import PageSerializer
 
 # --- Field definitions for Marshaling ---
 # Attempt to re-use or define fields consistently
 author_fields = {
     'id': fields.Integer,
     'username': fields.String,
-    'profile_picture': fields.String
+    'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw
 }
 
 post_feed_fields = {
     'id': fields.Integer,
     'content': FormattedContent(attribute=lambda x: x),  # Use formatted content with ampersound spans
     'image_url': fields.String,
+    'image_variants': fields.Raw,
     'timestamp': fields.DateTime(dt_format='iso8601'),
     'privacy': fields.String(attribute='privacy.name'), 
     'author': fields.Nested(author_fields),
@@ -40,21 +44,29 @@ feed_response_fields = {
     'message': fields.String(default=None)
 }
 
+serialize_feed_page = PageSerializer(feed_response_fields)
+
 # --- Parser ---
 feed_parser = reqparse.RequestParser()
 feed_parser.add_argument('page', type=int, default=1, location='args')
 feed_parser.add_argument('per_page', type=int, default=10, location='args')
 feed_parser.add_argument('sort_by', type=str, default='relevance', location='args', choices=('relevance', 'recency'), help='Sort order for the feed. "relevance" (default) or "recency".')
+feed_parser.add_argument('fields', type=str, location='args', help='Comma-separated post fields to return')
+feed_parser.add_argument('compact', type=inputs.boolean, default=False, location='args', help='Authors in a users map, scores only if selected')
 
 class FeedResource(Resource):
     @login_required
-    @marshal_with(feed_response_fields)
     def get(self):
         args = feed_parser.parse_args()
         page = args['page']
         per_page = args['per_page']
         sort_by = args['sort_by']
         offset = (page - 1) * per_page
+        try:
+            selection = serialize_feed_page.parse_selection(args['fields'])
+        except ValueError as e:
+            abort(400, message=str(e))
+        compact = args['compact']
         
         blocked_categories = current_app.config.get('BLOCKED_CATEGORIES', set())
         friend_ids = current_user.get_friend_ids()
@@ -197,11 +209,18 @@ class FeedResource(Resource):
         # Calculate total pages based on total_items (which was counted *before* category filtering)
         total_pages = math.ceil(total_items / per_page) if total_items > 0 else 1
 
-        return {
-            'posts': filtered_posts, 
+        # Same page of the same post versions: answer 304 before formatting and marshalling
+        etag = compute_etag('feed', page, per_page, total_items, message, sorted(selection or ()), compact,
+                            [post_version(p) for p in filtered_posts])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        return serialize_feed_page({
+            'posts': render_posts(filtered_posts), # One batch of ampersound lookups for the page
             'page': page,
             'per_page': per_page,
             'total_items': total_items, 
             'total_pages': total_pages,
             'message': message
-        }
\ No newline at end of file
+        }, selection, compact), 200, etag_headers(etag)
\ No newline at end of file
@@ -9,7 +9,8 @@ from models import db, User, FriendRequest, FriendRequestStatus
 user_summary_fields = {
     'id': fields.Integer,
     'username': fields.String,
-    'profile_picture': fields.String
+    'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw
 }
 
 friend_request_fields = {
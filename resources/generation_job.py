@@ -0,0 +1,36 @@
+from flask import current_app
+from flask_restful import Resource, abort
+from flask_login import current_user, login_required
+
+from models import db, GenerationJob, GenerationJobStatus
+from generation_jobs import expire_stale_job
+
+
+def job_to_dict(job):
+    data = {
+        'job_id': job.id,
+        'kind': job.kind.value,
+        'status': job.status.value,
+        'prompt': job.prompt,
+        'source_post_id': job.source_post_id,
+        'post_id': job.result_post_id,
+        'image_url': job.result_post.image_url if job.result_post else None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == GenerationJobStatus.QUEUED:
+        scheduler = current_app.config.get('GENERATION_SCHEDULER')
+        data['queued_jobs'] = scheduler.pending_count() if scheduler else 0
+    return data
+
+
+class GenerationJobResource(Resource):
+    @login_required
+    def get(self, job_id):
+        """Poll an image generation or remix job. post_id is set once status is 'succeeded'."""
+        job = db.session.get(GenerationJob, job_id)
+        if not job or job.user_id != current_user.id:
+            abort(404, message="Job not found.")
+        expire_stale_job(job)
+        return job_to_dict(job), 200
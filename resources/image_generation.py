@@ -1,4 +1,4 @@
-from openai import OpenAI, APIError
+from openai import APIError
 from flask import current_app, jsonify, request
 from flask_restful import Resource, reqparse, abort
 from flask_login import current_user, login_required
@@ -9,161 +9,165 @@ import io
 import base64
 from datetime import datetime, timezone
 
-from models import db, Post, User, PostCategoryScore, UserImageGenerationStats
+from models import db, Post, User, PostCategoryScore, UserImageGenerationStats, GenerationJob, GenerationJobKind
+from image_processing import queue_post_image_variants
+from generation_jobs import GenerationJobError, enqueue_generation_job, active_job_count, expire_stale_jobs, mark_job_succeeded
+from storage_cleanup import queue_storage_deletions, schedule_storage_sweep
+
+DAILY_GENERATION_LIMIT = 20
 
 # --- Parser for image generation ---
 image_gen_parser = reqparse.RequestParser()
 image_gen_parser.add_argument('prompt', type=str, required=True, help='Prompt for image generation cannot be blank')
 image_gen_parser.add_argument(
-    'prompt', 
-    type=lambda x: x if len(x) <= 500 else abort(400, message="Prompt cannot exceed 500 characters."), 
-    required=True, 
+    'prompt',
+    type=lambda x: x if len(x) <= 500 else abort(400, message="Prompt cannot exceed 500 characters."),
+    required=True,
     help='Prompt for image generation (max 500 characters)'
 )
 
-class ImageGenerationResource(Resource):
-    def _get_r2_file_url(self, app_config, s3_key):
-        """Helper to generate R2/S3 file URL based on app configuration."""
-        if not s3_key:
-            return None
-
-        s3_bucket = app_config.get('S3_BUCKET')
-        domain_name_images = app_config.get('DOMAIN_NAME_IMAGES')
-        s3_endpoint_url = app_config.get('S3_ENDPOINT_URL')
-
-        file_url = None
-        if s3_bucket:
-            try:
-                if domain_name_images:
-                    file_url = f"{domain_name_images}/{s3_key}"
-                elif s3_endpoint_url:
-                    file_url = f"{s3_endpoint_url}/{s3_bucket}/{s3_key}"
-            except Exception as e:
-                current_app.logger.error(f"Error generating R2/S3 URL for key {s3_key}: {e}")
-                return None
-        return file_url
 
+def reserve_generation_quota(user_id, limit_message, generation_date):
+    """
+    Takes one generation from the user's daily quota for a job about to be queued,
+    aborting with 429 if it is used up or the user has too many jobs in flight.
+    The reservation joins the current transaction, so it is committed with the job
+    and given back by the job runner if the generation fails.
+    """
+    expire_stale_jobs(user_id) # Jobs lost to a restart would otherwise hold the cap forever
+    if active_job_count(user_id) >= current_app.config.get('GENERATION_MAX_ACTIVE_JOBS_PER_USER', 3):
+        abort(429, message="You already have image generations in progress. Please wait for them to finish.")
+    if UserImageGenerationStats.reserve(user_id, DAILY_GENERATION_LIMIT, generation_date) is None:
+        abort(429, message=limit_message)
+
+
+def save_generated_image_post(job, image_data_bytes, content_type, extension, key_prefix, content, parent_post_id=None):
+    """
+    Uploads a generated image, classifies it and creates its post, committed together
+    with the job's success. Shared by the generation and remix jobs. Returns the new Post.
+    """
+    user_id = job.user_id
+    storage = current_app.config.get('STORAGE')
+    if not storage:
+        raise GenerationJobError("File storage is not configured.")
+    if not image_data_bytes:
+        raise GenerationJobError("Decoded image data is empty.")
+
+    # 1. Upload to storage
+    s3_filename = f"{key_prefix}/{user_id}/{uuid.uuid4()}{extension}"
+    storage.put_stream(s3_filename, io.BytesIO(image_data_bytes), content_type)
+
+    # 2. Get the public URL
+    final_image_url = storage.url(s3_filename)
+    if not final_image_url:
+        try:
+            storage.delete(s3_filename)
+            current_app.logger.info(f"Cleaned up stored object {s3_filename} after URL generation failure.")
+        except Exception as s3_del_e:
+            current_app.logger.error(f"Failed to cleanup stored object {s3_filename}: {s3_del_e}")
+        raise GenerationJobError("Failed to construct final image URL after uploading to storage.")
+
+    # 3. Classify the image using Gemma
+    gemma_classifier = current_app.config.get('GEMMA_CLASSIFIER')
+    image_classification_scores = {}
+    if gemma_classifier:
+        try:
+            image_classification_scores = gemma_classifier.classify_image(image_data_bytes)
+            current_app.logger.info(f"Image classification successful for {s3_filename}: {image_classification_scores}")
+        except Exception as e:
+            # Proceeding without classification scores if error occurs
+            current_app.logger.error(f"Error during image classification for {s3_filename}: {e}")
+    else:
+        current_app.logger.warning("Gemma classifier not found in app config. Skipping image classification.")
+
+    # 4. Create a new post with the image URL and classification scores
+    new_post = Post(
+        content=content,
+        user_id=user_id,
+        image_url=final_image_url,
+        classification_scores=image_classification_scores,
+        parent_post_id=parent_post_id
+    )
+    db.session.add(new_post)
+    db.session.flush() # Flush to get new_post.id for PostCategoryScore
+
+    # 5. Populate PostCategoryScore from classification results
+    if image_classification_scores:
+        for category, score in image_classification_scores.items():
+            if isinstance(score, (float, int)) and score > 0:
+                post_category_score = PostCategoryScore(
+                    post_id=new_post.id,
+                    category=category,
+                    score=float(score)
+                )
+                db.session.add(post_category_score)
+
+    if not mark_job_succeeded(job.id, new_post.id):
+        # Timed out while running and already refunded: drop the post rather than give a free generation
+        db.session.rollback()
+        queue_storage_deletions([s3_filename])
+        db.session.commit()
+        schedule_storage_sweep()
+        raise GenerationJobError("Image generation timed out. Please try again.")
+    db.session.commit() # Quota was already reserved when the job was queued
+    queue_post_image_variants(new_post.id, s3_filename)
+    return new_post
+
+
+def generate_image_post(job):
+    """Job runner: generates an image for job.prompt (FLUX via DeepInfra) and posts it."""
+    openai_client = current_app.config['HTTP_CLIENTS'].openai(
+            'deepinfra',
+            api_key=current_app.config.get('OPENAI_API_KEY'),
+            base_url=current_app.config.get('DEEPINFRA_API_BASE', "https://api.deepinfra.com/v1/openai"),
+         )
+
+    try:
+        response = openai_client.images.generate(
+            prompt=job.prompt,
+            model="black-forest-labs/FLUX-1-schnell",
+            n=1,
+            size="1024x1024",
+            response_format="b64_json"
+        )
+    except APIError as e:
+        current_app.logger.error(f"OpenAI API error: {e}")
+        raise GenerationJobError(f"OpenAI API error: {str(e)}")
+
+    if not response.data or not response.data[0].b64_json:
+        current_app.logger.error(f"Unexpected OpenAI API response structure: {response}")
+        raise GenerationJobError("Failed to retrieve image data from OpenAI API.")
+
+    return save_generated_image_post(
+        job,
+        base64.b64decode(response.data[0].b64_json),
+        content_type='image/png',
+        extension='.png',
+        key_prefix='generated_images',
+        content=f"Generated image with prompt: {job.prompt}"
+    )
+
+
+class ImageGenerationResource(Resource):
     @login_required
     def post(self):
+        """Queues an image generation. Returns 202 with a job id to poll at /api/v1/generation_jobs/<id>."""
         args = image_gen_parser.parse_args()
         prompt = args['prompt']
 
-        # Rate limiting check
-        today = datetime.now(timezone.utc).date()
-        stats = UserImageGenerationStats.query.filter_by(user_id=current_user.id, generation_date=today).first()
-
-        if stats and stats.count >= 20:
-            abort(429, message="You have reached your daily limit of 20 image generations.")
-
-        openai_api_key = current_app.config.get('OPENAI_API_KEY')
-        openai_client = OpenAI(
-                api_key=openai_api_key,
-                base_url="https://api.deepinfra.com/v1/openai",
-             )
-        s3_client = current_app.config.get('S3_CLIENT')
-        s3_bucket = current_app.config.get('S3_BUCKET')
-        if not s3_client or not s3_bucket:
-            abort(500, message="S3/R2 storage is not configured.")
-
-        try:
-            # 1. Call OpenAI API to generate image
-            response = openai_client.images.generate(
-                prompt=prompt,
-                model="black-forest-labs/FLUX-1-schnell",
-                n=1,
-                size="1024x1024",
-                response_format="b64_json"
-            )
-
-            if not response.data or not response.data[0].b64_json:
-                current_app.logger.error(f"Unexpected OpenAI API response structure: {response}")
-                abort(500, message="Failed to retrieve image data from OpenAI API.")
-
-            # 2. Decode the base64 image data
-            image_b64_json = response.data[0].b64_json
-            image_data_bytes = base64.b64decode(image_b64_json)
-            image_data = io.BytesIO(image_data_bytes)
-
-            if image_data.getbuffer().nbytes == 0:
-                abort(500, message="Decoded image data is empty.")
-
-            content_type = 'image/png'
-            extension = '.png'
-
-            # 3. Upload to R2
-            s3_filename = f"generated_images/{current_user.id}/{uuid.uuid4()}{extension}"
-            
-            # Reset stream position for upload_fileobj after reading for classification
-            image_data.seek(0) 
-
-            s3_client.upload_fileobj(
-                image_data,
-                s3_bucket,
-                s3_filename,
-                ExtraArgs={'ContentType': content_type}
-            )
-            
-            # 4. Get the R2 public URL
-            final_image_url = self._get_r2_file_url(current_app.config, s3_filename)
-            if not final_image_url:
-                try:
-                    s3_client.delete_object(Bucket=s3_bucket, Key=s3_filename)
-                    current_app.logger.info(f"Cleaned up S3 object {s3_filename} after URL generation failure.")
-                except Exception as s3_del_e:
-                    current_app.logger.error(f"Failed to cleanup S3 object {s3_filename}: {s3_del_e}")
-                abort(500, message="Failed to construct final image URL after uploading to R2.")
-
-            # 5. Classify the image using Gemma
-            gemma_classifier = current_app.config.get('GEMMA_CLASSIFIER')
-            image_classification_scores = {}
-            if gemma_classifier:
-                # Ensure image_data_bytes is available. If image_data is BytesIO, get its value.
-                img_bytes_for_classification = image_data_bytes
-                try:
-                    image_classification_scores = gemma_classifier.classify_image(img_bytes_for_classification)
-                    current_app.logger.info(f"Image classification successful for generated image: {image_classification_scores}")
-                except Exception as e:
-                    current_app.logger.error(f"Error during image classification for generated image: {e}")
-                    # Decide if you want to abort or proceed without classification
-                    # For now, proceeding without classification scores if error occurs
-            else:
-                current_app.logger.warning("Gemma classifier not found in app config. Skipping image classification.")
-
-            # 6. Create a new post with the R2 image URL and classification scores
-            new_post = Post(
-                content=f"Generated image with prompt: {prompt}",
-                user_id=current_user.id,
-                image_url=final_image_url,
-                classification_scores=image_classification_scores
-            )
-            db.session.add(new_post)
-            db.session.flush() # Flush to get new_post.id for PostCategoryScore
-
-            # 7. Populate PostCategoryScore from classification results
-            if image_classification_scores:
-                for category, score in image_classification_scores.items():
-                    if isinstance(score, (float, int)) and score > 0:
-                        post_category_score = PostCategoryScore(
-                            post_id=new_post.id,
-                            category=category,
-                            score=float(score)
-                        )
-                        db.session.add(post_category_score)
-            
-            # Update generation stats
-            if stats:
-                stats.count += 1
-            else:
-                stats = UserImageGenerationStats(user_id=current_user.id, generation_date=today, count=1)
-                db.session.add(stats)
-            
-            db.session.commit()
-
-            return {'message': 'Image generated, classified, uploaded to R2, and post created successfully', 'post_id': new_post.id, 'image_url': final_image_url, 'classification': image_classification_scores}, 201
-
-        except APIError as e:
-            current_app.logger.error(f"OpenAI API error: {e}")
-            abort(e.http_status or 500, message=f"OpenAI API error: {str(e)}")
-        except Exception as e:
-            current_app.logger.error(f"An unexpected error occurred during OpenAI image generation and upload: {e}", exc_info=True)
-            abort(500, message="An unexpected error occurred during image generation and R2 upload.")
+        if not current_app.config.get('STORAGE'):
+            abort(500, message="File storage is not configured.")
+
+        now = datetime.now(timezone.utc)
+        reserve_generation_quota(current_user.id, f"You have reached your daily limit of {DAILY_GENERATION_LIMIT} image generations.", now.date())
+        job = GenerationJob(user_id=current_user.id, kind=GenerationJobKind.GENERATE, prompt=prompt, created_at=now)
+        db.session.add(job)
+        db.session.commit()
+        enqueue_generation_job(job)
+
+        return {
+            'message': 'Image generation queued',
+            'job_id': job.id,
+            'status': 'queued',
+            'poll_url': f"/api/v1/generation_jobs/{job.id}"
+        }, 202
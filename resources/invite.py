@@ -55,14 +55,9 @@ class InviteResource(Resource):
                 'registration_url': f"{frontend_base_url}/register?invite_code={code.code}" if frontend_base_url else None
             }
 
-        # Explicitly reload user from DB to ensure fresh data
-        fresh_user = User.query.get(current_user.id)
-        if not fresh_user:
-             # Should not happen if user is authenticated, but good check
-             abort(401, message="Could not reload user data.")
-
-        invites_left_value = fresh_user.invites_left # Use reloaded user data
-        print(f"INFO: GET /invites: Returning invites_left = {invites_left_value} for user {fresh_user.username}") 
+        # The session user snapshot is invalidated whenever invites_left changes, so no reload is needed
+        invites_left_value = current_user.invites_left
+        print(f"INFO: GET /invites: Returning invites_left = {invites_left_value} for user {current_user.username}") 
 
         return {
             'unused_codes': [serialize_code(code) for code in unused_codes],
@@ -87,9 +82,8 @@ class InviteResource(Resource):
             abort(400, message='No invites left to generate') # Use abort
 
         new_code = InviteCode(issuer_id=current_user.id)
-        current_user.invites_left -= 1
+        fresh_user.invites_left -= 1
         db.session.add(new_code)
-        db.session.add(current_user) # Add user to session to save invites_left change
         try:
             db.session.commit()
             # Need to reconstruct URL here too if returned via marshal_with
@@ -1,6 +1,19 @@
-from flask_restful import Resource, fields, marshal_with
+import queue
+import time
+
+from flask import Response, current_app, stream_with_context
+from flask_restful import Resource, fields, marshal_with, marshal, reqparse, inputs, abort
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+
 from models import db, Notification, User
+from notifications import summarize_actors, mark_notifications_read
+from events import unread_count, publish_unread_counts, format_sse
+from utils import keyset_page, encode_cursor, decode_cursor
+from serializers import compile_fields
+
+NOTIFICATIONS_PAGE_SIZE = 20
+MAX_NOTIFICATIONS_PAGE_SIZE = 100
 
 # Actor (user who performed the action) fields
 actor_fields = {
@@ -18,13 +31,68 @@ notification_fields = {
     'is_read': fields.Boolean
 }
 
+# List entries are coalesced per post: "<actors> and N others commented"
+notification_list_fields = dict(notification_fields, **{
+    'actors': fields.List(fields.Nested(actor_fields)),
+    'actor_count': fields.Integer
+})
+
+notification_page_fields = {
+    'notifications': fields.List(fields.Nested(notification_list_fields)),
+    'next_cursor': fields.String,
+    'has_more': fields.Boolean,
+    'latest_cursor': fields.String # First page only: position of the newest entry; pass as up_to to mark everything up to it read
+}
+
+serialize_notification_page = compile_fields(notification_page_fields)
+
+notification_list_parser = reqparse.RequestParser()
+notification_list_parser.add_argument('limit', type=int, default=NOTIFICATIONS_PAGE_SIZE, location='args')
+notification_list_parser.add_argument('cursor', type=str, location='args')
+notification_list_parser.add_argument('unread', type=inputs.boolean, default=False, location='args')
+
+mark_read_parser = reqparse.RequestParser()
+mark_read_parser.add_argument('up_to', type=str, location='json', help='latest_cursor of a notification list; omit to mark all read')
+
 class NotificationListResource(Resource):
     @login_required
-    @marshal_with(notification_fields)
     def get(self):
-        # Return all notifications for current user, newest first
-        notifs = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.timestamp.desc()).all()
-        return notifs, 200
+        """
+        The current user's notifications, newest first, one page at a time.
+        ?limit=N (max 100), ?cursor=<next_cursor of the previous page>, ?unread=true for unread only.
+        """
+        args = notification_list_parser.parse_args()
+        limit = min(max(args['limit'], 1), MAX_NOTIFICATIONS_PAGE_SIZE)
+
+        query = Notification.query.filter_by(user_id=current_user.id).options(joinedload(Notification.actor))
+        if args['unread']:
+            query = query.filter_by(is_read=False)
+        try:
+            notifs, next_cursor = keyset_page(query, Notification.timestamp, Notification.id, args['cursor'], limit, newest_first=True)
+        except ValueError:
+            abort(400, message="Invalid cursor.")
+
+        return serialize_notification_page({
+            'notifications': summarize_actors(notifs),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            # Only the first page starts at the newest notification
+            'latest_cursor': encode_cursor(notifs[0].timestamp, notifs[0].id) if notifs and not args['cursor'] else None
+        }), 200
+
+class NotificationMarkReadResource(Resource):
+    @login_required
+    def post(self):
+        """Marks all unread notifications read, or those at or before `up_to`, in one UPDATE."""
+        args = mark_read_parser.parse_args()
+        up_to = None
+        if args['up_to']:
+            try:
+                up_to = decode_cursor(args['up_to'])
+            except ValueError:
+                abort(400, message="Invalid cursor.")
+        marked = mark_notifications_read(current_user.id, up_to)
+        return {'marked_read': marked}, 200
 
 class NotificationResource(Resource):
     @login_required
@@ -35,10 +103,73 @@ class NotificationResource(Resource):
             return {'message': 'Forbidden'}, 403
         notif.is_read = True
         db.session.commit()
+        publish_unread_counts([notif.user_id])
         return notif, 200
 
 class UnreadCountResource(Resource):
     @login_required
     def get(self):
-        count = Notification.query.filter_by(user_id=current_user.id, is_read=False).count()
-        return {'unread_count': count}, 200
+        return {'unread_count': unread_count(current_user.id)}, 200
+
+class NotificationStreamResource(Resource):
+    @login_required
+    def get(self):
+        """
+        Server-Sent Events stream of the current user's notifications. Sends
+        `unread_count` ({unread_count}) on connect and whenever it changes, and
+        `notification` ({post_id, comment_id, actor_id}) for each new comment notification.
+        The stream ends after NOTIFICATION_STREAM_MAX_AGE seconds; EventSource reconnects.
+        When NOTIFICATION_STREAM_MAX_OPEN streams are already open in this process it
+        answers 503 with Retry-After; clients then poll /notifications/unread_count.
+        """
+        user_id = current_user.id
+        config = current_app.config
+        broker = config['EVENT_BROKER']
+        heartbeat = config.get('NOTIFICATION_STREAM_HEARTBEAT', 25)
+        resync = config.get('NOTIFICATION_STREAM_RESYNC', 60)
+        max_age = config.get('NOTIFICATION_STREAM_MAX_AGE', 600)
+
+        events = broker.subscribe(user_id)
+        if events is None:
+            retry_after = config.get('NOTIFICATION_STREAM_RETRY_AFTER', 60)
+            return Response(f"retry: {retry_after * 1000}\n\n", status=503, mimetype='text/event-stream', headers={
+                'Retry-After': str(retry_after),
+                'Cache-Control': 'no-cache',
+            })
+        try:
+            initial = unread_count(user_id)
+        except Exception:
+            broker.unsubscribe(user_id, events) # Give the stream slot back
+            raise
+        db.session.close() # Don't hold a pooled connection for the life of the stream
+
+        def generate():
+            try:
+                yield "retry: 5000\n\n"
+                yield format_sse('unread_count', {'unread_count': initial})
+                started = last_sync = time.monotonic()
+                while time.monotonic() - started < max_age:
+                    try:
+                        event, data = events.get(timeout=heartbeat)
+                        yield format_sse(event, data)
+                        continue
+                    except queue.Empty:
+                        pass
+                    if time.monotonic() - last_sync >= resync:
+                        # Catches writes made by other worker processes
+                        count = unread_count(user_id)
+                        db.session.close()
+                        last_sync = time.monotonic()
+                        yield format_sse('unread_count', {'unread_count': count})
+                    else:
+                        yield ": keepalive\n\n"
+            finally:
+                broker.unsubscribe(user_id, events)
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no' # Disable proxy buffering (nginx)
+        })
+        # Also frees the slot when the client leaves before the generator starts (its finally never runs)
+        response.call_on_close(lambda: broker.unsubscribe(user_id, events))
+        return response
@@ -1,5 +1,5 @@
 from flask import request, jsonify, current_app
-from flask_restful import Resource, reqparse, fields, marshal_with, marshal
+from flask_restful import Resource, reqparse, fields, marshal_with, marshal, abort, inputs
 from flask_login import current_user, login_required
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage # Import FileStorage for reqparse
@@ -9,7 +9,11 @@ from sqlalchemy.orm import joinedload, undefer
 
 from models import db, User, Post, PostCategoryScore, UserInterest, PostPrivacy, FriendRequest, FriendRequestStatus, Comment
 # Import the formatter function
-from utils import format_text_with_ampersounds 
+from utils import format_text_with_ampersounds, resolve_ampersound_tags
+from image_processing import queue_post_image_variants
+from etags import compute_etag, etag_headers, not_modified, author_version
+from serializers import compile_fields, PageSerializer
+from storage_cleanup import image_keys, queue_storage_deletions, schedule_storage_sweep
 
 # We might need access to the S3 client and GemmaClassification instance from app.py
 # This might require passing app context or using current_app
@@ -23,18 +27,25 @@ post_parser.add_argument('privacy', type=str, default='PUBLIC', choices=([p.name
 list_posts_parser = reqparse.RequestParser() # For GET list
 list_posts_parser.add_argument('page', type=int, default=1, help='Page number for pagination', location='args')
 list_posts_parser.add_argument('per_page', type=int, default=20, help='Number of posts per page', location='args')
+list_posts_parser.add_argument('fields', type=str, help='Comma-separated post fields to return', location='args')
+list_posts_parser.add_argument('compact', type=inputs.boolean, default=False, help='Authors in a users map, scores only if selected', location='args')
 
 # --- Field definitions for Marshaling --- 
 # Define how nested objects should be serialized
 author_fields = {
     'id': fields.Integer,
     'username': fields.String,
-    'profile_picture': fields.String # Add profile pic if needed
+    'profile_picture': fields.String, # Add profile pic if needed
+    'profile_picture_variants': fields.Raw
 }
 
 # Formatted content field for Ampersounds
 class FormattedContent(fields.Raw):
     def format(self, value):
+        # Pages of posts are rendered up front by render_posts() with one batch of tag lookups
+        rendered = getattr(value, 'rendered_content', None)
+        if rendered is not None:
+            return rendered
         # value can be a Post object or an error dictionary
         if not isinstance(value, Post) or not hasattr(value, 'content') or not hasattr(value, 'author') or not value.author:
             # If it's not a Post object with content and author, or if author is None,
@@ -52,6 +63,7 @@ post_fields = {
     'id': fields.Integer,
     'content': FormattedContent(attribute=lambda x: x), # Pass the whole post object to our custom field
     'image_url': fields.String,
+    'image_variants': fields.Raw, # {'thumb'|'feed'|'full': {'width', 'height', 'webp', 'jpeg'}} or null until processed
     'timestamp': fields.DateTime(dt_format='iso8601'),
     'privacy': fields.String(attribute='privacy.name'), # Get enum name
     'author': fields.Nested(author_fields), # Nested author data
@@ -69,6 +81,66 @@ post_list_fields = {
     'total': fields.Integer # Total number of posts matching query (before pagination)
 }
 
+# Compiled once; same output as marshal() with the field maps above
+serialize_post = compile_fields(post_fields)
+serialize_post_list = PageSerializer(post_list_fields)
+
+def post_version(post):
+    """What a marshalled post depends on, for ETags. Counts are included when loaded."""
+    loaded = post.__dict__
+    return (post.id, post.updated_at, loaded.get('comments_count'), loaded.get('likes_count'),
+            getattr(post, 'is_liked', None), author_version(post.author))
+
+def render_posts(posts):
+    """Formats ampersound tags for a whole page of posts (authors loaded) with one batch of lookups."""
+    resolved_tags = resolve_ampersound_tags([post.content for post in posts])
+    for post in posts:
+        post.rendered_content = format_text_with_ampersounds(post.content, post.author.username, resolved_tags)
+    return posts
+
+def create_classified_post(user_id, content, image_url, privacy, text_classification_result=None, image_classification_result=None):
+    """
+    Creates a Post with combined text/image classification scores, its PostCategoryScore rows,
+    and the author's UserInterest updates. Flushes the session but does not commit.
+    Shared by the multipart upload path and the presigned upload confirm path.
+    """
+    new_post = Post(
+        content=content if content else "", # Ensure content is not None
+        user_id=user_id,
+        image_url=image_url,
+        classification_scores={}, # To be populated
+        privacy=privacy
+    )
+    db.session.add(new_post)
+    db.session.flush() # Need post ID for scores
+
+    combined_classifications = {}
+    # Process Text Classification
+    if text_classification_result:
+        for category, score in text_classification_result.items():
+            combined_classifications[category] = score
+            # Update UserInterest
+            interest = UserInterest.query.filter_by(user_id=user_id, category=category).first()
+            if interest: interest.score += score
+            else: db.session.add(UserInterest(user_id=user_id, category=category, score=score))
+
+    # Process Image Classification
+    if image_classification_result:
+        for category, score in image_classification_result.items():
+            # Average score if category exists from text
+            combined_classifications[category] = (combined_classifications.get(category, 0) + score) / (2.0 if category in combined_classifications else 1.0)
+            # Update UserInterest
+            interest = UserInterest.query.filter_by(user_id=user_id, category=category).first()
+            if interest: interest.score += score # Consider averaging or different logic here too
+            else: db.session.add(UserInterest(user_id=user_id, category=category, score=score))
+
+    # Save Combined Classifications (JSON and relational)
+    new_post.classification_scores = combined_classifications
+    for category, score in combined_classifications.items():
+        db.session.add(PostCategoryScore(post_id=new_post.id, category=category, score=score))
+
+    return new_post
+
 class PostListResource(Resource):
     @login_required
     def post(self):
@@ -78,19 +150,18 @@ class PostListResource(Resource):
         privacy_str = args['privacy']
 
         # Access app context items
-        s3_client = current_app.config.get('S3_CLIENT') # Assume s3_client is stored in app config or context
-        gemma_classification = current_app.config.get('GEMMA_CLASSIFIER') # Same assumption
-        s3_bucket = current_app.config.get('S3_BUCKET')
-        domain_name_images = current_app.config.get('DOMAIN_NAME_IMAGES')
+        storage = current_app.config.get('STORAGE') # Storage backend (S3/R2 or local disk), see storage.py
+        gemma_classification = current_app.config.get('GEMMA_CLASSIFIER') # Assume classifier is stored in app config
 
         if not content and not image_file:
             return {'message': 'Post cannot be empty. Provide text or an image.'}, 400
 
         image_url = None
+        image_key = None
         image_classification_result = None
 
         # --- Handle Image Upload --- (Adapted from app.py/create_post)
-        if image_file and s3_client and s3_bucket:
+        if image_file and storage:
             if image_file.filename == '':
                 # No file selected, but 'image' key might be present
                 pass # Allow posts with just text
@@ -109,12 +180,9 @@ class PostListResource(Resource):
                     image_data = image_file.read()
                     image_file.seek(0)
 
-                    s3_client.upload_fileobj(
-                        image_file,
-                        s3_bucket,
-                        unique_filename,
-                    )
-                    image_url = f"{domain_name_images}/{unique_filename}"
+                    storage.put_stream(unique_filename, image_file, image_file.mimetype)
+                    image_url = storage.url(unique_filename)
+                    image_key = unique_filename
                     print(f"INFO: Image uploaded to {image_url}")
 
                     # Classify the image (ensure gemma_classification is available)
@@ -128,11 +196,11 @@ class PostListResource(Resource):
                         print("WARN: GemmaClassification not available for image.")
 
                 except Exception as e:
-                    print(f"ERROR: Failed to upload image to S3: {e}")
+                    print(f"ERROR: Failed to upload image to storage: {e}")
                     return {'message': f'Image upload failed: {e}'}, 500
 
-        elif image_file and not s3_client:
-            print('WARN: Image provided, but S3 is not configured. Image was not saved.')
+        elif image_file and not storage:
+            print('WARN: Image provided, but storage is not configured. Image was not saved.')
             # Decide if this should be an error or just a warning message in response
             # return {'message': 'S3 not configured, image not saved'}, 400
 
@@ -151,44 +219,19 @@ class PostListResource(Resource):
 
         # --- Create and Save Post ---
         try:
-            privacy_enum = PostPrivacy[privacy_str]
-            new_post = Post(
-                content=content if content else "", # Ensure content is not None
+            new_post = create_classified_post(
                 user_id=current_user.id,
+                content=content,
                 image_url=image_url,
-                classification_scores={}, # To be populated
-                privacy=privacy_enum
+                privacy=PostPrivacy[privacy_str],
+                text_classification_result=text_classification_result,
+                image_classification_result=image_classification_result
             )
-            db.session.add(new_post)
-            db.session.flush() # Need post ID for scores
-
-            combined_classifications = {}
-            # Process Text Classification
-            if text_classification_result:
-                for category, score in text_classification_result.items():
-                    combined_classifications[category] = score
-                    # Update UserInterest
-                    interest = UserInterest.query.filter_by(user_id=current_user.id, category=category).first()
-                    if interest: interest.score += score
-                    else: db.session.add(UserInterest(user_id=current_user.id, category=category, score=score))
-
-            # Process Image Classification
-            if image_classification_result:
-                for category, score in image_classification_result.items():
-                    # Average score if category exists from text
-                    combined_classifications[category] = (combined_classifications.get(category, 0) + score) / (2.0 if category in combined_classifications else 1.0)
-                    # Update UserInterest
-                    interest = UserInterest.query.filter_by(user_id=current_user.id, category=category).first()
-                    if interest: interest.score += score # Consider averaging or different logic here too
-                    else: db.session.add(UserInterest(user_id=current_user.id, category=category, score=score))
-
-            # Save Combined Classifications (JSON and relational)
-            new_post.classification_scores = combined_classifications
-            for category, score in combined_classifications.items():
-                db.session.add(PostCategoryScore(post_id=new_post.id, category=category, score=score))
-
             db.session.commit()
 
+            if image_key:
+                queue_post_image_variants(new_post.id, image_key)
+
             # Ensure the object is refreshed from the database session to load all attributes
             # and relationships correctly before marshalling, especially after a commit.
             db.session.refresh(new_post)
@@ -211,11 +254,14 @@ class PostListResource(Resource):
             return {'message': f'Error creating post: {e}'}, 500
 
     @login_required
-    @marshal_with(post_list_fields) # Use marshal_with to automatically format output
     def get(self):
         args = list_posts_parser.parse_args()
         page = args['page']
         per_page = args['per_page']
+        try:
+            selection = serialize_post_list.parse_selection(args['fields'])
+        except ValueError as e:
+            abort(400, message=str(e))
         
         blocked_categories = current_app.config.get('BLOCKED_CATEGORIES', set())
 
@@ -275,18 +321,16 @@ class PostListResource(Resource):
             if not post_categories.intersection(blocked_categories):
                 filtered_posts.append(post)
 
-        # Marshal the final list of posts
-        # The marshal_with decorator handles the final structure
-        return {
-            'posts': filtered_posts,
+        # Serialize the final list of posts
+        return serialize_post_list({
+            'posts': render_posts(filtered_posts),
             'page': page,
             'per_page': per_page,
             'total': total_posts_count # Note: This total is *before* category filtering.
                                         # Accurate total requires counting after filtering, more complex query.
-        }
+        }, selection, args['compact'])
 
 class PostResource(Resource):
-    @marshal_with(post_fields)
     def get(self, post_id):
         post = Post.query.options(
             joinedload(Post.author), 
@@ -305,7 +349,7 @@ class PostResource(Resource):
             elif post.privacy == PostPrivacy.FRIENDS:
                 # Check if the post author is a friend of the current_user
                 # Ensure post.author is not None before accessing its attributes or relationships
-                if post.author and (current_user.is_friend(post.author) or post.author == current_user) : # Assuming is_friend method
+                if post.author and (current_user.is_friend(post.author) or post.user_id == current_user.id) : # Assuming is_friend method
                     can_view = True
         
         if not can_view:
@@ -323,7 +367,12 @@ class PostResource(Resource):
         else:
             post.is_liked = False # Default for anonymous users
 
-        return post
+        # Revalidated requests stop here, before the ampersound formatting
+        etag = compute_etag('post', post_version(post))
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        return serialize_post(post), 200, etag_headers(etag)
 
     @login_required
     def delete(self, post_id):
@@ -340,8 +389,16 @@ class PostResource(Resource):
             # Delete associated comments (assuming Comment model has post_id)
             Comment.query.filter_by(post_id=post_to_delete.id).delete(synchronize_session='fetch')
 
+            # The image and its variants are removed by the storage sweeper after the commit
+            storage = current_app.config.get('STORAGE')
+            queued = 0
+            if storage is not None and post_to_delete.image_url:
+                queued = queue_storage_deletions(image_keys(storage, post_to_delete.image_url, post_to_delete.image_variants))
+
             db.session.delete(post_to_delete)
             db.session.commit()
+            if queued:
+                schedule_storage_sweep()
             return {'message': 'Post deleted successfully.'}, 200 # OK or 204 No Content
         except Exception as e:
             db.session.rollback()
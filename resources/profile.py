@@ -1,10 +1,17 @@
-from flask import current_app, request
-from flask_restful import Resource, fields, marshal_with, abort, reqparse, marshal
+from flask import current_app
+from flask_restful import Resource, fields, abort, reqparse, marshal, inputs
 from flask_login import current_user, login_required
-from sqlalchemy.orm import joinedload
+from sqlalchemy import exists
+from sqlalchemy.orm import joinedload, load_only
 
-from models import db, User, Post, UserInterest, PostPrivacy, FriendRequest, FriendRequestStatus # Added FriendRequest
-from resources.post import FormattedContent # <<< IMPORT FormattedContent
+from models import db, User, Post, PostCategoryScore, UserInterest, PostPrivacy, FriendRequest, FriendRequestStatus # Added FriendRequest
+from resources.post import FormattedContent, render_posts, post_version # <<< IMPORT FormattedContent
+from etags import compute_etag, etag_headers, not_modified
+from serializers import PageSerializer, output_json
+from utils import keyset_page
+
+PROFILE_POSTS_PAGE_SIZE = 20
+MAX_PROFILE_POSTS_PAGE_SIZE = 50
 
 # --- Field Definitions for Marshaling ---
 # Re-use author_fields if defined elsewhere or define similar user fields
@@ -13,6 +20,7 @@ user_profile_fields = {
     'username': fields.String,
     'email': fields.String, # Maybe only show to self or friends?
     'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw,
     'invites_left': fields.Integer, # Maybe only show to self?
     # Add join date, etc. if needed
 }
@@ -21,7 +29,8 @@ user_profile_fields = {
 author_fields = {
     'id': fields.Integer,
     'username': fields.String,
-    'profile_picture': fields.String
+    'profile_picture': fields.String,
+    'profile_picture_variants': fields.Raw
 }
 
 # Define sensitive fields shown only to self
@@ -35,6 +44,7 @@ post_fields_for_profile = {
     'id': fields.Integer,
     'content': FormattedContent(attribute=lambda x: x), # <<< NEW LINE - Use FormattedContent
     'image_url': fields.String,
+    'image_variants': fields.Raw,
     'timestamp': fields.DateTime(dt_format='iso8601'),
     'privacy': fields.String(attribute='privacy.name'), 
     'author': fields.Nested(author_fields), # Include author for Post component
@@ -46,142 +56,163 @@ interest_fields = {
     'score': fields.Float
 }
 
-profile_data_fields = {
-    'user': fields.Nested(user_profile_fields),
-    'posts': fields.List(fields.Nested(post_fields_for_profile)), # <<< Use updated post fields
-    'interests': fields.List(fields.Nested(interest_fields)),
-    'friendship_status': fields.String, 
-    'pending_request_id': fields.Integer(default=None) # <<< Add field for request ID
+profile_posts_page_fields = {
+    'posts': fields.List(fields.Nested(post_fields_for_profile)),
+    'next_cursor': fields.String,
+    'has_more': fields.Boolean
 }
 
+serialize_profile_posts_page = PageSerializer(profile_posts_page_fields)
+
 # <<< Define parser for PATCH request >>>
 profile_patch_parser = reqparse.RequestParser()
 profile_patch_parser.add_argument('invites_left', type=int, location='json', help='Number of invites left (optional)')
 # Add other editable fields here later if needed (e.g., email, profile_picture)
 
+profile_posts_parser = reqparse.RequestParser()
+profile_posts_parser.add_argument('limit', type=int, default=PROFILE_POSTS_PAGE_SIZE, location='args')
+profile_posts_parser.add_argument('cursor', type=str, location='args')
+profile_posts_parser.add_argument('fields', type=str, location='args')
+profile_posts_parser.add_argument('compact', type=inputs.boolean, default=False, location='args')
+
+
+def get_friendship_status(viewer_id, user_id):
+    """Returns (status, pending_request_id) of `user_id` as seen by `viewer_id`."""
+    if user_id == viewer_id:
+        return 'SELF', None
+    # Check for existing request first (covers PENDING_SENT and PENDING_RECEIVED)
+    request_obj = FriendRequest.query.filter(
+        ((FriendRequest.sender_id == viewer_id) & (FriendRequest.receiver_id == user_id)) |
+        ((FriendRequest.sender_id == user_id) & (FriendRequest.receiver_id == viewer_id))
+    ).first()
+    if not request_obj:
+        return 'NONE', None
+    if request_obj.status == FriendRequestStatus.ACCEPTED:
+        return 'FRIENDS', request_obj.id
+    if request_obj.sender_id == viewer_id:
+        return 'PENDING_SENT', request_obj.id
+    return 'PENDING_RECEIVED', request_obj.id
+
+
+def _load_profile_header(user):
+    """User fields (including the self-only ones) and interests, plus a digest of both."""
+    interests = UserInterest.query.filter_by(user_id=user.id).order_by(UserInterest.score.desc()).all()
+    header = {
+        'user': marshal(user, dict(user_profile_fields, **user_profile_fields_self_only)),
+        'interests': marshal(interests, interest_fields),
+    }
+    header['digest'] = compute_etag(header)
+    return header
+
+
+def get_profile_header(user):
+    """
+    The viewer-independent part of a profile, from PROFILE_HEADER_CACHE when fresh.
+    Entries are dropped when the user's profile fields or interests change (see user_cache.py).
+    """
+    cache = current_app.config.get('PROFILE_HEADER_CACHE')
+    if cache is None:
+        return _load_profile_header(user)
+    header = cache.get(user.id)
+    if header is None:
+        version = cache.version(user.id)
+        header = _load_profile_header(user)
+        cache.put(user.id, header, version)
+    return header
+
+
+def profile_header_response(user, status, pending_request_id):
+    """
+    The profile header for this viewer, with an ETag; answers If-None-Match with 304.
+    Email and invites_left are only included on the user's own profile.
+    """
+    header = get_profile_header(user)
+    etag = compute_etag('profile', header['digest'], status, pending_request_id)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    user_data = header['user']
+    if status != 'SELF':
+        user_data = {key: value for key, value in user_data.items() if key not in user_profile_fields_self_only}
+    # A full response object: /profiles/me is also served by a plain Flask route
+    return output_json({
+        'user': user_data,
+        'interests': header['interests'],
+        'friendship_status': status,
+        'pending_request_id': pending_request_id if status in ['PENDING_SENT', 'PENDING_RECEIVED'] else None # Return ID only if relevant
+    }, 200, etag_headers(etag))
+
+
 class ProfileResource(Resource):
     @login_required
     def get(self, username):
+        """Profile header: user, interests and friendship status. Posts come from ProfilePostsResource."""
         user = User.query.filter_by(username=username).first()
         if not user:
             abort(404, message=f"User '{username}' not found.")
+        status, pending_request_id = get_friendship_status(current_user.id, user.id)
+        return profile_header_response(user, status, pending_request_id)
+
+class ProfilePostsResource(Resource):
+    @login_required
+    def get(self, username):
+        """
+        A user's posts visible to the current user, newest first, one page at a time.
+        ?limit=N (max 50), ?cursor=<next_cursor of the previous page>,
+        ?fields=id,content,... and ?compact=true as for the feed.
+        """
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            abort(404, message=f"User '{username}' not found.")
+        args = profile_posts_parser.parse_args()
+        limit = min(max(args['limit'], 1), MAX_PROFILE_POSTS_PAGE_SIZE)
+        try:
+            selection = serialize_profile_posts_page.parse_selection(args['fields'])
+        except ValueError as e:
+            abort(400, message=str(e))
 
-        status = 'NONE'
-        pending_request_id = None # Initialize request ID
-        request_obj = None # Store the request object if found
-
-        if user.id == current_user.id:
-            status = 'SELF'
-        else:
-            # Check for existing request first (covers PENDING_SENT and PENDING_RECEIVED)
-            request_obj = FriendRequest.query.filter(
-                ((FriendRequest.sender_id == current_user.id) & (FriendRequest.receiver_id == user.id)) |
-                ((FriendRequest.sender_id == user.id) & (FriendRequest.receiver_id == current_user.id))
-            ).first()
-
-            if request_obj:
-                 pending_request_id = request_obj.id
-                 if request_obj.status == FriendRequestStatus.ACCEPTED:
-                     status = 'FRIENDS'
-                 elif request_obj.sender_id == current_user.id:
-                     status = 'PENDING_SENT'
-                 else: # request_obj.receiver_id == current_user.id
-                     status = 'PENDING_RECEIVED'
-            # If no request exists, status remains 'NONE'
-                 
-        # Determine which posts to show based on status
         posts_query = Post.query.filter_by(user_id=user.id)
-        if status == 'SELF' or status == 'FRIENDS':
-            # Show all posts (Public, Friends Only, Private - if we add Private)
-            pass # No additional privacy filter needed for self/friends
-        else:
-            # Show only Public posts
+        # Self and friends see every post; everyone else only public ones
+        if user.id != current_user.id and not User.are_friends(user.id, current_user.id):
             posts_query = posts_query.filter(Post.privacy == PostPrivacy.PUBLIC)
-        
-        # <<< Ensure author is loaded along with scores >>>
-        posts = posts_query.options(
-            joinedload(Post.author), 
-            joinedload(Post.category_scores)
-        ).order_by(Post.timestamp.desc()).all()
-        
-        # Filter posts by blocked categories (similar to PostListResource)
         blocked_categories = current_app.config.get('BLOCKED_CATEGORIES', set())
-        filtered_posts = []
-        for p in posts:
-             post_categories = {score.category for score in p.category_scores}
-             if not post_categories.intersection(blocked_categories):
-                 filtered_posts.append(p)
-
-        # Fetch interests
-        interests = UserInterest.query.filter_by(user_id=user.id).order_by(UserInterest.score.desc()).all()
-        
-        # Adjust user data visibility based on status (optional)
-        # e.g., don't show email or invites_left to non-self
-        profile_user_data = user
-        final_user_fields = user_profile_fields.copy() # Start with base fields
-        if status == 'SELF':
-            final_user_fields.update(user_profile_fields_self_only) # Add sensitive fields
-            
-        # Marshal user data explicitly
-        marshaled_user = marshal(profile_user_data, final_user_fields)
-
-        # Marshal other fields (posts, interests)
-        # Note: post marshalling uses FormattedContent which runs the util function
-        marshaled_posts = marshal(filtered_posts, post_fields_for_profile)
-        marshaled_interests = marshal(interests, interest_fields)
-
-        return {
-            'user': marshaled_user, # Use explicitly marshaled user data
-            'posts': marshaled_posts,
-            'interests': marshaled_interests,
-            'friendship_status': status,
-            'pending_request_id': pending_request_id if status in ['PENDING_SENT', 'PENDING_RECEIVED'] else None # Return ID only if relevant
-        } 
+        if blocked_categories:
+            posts_query = posts_query.filter(~exists().where(
+                PostCategoryScore.post_id == Post.id,
+                PostCategoryScore.category.in_(blocked_categories)
+            ))
+        # Only the columns post_fields_for_profile needs (skips the comment/like count subqueries)
+        posts_query = posts_query.options(
+            load_only(Post.id, Post.content, Post.image_url, Post.image_variants, Post.timestamp,
+                      Post.updated_at, Post.privacy, Post.classification_scores, Post.user_id),
+            joinedload(Post.author).load_only(User.id, User.username, User.profile_picture, User.profile_picture_variants)
+        )
+        try:
+            posts, next_cursor = keyset_page(posts_query, Post.timestamp, Post.id, args['cursor'], limit, newest_first=True)
+        except ValueError:
+            abort(400, message="Invalid cursor.")
+
+        etag = compute_etag('profile_posts', next_cursor, sorted(selection or ()), args['compact'],
+                            [post_version(p) for p in posts])
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        return serialize_profile_posts_page({
+            'posts': render_posts(posts),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }, selection, args['compact']), 200, etag_headers(etag)
 
 # <<< New Resource for /me endpoint >>>
 class MyProfileResource(Resource):
     @login_required
-    @marshal_with(profile_data_fields)
     def get(self):
         if not current_user or not current_user.is_authenticated:
              abort(401, message="Authentication required.")
-
-        user = current_user # Get the currently logged-in user
-
-        # We know the status is 'SELF'
-        status = 'SELF'
-        pending_request_id = None 
-
-        # Fetch all posts for the user
-        posts_query = Post.query.filter_by(user_id=user.id)
-        
-        # Load author and scores
-        posts = posts_query.options(
-            joinedload(Post.author), 
-            joinedload(Post.category_scores)
-        ).order_by(Post.timestamp.desc()).all()
-        
-        # Filter posts by blocked categories (same logic as ProfileResource)
-        blocked_categories = current_app.config.get('BLOCKED_CATEGORIES', set())
-        filtered_posts = []
-        for p in posts:
-             post_categories = {score.category for score in p.category_scores}
-             if not post_categories.intersection(blocked_categories):
-                 filtered_posts.append(p)
-
-        # Fetch interests
-        interests = UserInterest.query.filter_by(user_id=user.id).order_by(UserInterest.score.desc()).all()
-        
-        return {
-            'user': user,
-            'posts': filtered_posts,
-            'interests': interests,
-            'friendship_status': status,
-            'pending_request_id': pending_request_id 
-        } 
+        return profile_header_response(current_user.record(), 'SELF', None)
 
     @login_required
-    @marshal_with(profile_data_fields)
     def patch(self):
         if not current_user or not current_user.is_authenticated:
              abort(401, message="Authentication required.")
@@ -193,15 +224,9 @@ class MyProfileResource(Resource):
         if args['invites_left'] is not None:
             abort(403, message="You cannot modify invites_left.")
 
-        # Update profile_picture if provided
-        # if args['profile_picture'] is not None:
-        #     current_user.profile_picture = args['profile_picture']
-        #     user_updated = True
-        #     print(f"INFO: Updating profile picture for {current_user.username}")
-
         # Add logic for other editable fields here from parser...
         # if args['email']:
-        #   current_user.email = args['email']
+        #   current_user.record().email = args['email']
         #   user_updated = True
 
         if user_updated:
@@ -211,29 +236,5 @@ class MyProfileResource(Resource):
                 db.session.rollback()
                 print(f"ERROR: Failed to update profile for user {current_user.id}: {e}")
                 abort(500, message="Failed to update profile.")
-        
-        # Re-fetch data needed for marshal_with after potential commit
-        # (GET method logic duplicated here - could be refactored)
-        # Fetch all posts for the user
-        posts_query = Post.query.filter_by(user_id=current_user.id)
-        posts = posts_query.options(
-            joinedload(Post.author), 
-            joinedload(Post.category_scores)
-        ).order_by(Post.timestamp.desc()).all()
-        
-        blocked_categories = current_app.config.get('BLOCKED_CATEGORIES', set())
-        filtered_posts = []
-        for p in posts:
-             post_categories = {score.category for score in p.category_scores}
-             if not post_categories.intersection(blocked_categories):
-                 filtered_posts.append(p)
-
-        interests = UserInterest.query.filter_by(user_id=current_user.id).order_by(UserInterest.score.desc()).all()
-        
-        return {
-            'user': current_user,
-            'posts': filtered_posts,
-            'interests': interests,
-            'friendship_status': 'SELF',
-            'pending_request_id': None
-        }
\ No newline at end of file
+
+        return profile_header_response(current_user.record(), 'SELF', None)
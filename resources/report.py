@@ -1,10 +1,12 @@
-from flask import request, jsonify
+from flask import request
 from flask_restful import Resource, reqparse, abort
 from flask_login import current_user, login_required
 from sqlalchemy.exc import IntegrityError
 
 from models import db, User, Post, Comment, Ampersound, Report
-from models import UserType, ReportContentType, ReportStatus, PostPrivacy, CommentVisibility
+from models import UserType, ReportContentType, ReportStatus
+from moderation import restrict_user_content, pending_report_groups, resolve_report_group
+from utils import keyset_page
 
 report_parser = reqparse.RequestParser()
 report_parser.add_argument('content_type', type=str, required=True, help='Type of content being reported (post, comment, ampersound)', location='json', choices=('post', 'comment', 'ampersound'))
@@ -60,29 +62,19 @@ class ReportResource(Resource):
 
         report_status = ReportStatus.PENDING
         message = "Report submitted successfully."
+        restricted = None
 
         # If reported by an Admin, take immediate action
         if reporter.user_type == UserType.ADMIN:
-            reported_user = User.query.get(reported_user_id)
-            if not reported_user:
+            if db.session.query(User.id).filter_by(id=reported_user_id).first() is None:
                 # This should ideally not happen if reported_item was found
                 abort(500, message="Reported user not found unexpectedly.")
 
-            # Make all posts friends-only
-            for post in reported_user.posts:
-                post.privacy = PostPrivacy.FRIENDS
-            
-            # Make all comments friends-only
-            for comment in reported_user.comments:
-                comment.visibility = CommentVisibility.FRIENDS_ONLY
-            
-            # Make all ampersounds friends-only
-            for ampersound in reported_user.ampersounds:
-                ampersound.privacy = 'friends' # Ampersound uses string 'friends'
+            # Make all posts, comments and ampersounds friends-only: three UPDATEs, committed with the report
+            restricted = restrict_user_content(reported_user_id)
 
             report_status = ReportStatus.RESOLVED_AUTO
             message = "Report submitted and user's content automatically restricted."
-            db.session.add_all(reported_user.posts + reported_user.comments + reported_user.ampersounds)
 
 
         new_report = Report(
@@ -106,53 +98,111 @@ class ReportResource(Resource):
             db.session.rollback()
             return abort(500, message=f"Could not submit report: {str(e)}")
 
-        return {'message': message, 'report_id': new_report.id}, 201
+        response = {'message': message, 'report_id': new_report.id}
+        if restricted is not None:
+            response['restricted'] = restricted # Rows changed per kind
+        return response, 201
+
+REPORTS_PAGE_SIZE = 50
+MAX_REPORTS_PAGE_SIZE = 200
+
+report_list_parser = reqparse.RequestParser()
+report_list_parser.add_argument('limit', type=int, default=REPORTS_PAGE_SIZE, location='args')
+report_list_parser.add_argument('cursor', type=str, location='args')
+report_list_parser.add_argument('status', type=str, location='args', choices=[status.value for status in ReportStatus], help='Filter by report status')
+
+def _require_admin(message):
+    if current_user.user_type != UserType.ADMIN:
+        abort(403, message=message)
+
+def _report_page(query, args):
+    """Newest first, keyset paginated on (timestamp, id)."""
+    limit = min(max(args['limit'], 1), MAX_REPORTS_PAGE_SIZE)
+    if args['status']:
+        query = query.filter(Report.status == ReportStatus(args['status']))
+    try:
+        reports, next_cursor = keyset_page(query, Report.timestamp, Report.id, args['cursor'], limit, newest_first=True)
+    except ValueError:
+        abort(400, message="Invalid cursor.")
+    return {'reports': [report.to_dict() for report in reports], 'next_cursor': next_cursor, 'has_more': next_cursor is not None}, 200
 
 class ReportListResource(Resource):
     @login_required
     def get(self):
-        # Basic implementation: return all reports made by the current user
-        # More advanced: pagination, filtering by status, etc.
-        if current_user.user_type not in [UserType.ADMIN, UserType.MODERATOR]:
-            reports = Report.query.filter_by(reporter_id=current_user.id).order_by(Report.timestamp.desc()).all()
-        else:
-            # Admins/Moderators can see all pending reports
-            reports = Report.query.filter_by(status=ReportStatus.PENDING).order_by(Report.timestamp.desc()).all()
-
-        # This would ideally use marshal_with for consistent output
-        return jsonify([report.to_dict() for report in reports]) # Assuming Report model has to_dict()
+        """Reports filed by the current user. ?status=, ?limit=N (max 200), ?cursor=."""
+        return _report_page(Report.query.filter_by(reporter_id=current_user.id), report_list_parser.parse_args())
 
 class AdminReportListResource(Resource):
     @login_required
     def get(self):
-        if current_user.user_type != UserType.ADMIN:
-            abort(403, message="You are not authorized to view all reports.")
-        
-        # Admins can see all reports, regardless of status, perhaps with pagination
-        reports = Report.query.order_by(Report.timestamp.desc()).all()
-        return jsonify([report.to_dict() for report in reports]) # Assuming to_dict()
+        """Every report, newest first. ?status=, ?limit=N (max 200), ?cursor=."""
+        _require_admin("You are not authorized to view all reports.")
+        return _report_page(Report.query, report_list_parser.parse_args())
+
+report_queue_parser = reqparse.RequestParser()
+report_queue_parser.add_argument('limit', type=int, default=REPORTS_PAGE_SIZE, location='args')
+report_queue_parser.add_argument('cursor', type=str, location='args')
+
+class AdminReportQueueResource(Resource):
+    @login_required
+    def get(self):
+        """
+        Pending reports grouped per reported item with report counts, most reported and
+        then longest waiting first (see moderation.pending_report_groups).
+        ?limit=N (max 200), ?cursor=<next_cursor of the previous page>.
+        """
+        _require_admin("You are not authorized to view the moderation queue.")
+        args = report_queue_parser.parse_args()
+        limit = min(max(args['limit'], 1), MAX_REPORTS_PAGE_SIZE)
+        try:
+            groups, next_cursor = pending_report_groups(args['cursor'], limit)
+        except ValueError:
+            abort(400, message="Invalid cursor.")
+        return {'groups': groups, 'next_cursor': next_cursor, 'has_more': next_cursor is not None}, 200
 
 admin_report_action_parser = reqparse.RequestParser()
 admin_report_action_parser.add_argument('status', type=str, required=True, help='New status for the report (e.g., RESOLVED_MANUAL, DISMISSED)', location='json')
 admin_report_action_parser.add_argument('admin_notes', type=str, required=False, help='Notes from the admin/moderator', location='json')
 
+def _parse_status(new_status_str):
+    try:
+        return ReportStatus(new_status_str) # Validate status
+    except ValueError:
+        abort(400, message=f"Invalid status value. Must be one of {[e.value for e in ReportStatus]}")
+
+class AdminReportQueueActionResource(Resource):
+    @login_required
+    def post(self, content_type, content_id):
+        """Resolves or dismisses every pending report of one item at once."""
+        _require_admin("You are not authorized to modify reports.")
+        try:
+            content_type = ReportContentType(content_type)
+        except ValueError:
+            abort(400, message=f"Invalid content_type. Must be one of {[e.value for e in ReportContentType]}.")
+        args = admin_report_action_parser.parse_args()
+        new_status = _parse_status(args.get('status'))
+        if new_status == ReportStatus.PENDING:
+            abort(400, message="Queue entries can only be resolved or dismissed.")
+
+        try:
+            updated = resolve_report_group(content_type, content_id, new_status, args.get('admin_notes'))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            abort(500, message=f"Could not update reports: {str(e)}")
+        return {'message': f'{updated} report(s) updated.', 'updated': updated}, 200
+
 class AdminReportActionResource(Resource):
     @login_required
     def patch(self, report_id):
-        if current_user.user_type != UserType.ADMIN:
-            abort(403, message="You are not authorized to modify reports.")
+        _require_admin("You are not authorized to modify reports.")
 
         report = Report.query.get_or_404(report_id)
         args = admin_report_action_parser.parse_args()
 
-        new_status_str = args.get('status')
+        new_status = _parse_status(args.get('status'))
         admin_notes = args.get('admin_notes')
 
-        try:
-            new_status = ReportStatus(new_status_str) # Validate status
-        except ValueError:
-            abort(400, message=f"Invalid status value. Must be one of {[e.value for e in ReportStatus]}")
-
         report.status = new_status
         if admin_notes is not None:
             report.admin_notes = admin_notes
@@ -163,4 +213,4 @@ class AdminReportActionResource(Resource):
             db.session.rollback()
             abort(500, message=f"Could not update report: {str(e)}")
 
-        return {'message': 'Report status updated successfully', 'report': report.to_dict()}, 200
\ No newline at end of file
+        return {'message': 'Report status updated successfully', 'report': report.to_dict()}, 200
@@ -0,0 +1,251 @@
+import os
+import uuid
+import mimetypes
+import tempfile
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from flask_restful import Resource, reqparse, abort, marshal
+from flask_login import current_user, login_required
+from werkzeug.utils import secure_filename
+
+from models import db, Ampersound, PendingUpload, UploadKind, PostPrivacy
+from utils import generate_s3_file_url
+from audio_processing import normalize_audio
+from image_processing import queue_post_image_variants, queue_profile_picture_variants
+from resources.post import create_classified_post, post_fields
+from resources.ampersound import clean_ampersound_name, ampersound_key
+from storage_cleanup import queue_storage_deletions, schedule_storage_sweep
+
+# Constraints per upload kind. Size and content type are signed into the presigned URL,
+# so storage rejects anything else; they are checked again against the stored object on confirm.
+UPLOAD_RULES = {
+    UploadKind.POST_IMAGE: {'mime_prefix': 'image/', 'max_size': 3 * 1024 * 1024},
+    UploadKind.AMPERSOUND: {'mime_prefix': 'audio/', 'max_size': 2 * 1024 * 1024},
+    UploadKind.PROFILE_PICTURE: {'mime_prefix': 'image/', 'max_size': 5 * 1024 * 1024},
+}
+
+# --- Parsers ---
+upload_request_parser = reqparse.RequestParser()
+upload_request_parser.add_argument('kind', type=str, required=True, choices=[k.value for k in UploadKind], help='Upload kind: post_image, ampersound or profile_picture', location='json')
+upload_request_parser.add_argument('content_type', type=str, required=True, help='MIME type of the file to upload', location='json')
+upload_request_parser.add_argument('size', type=int, required=True, help='Size of the file in bytes', location='json')
+upload_request_parser.add_argument('filename', type=str, required=False, default='', location='json')
+
+post_confirm_parser = reqparse.RequestParser()
+post_confirm_parser.add_argument('content', type=str, required=False, default='', location='json')
+post_confirm_parser.add_argument('privacy', type=str, default='PUBLIC', choices=([p.name for p in PostPrivacy]), help='Post privacy setting (PUBLIC, FRIENDS)', location='json')
+
+ampersound_confirm_parser = reqparse.RequestParser()
+ampersound_confirm_parser.add_argument('name', type=str, required=True, help='Ampersound name is required', location='json')
+ampersound_confirm_parser.add_argument('privacy', type=str, default='public', location='json')
+
+
+def _build_upload_key(kind, user_id, filename, content_type):
+    """Storage key for a new direct upload. Mirrors the layout used by the multipart endpoints."""
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    if not extension:
+        extension = mimetypes.guess_extension(content_type) or ''
+    if kind == UploadKind.POST_IMAGE:
+        return f"images/{uuid.uuid4()}{extension}"
+    if kind == UploadKind.AMPERSOUND:
+        # Final name is only known on confirm; the object is renamed (or replaced by the
+        # normalized version) at that point.
+        return f"ampersounds/{user_id}/uploads/{uuid.uuid4()}{extension}"
+    return f"profile_pictures/{user_id}/{uuid.uuid4()}{extension}"
+
+
+class UploadRequestResource(Resource):
+    @login_required
+    def post(self):
+        """Issue a presigned PUT URL so the client can upload straight to storage."""
+        args = upload_request_parser.parse_args()
+        kind = UploadKind(args['kind'])
+        content_type = args['content_type'].strip().lower()
+        size = args['size']
+        rules = UPLOAD_RULES[kind]
+
+        if not content_type.startswith(rules['mime_prefix']):
+            abort(400, message=f"Invalid file type: '{content_type}'. Expected {rules['mime_prefix']}*.")
+        if size <= 0:
+            abort(400, message="File is empty.")
+        if size > rules['max_size']:
+            abort(413, message=f"File size exceeds the limit of {rules['max_size'] / 1024 / 1024}MB.")
+
+        storage = current_app.config.get('STORAGE')
+        if not storage:
+            abort(500, message="File storage is not configured on the server.")
+
+        s3_key = _build_upload_key(kind, current_user.id, args['filename'], content_type)
+        expires_in = current_app.config.get('UPLOAD_URL_EXPIRES_IN', 900)
+        try:
+            upload_url = storage.presign_put(s3_key, content_type, size, expires_in)
+        except Exception as e:
+            current_app.logger.error(f"Error generating presigned upload URL for {s3_key}: {e}")
+            abort(500, message="Could not create upload URL.")
+
+        pending = PendingUpload(user_id=current_user.id, kind=kind, s3_key=s3_key, content_type=content_type, size=size)
+        db.session.add(pending)
+        db.session.commit()
+
+        return {
+            'upload_id': pending.id,
+            'kind': kind.value,
+            'upload_url': upload_url,
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+            'expires_in': expires_in
+        }, 201
+
+
+class UploadConfirmResource(Resource):
+    @login_required
+    def post(self, upload_id):
+        """Finalize a direct upload: verify the stored object, then create the record it belongs to."""
+        pending = db.session.get(PendingUpload, upload_id)
+        if not pending or pending.user_id != current_user.id:
+            abort(404, message="Upload not found.")
+
+        issued_at = pending.timestamp
+        if issued_at.tzinfo is None: # SQLite returns naive datetimes
+            issued_at = issued_at.replace(tzinfo=timezone.utc)
+        confirm_window = timedelta(seconds=current_app.config.get('UPLOAD_CONFIRM_WINDOW', 3600))
+        if datetime.now(timezone.utc) - issued_at > confirm_window:
+            queue_storage_deletions([pending.s3_key]) # Whatever the client uploaded is never used
+            db.session.delete(pending)
+            db.session.commit()
+            schedule_storage_sweep()
+            abort(410, message="Upload has expired. Request a new upload URL.")
+
+        storage = current_app.config.get('STORAGE')
+        if not storage:
+            abort(500, message="File storage is not configured on the server.")
+
+        head = storage.head(pending.s3_key)
+        if not head:
+            abort(400, message="Uploaded file not found in storage. Upload the file before confirming.")
+
+        rules = UPLOAD_RULES[pending.kind]
+        if head['size'] != pending.size or head['size'] > rules['max_size']:
+            abort(400, message="Uploaded file does not match the declared size.")
+        if (head['content_type'] or '').lower() != pending.content_type:
+            abort(400, message="Uploaded file does not match the declared content type.")
+
+        if pending.kind == UploadKind.POST_IMAGE:
+            return self._confirm_post_image(pending, storage)
+        if pending.kind == UploadKind.AMPERSOUND:
+            return self._confirm_ampersound(pending, storage)
+        return self._confirm_profile_picture(pending)
+
+    def _confirm_post_image(self, pending, storage):
+        args = post_confirm_parser.parse_args()
+        content = args['content']
+        gemma_classification = current_app.config.get('GEMMA_CLASSIFIER')
+
+        image_url = generate_s3_file_url(current_app.config, pending.s3_key)
+        if not image_url:
+            abort(500, message="Failed to construct image URL for uploaded file.")
+
+        text_classification_result = None
+        image_classification_result = None
+        if gemma_classification:
+            if content:
+                text_classification_result = gemma_classification.classify_text(content)
+            try:
+                image_data = storage.get(pending.s3_key)
+                image_classification_result = gemma_classification.classify_image(image_data)
+            except Exception as e:
+                current_app.logger.error(f"Error reading uploaded image {pending.s3_key} for classification: {e}")
+        else:
+            current_app.logger.warning("GemmaClassification not available for uploaded post image.")
+
+        try:
+            new_post = create_classified_post(
+                user_id=current_user.id,
+                content=content,
+                image_url=image_url,
+                privacy=PostPrivacy[args['privacy']],
+                text_classification_result=text_classification_result,
+                image_classification_result=image_classification_result
+            )
+            db.session.delete(pending)
+            db.session.commit()
+            queue_post_image_variants(new_post.id, pending.s3_key)
+            db.session.refresh(new_post)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to save post for upload {pending.id}: {e}")
+            abort(500, message="Error creating post.")
+
+        return {'message': 'Post created successfully', 'post': marshal(new_post, post_fields)}, 201
+
+    def _confirm_ampersound(self, pending, storage):
+        args = ampersound_confirm_parser.parse_args()
+        privacy = args['privacy'].lower()
+        if privacy not in ['public', 'friends']:
+            privacy = 'public'
+
+        clean_name = clean_ampersound_name(args['name'])
+        if not clean_name:
+            abort(400, message="Invalid Ampersound name. Use alphanumeric characters without spaces or '&'.")
+        if Ampersound.query.filter_by(user_id=current_user.id, name=clean_name).first():
+            abort(409, message=f"You already have an Ampersound named '{clean_name}'.")
+
+        file_path = pending.s3_key
+        normalized = None
+        try:
+            suffix = os.path.splitext(pending.s3_key)[1] or '.audio'
+            with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+                storage.download(pending.s3_key, tmp)
+                tmp.flush()
+                normalized = normalize_audio(tmp.name, current_app.config)
+
+            if normalized:
+                file_path = ampersound_key(current_user.id, clean_name, normalized['extension'])
+                storage.put(file_path, normalized['data'], normalized['content_type'])
+                storage.delete(pending.s3_key)
+        except Exception as e:
+            # Keep the original upload if normalization or the rename fails
+            current_app.logger.error(f"Error normalizing uploaded ampersound {pending.s3_key}: {e}")
+            file_path = pending.s3_key
+            normalized = None
+
+        try:
+            ampersound = Ampersound(
+                user_id=current_user.id,
+                name=clean_name,
+                file_path=file_path,
+                privacy=privacy,
+                duration_ms=normalized['duration_ms'] if normalized else None,
+                waveform=normalized['waveform'] if normalized else None
+            )
+            db.session.add(ampersound)
+            db.session.delete(pending)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to save ampersound for upload {pending.id}: {e}")
+            abort(500, message="Failed to save Ampersound.")
+
+        return {
+            "message": "Ampersound created successfully! It is pending approval.",
+            "name": clean_name,
+            "url": generate_s3_file_url(current_app.config, file_path),
+            "ampersound_id": ampersound.id,
+            "status": ampersound.status.value,
+            "duration_ms": ampersound.duration_ms,
+            "waveform": ampersound.waveform
+        }, 201
+
+    def _confirm_profile_picture(self, pending):
+        file_url = generate_s3_file_url(current_app.config, pending.s3_key)
+        if not file_url:
+            abort(500, message="Failed to construct URL for uploaded profile picture.")
+
+        s3_key = pending.s3_key
+        user = current_user.record()
+        user.profile_picture = file_url
+        user.profile_picture_variants = None
+        db.session.delete(pending)
+        db.session.commit()
+        queue_profile_picture_variants(current_user.id, s3_key)
+        return {"message": "Profile picture updated successfully", "profile_picture": file_url}, 200
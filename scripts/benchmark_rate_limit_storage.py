@@ -0,0 +1,91 @@
+"""
+Measures the per-request overhead of a rate limit check for each storage backend.
+
+Each check is what Flask-Limiter does per request with the default fixed-window
+strategy: one hit (increment) per limit. Runs single-process, then with several
+processes hitting the same counters at once to show contention on the shared file.
+
+Usage: python scripts/benchmark_rate_limit_storage.py [--checks 20000] [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Add project root to Python path to import app modules
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, project_root)
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import rate_limiting # noqa: F401  Registers the sqlite:// storage scheme
+
+# The app's default limits; every request is checked against both
+LIMITS = [parse("20000 per day"), parse("5000 per hour")]
+
+
+def run_checks(uri, checks, clients=50):
+    """Returns per-check latencies in microseconds."""
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    latencies = []
+    for i in range(checks):
+        client = f"user:{i % clients}"
+        start = time.perf_counter()
+        for limit in LIMITS:
+            limiter.hit(limit, client)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def _worker(uri, checks, queue):
+    queue.put(run_checks(uri, checks))
+
+
+def run_parallel(uri, checks, processes):
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    workers = [context.Process(target=_worker, args=(uri, checks, queue)) for _ in range(processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    latencies = []
+    for _ in workers:
+        latencies.extend(queue.get())
+    for worker in workers:
+        worker.join()
+    return latencies, time.perf_counter() - start
+
+
+def summarize(label, latencies, elapsed=None):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    line = f"{label:<32} p50 {p50:8.1f} us   p99 {p99:8.1f} us"
+    if elapsed:
+        line += f"   {len(latencies) / elapsed:10.0f} checks/s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checks', type=int, default=20000, help='Checks per process')
+    parser.add_argument('--processes', type=int, default=4, help='Concurrent processes for the shared test')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_uri = f"sqlite:///{os.path.join(tmp, 'ratelimit.db')}"
+
+        summarize("memory:// (1 process)", run_checks("memory://", args.checks))
+        summarize("sqlite WAL (1 process)", run_checks(sqlite_uri, args.checks))
+
+        # memory:// cannot be shared: each process counts alone, so limits are processes x looser
+        latencies, elapsed = run_parallel(sqlite_uri, args.checks, args.processes)
+        summarize(f"sqlite WAL ({args.processes} processes, shared)", latencies, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures the per-post cost of serializing a feed page: flask_restful marshal() with the
+stdlib json encoder (the old path) against the compiled serializer with orjson.
+
+Posts are transient Post/User objects with rendered_content already set, as after
+render_posts(), so only marshalling and encoding are timed, not the database.
+
+Usage: python scripts/benchmark_serializers.py [--posts 20] [--pages 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add project root to Python path to import app modules
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, project_root)
+
+from flask import Flask
+from flask_restful import marshal
+
+import serializers
+from models import Post, User, PostPrivacy
+from resources.feed import feed_response_fields, serialize_feed_page
+
+
+def build_page(posts):
+    """A feed page like FeedResource.get builds, with realistic field contents."""
+    page = []
+    for i in range(posts):
+        author = User(id=i % 7 + 1, username=f"member{i % 7}", profile_picture=f"https://cdn.example.com/u/{i % 7}.jpg",
+                      profile_picture_variants={'thumb': {'width': 64, 'height': 64, 'webp': 'a.webp', 'jpeg': 'a.jpg'}})
+        post = Post(id=1000 + i, content=f"Post number {i} &applause", image_url=None, privacy=PostPrivacy.PUBLIC,
+                    timestamp=datetime(2024, 5, 1, 12, i % 60, tzinfo=timezone.utc), author=author,
+                    classification_scores={'music': 0.81, 'art': 0.12, 'sports': 0.07})
+        if i % 3 == 0:
+            post.image_url = f"https://cdn.example.com/p/{i}.jpg"
+            post.image_variants = {size: {'width': w, 'height': w, 'webp': f'{size}.webp', 'jpeg': f'{size}.jpg'}
+                                   for size, w in (('thumb', 320), ('feed', 1080), ('full', 2048))}
+        post.rendered_content = f'Post number {i} <span class="ampersound" data-id="{i}">&amp;applause</span>'
+        post.__dict__.update(comments_count=i % 5, likes_count=i * 3, is_liked=i % 2 == 0)
+        page.append(post)
+    return {'posts': page, 'page': 1, 'per_page': posts, 'total_items': 500, 'total_pages': 500 // posts, 'message': None}
+
+
+def time_pages(label, render, data, pages, posts):
+    render(data) # Warm-up
+    start = time.perf_counter()
+    for _ in range(pages):
+        body = render(data)
+    elapsed = time.perf_counter() - start
+    per_post = elapsed / (pages * posts) * 1e6
+    print(f"{label:<32} {per_post:8.2f} us/post   {pages / elapsed:10.0f} pages/s   {len(body):6d} bytes")
+    return per_post
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--posts', type=int, default=20, help='Posts per feed page')
+    parser.add_argument('--pages', type=int, default=2000, help='Pages serialized per variant')
+    args = parser.parse_args()
+
+    app = Flask(__name__) # dumps() looks at current_app.debug
+    with app.app_context():
+        data = build_page(args.posts)
+        # Same JSON value from both paths before timing anything
+        assert json.loads(serializers.dumps(serialize_feed_page(data))) == json.loads(json.dumps(marshal(data, feed_response_fields)))
+
+        baseline = time_pages("marshal + json", lambda d: json.dumps(marshal(d, feed_response_fields)).encode(), data, args.pages, args.posts)
+        time_pages("compiled + json", lambda d: json.dumps(serialize_feed_page(d)).encode(), data, args.pages, args.posts)
+        if serializers.orjson is None:
+            print("orjson is not installed; skipping the orjson variant")
+            return
+        fast = time_pages("compiled + orjson", lambda d: serializers.dumps(serialize_feed_page(d)), data, args.pages, args.posts)
+        print(f"speed-up: {baseline / fast:.1f}x per post")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Fails image generation and remix jobs that have been queued or running longer than
+GENERATION_JOB_TIMEOUT and refunds their daily quota. Jobs are held in memory by the
+process that queued them, so a deploy or restart leaves their rows queued until this runs.
+Meant to run periodically (e.g. every few minutes from cron or a scheduler).
+
+Usage: python scripts/expire_generation_jobs.py
+"""
+import sys
+import os
+
+# Add project root to Python path to import app modules
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, project_root)
+
+from app import create_app
+from generation_jobs import expire_stale_jobs
+
+
+if __name__ == "__main__":
+    # Load environment variables if .env file exists
+    from dotenv import load_dotenv
+    dotenv_path = os.path.join(project_root, '.env')
+    if os.path.exists(dotenv_path):
+        print("Loading .env file...")
+        load_dotenv(dotenv_path=dotenv_path)
+
+    app = create_app()
+
+    with app.app_context():
+        expired = expire_stale_jobs()
+        print(f"Expired {expired} stale generation job(s).")
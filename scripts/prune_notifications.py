@@ -0,0 +1,37 @@
+"""
+Deletes read notifications older than the retention period, in batches.
+Meant to run periodically (e.g. a daily cron job or scheduler).
+
+Usage: python scripts/prune_notifications.py [--days N] [--batch-size N]
+Defaults come from NOTIFICATION_RETENTION_DAYS and NOTIFICATION_PRUNE_BATCH_SIZE.
+"""
+import sys
+import os
+import argparse
+
+# Add project root to Python path to import app modules
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, project_root)
+
+from app import create_app
+from notifications import prune_read_notifications
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete old read notifications.")
+    parser.add_argument('--days', type=int, help="Delete read notifications older than this many days")
+    parser.add_argument('--batch-size', type=int, help="Rows deleted per transaction")
+    args = parser.parse_args()
+
+    # Load environment variables if .env file exists
+    from dotenv import load_dotenv
+    dotenv_path = os.path.join(project_root, '.env')
+    if os.path.exists(dotenv_path):
+        print("Loading .env file...")
+        load_dotenv(dotenv_path=dotenv_path)
+
+    app = create_app()
+
+    with app.app_context():
+        deleted = prune_read_notifications(args.days, args.batch_size)
+        print(f"Deleted {deleted} read notification(s).")
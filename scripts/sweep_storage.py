@@ -0,0 +1,57 @@
+"""
+Expires pending uploads that were never confirmed, deletes stored files queued in the
+storage deletion outbox (retrying earlier failures once their backoff has passed),
+and optionally looks for orphaned files: objects under the app's key prefixes that no
+database row references.
+Meant to run periodically (e.g. an hourly cron job); deletes also sweep right away.
+
+Usage: python scripts/sweep_storage.py [--batch-size N] [--scan-orphans [--grace-hours N] [--apply]]
+Orphans are only listed unless --apply is given, which queues them for deletion.
+"""
+import sys
+import os
+import argparse
+from datetime import timedelta
+
+# Add project root to Python path to import app modules
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, project_root)
+
+from app import create_app
+from models import db
+from storage_cleanup import sweep_storage_deletions, find_orphaned_keys, queue_orphaned_keys, expire_pending_uploads, DEFAULT_ORPHAN_GRACE
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete queued storage objects and find orphaned ones.")
+    parser.add_argument('--batch-size', type=int, help="Keys per batch delete request")
+    parser.add_argument('--scan-orphans', action='store_true', help="List stored files no database row references")
+    parser.add_argument('--grace-hours', type=float, default=DEFAULT_ORPHAN_GRACE.total_seconds() / 3600,
+                        help="Ignore files newer than this (uploads in progress)")
+    parser.add_argument('--apply', action='store_true', help="Queue the orphans found for deletion")
+    args = parser.parse_args()
+
+    # Load environment variables if .env file exists
+    from dotenv import load_dotenv
+    dotenv_path = os.path.join(project_root, '.env')
+    if os.path.exists(dotenv_path):
+        print("Loading .env file...")
+        load_dotenv(dotenv_path=dotenv_path)
+
+    app = create_app()
+
+    with app.app_context():
+        expired = expire_pending_uploads()
+        print(f"Expired {expired} unconfirmed upload(s).")
+
+        if args.scan_orphans:
+            orphans = find_orphaned_keys(grace=timedelta(hours=args.grace_hours))
+            for key in orphans:
+                print(key)
+            print(f"Found {len(orphans)} orphaned file(s).")
+            if args.apply and orphans:
+                queue_orphaned_keys(orphans)
+                db.session.commit()
+
+        deleted, failed = sweep_storage_deletions(args.batch_size)
+        print(f"Deleted {deleted} stored file(s); {failed} failed and will be retried.")
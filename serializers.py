@@ -0,0 +1,218 @@
+import json
+from calendar import timegm
+from email.utils import formatdate
+
+from flask import current_app
+from flask_restful import fields
+from flask_restful.fields import _get_value_for_key
+
+try:
+    import orjson
+except ImportError: # orjson is optional; without it responses are encoded with the stdlib json module
+    orjson = None
+
+_MISSING = object()
+
+
+# --- Compiled marshalling ---
+# compile_fields() turns a flask_restful field map into one function that builds the
+# same dict as marshal(obj, field_map), key for key and value for value. Attribute
+# lookups and formatting are resolved once at compile time instead of per object and
+# per field; field types without a fast path (custom Raw subclasses such as
+# FormattedContent) still go through their own output() method.
+
+def _key_getter(key):
+    """value = get_value(key, obj), as flask_restful resolves it."""
+    if callable(key):
+        return key
+    if isinstance(key, int):
+        return lambda obj: _get_value_for_key(key, obj, None)
+
+    def get_one(name):
+        def get(obj):
+            if isinstance(obj, dict):
+                value = obj.get(name, _MISSING)
+                if value is not _MISSING:
+                    return value
+            elif hasattr(obj, '__iter__') and not hasattr(obj, 'strip'):
+                return _get_value_for_key(name, obj, None)
+            return getattr(obj, name, None)
+        return get
+
+    getters = [get_one(name) for name in key.split('.')]
+    if len(getters) == 1:
+        return getters[0]
+
+    def get_path(obj):
+        for get in getters:
+            obj = get(obj)
+        return obj
+    return get_path
+
+
+def _scalar(get, default, convert):
+    if convert is None:
+        def output(obj):
+            value = get(obj)
+            return default if value is None else value
+    else:
+        def output(obj):
+            value = get(obj)
+            return default if value is None else convert(value)
+    return output
+
+
+def _rfc822(value):
+    return formatdate(timegm(value.utctimetuple()))
+
+
+def _compile_field(key, field):
+    if isinstance(field, dict):
+        return compile_fields(field)
+    if isinstance(field, type):
+        field = field()
+    kind = type(field)
+    get = _key_getter(key if field.attribute is None else field.attribute)
+
+    if kind is fields.Integer:
+        return _scalar(get, field.default, int)
+    if kind is fields.String:
+        return _scalar(get, field.default, str)
+    if kind is fields.Boolean:
+        return _scalar(get, field.default, bool)
+    if kind is fields.Float:
+        return _scalar(get, field.default, float)
+    if kind is fields.Raw:
+        return _scalar(get, field.default, None)
+    if kind is fields.DateTime and field.dt_format in ('iso8601', 'rfc822'):
+        return _scalar(get, field.default, (lambda value: value.isoformat()) if field.dt_format == 'iso8601' else _rfc822)
+    if kind is fields.Nested:
+        nested = compile_fields(field.nested)
+        allow_null, default = field.allow_null, field.default
+
+        def output_nested(obj):
+            value = get(obj)
+            if value is None:
+                if allow_null:
+                    return None
+                if default is not None:
+                    return default
+            return nested(value)
+        return output_nested
+    if kind is fields.List and type(field.container) is fields.Nested:
+        item = compile_fields(field.container.nested)
+        default = field.default
+
+        def output_list(obj):
+            value = get(obj)
+            if isinstance(value, dict):
+                return [item(value)]
+            if value is None:
+                return default
+            return [item(element) for element in value]
+        return output_list
+
+    # No fast path: let the field marshal itself
+    return lambda obj: field.output(key, obj)
+
+
+def compile_fields(field_map):
+    """
+    Returns serialize(obj) -> dict, equivalent to flask_restful.marshal(obj, field_map)
+    for a single object. Compile once at import time and reuse.
+    """
+    outputs = [(key, _compile_field(key, field)) for key, field in field_map.items()]
+
+    def serialize(obj):
+        return {key: output(obj) for key, output in outputs}
+    return serialize
+
+
+class PageSerializer:
+    """
+    Serializes a page of list items (e.g. {'posts': [...], 'page': ...}) with optional
+    sparse fieldsets and a compact mode:
+
+    - selection: item field names to keep (from ?fields=a,b); 'id' is always kept.
+    - compact: the nested `ref` object (the author) becomes `<ref>_id` on each item and
+      every distinct one is sent once in a top-level `users` map keyed by id; fields in
+      `compact_omit` (the classification scores) are left out unless selected.
+
+    Without either option the output is exactly compile_fields(page_fields). Item
+    serializers are compiled on first use of each combination and kept.
+    """
+
+    def __init__(self, page_fields, items_key='posts', ref='author', compact_omit=('classification_scores',)):
+        self.items_key = items_key
+        self.ref = ref
+        self.compact_omit = frozenset(compact_omit)
+        self.item_fields = page_fields[items_key].container.nested
+        self.ref_serializer = compile_fields(self.item_fields[ref].nested)
+        self.serialize_page = compile_fields(page_fields)
+        self.serialize_rest = compile_fields({key: field for key, field in page_fields.items() if key != items_key})
+        self._items = {}
+
+    def parse_selection(self, value):
+        """?fields=a,b as a frozenset of item field names, or None for all. Raises ValueError on unknown names."""
+        if not value:
+            return None
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        if f'{self.ref}_id' in names: # The compact name of the reference selects it too
+            names.discard(f'{self.ref}_id')
+            names.add(self.ref)
+        unknown = names.difference(self.item_fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return frozenset(names) if names else None
+
+    def _item_serializer(self, selection, compact):
+        key = (selection, compact)
+        serializer = self._items.get(key)
+        if serializer is None:
+            field_map = {}
+            for name, field in self.item_fields.items():
+                if name != 'id' and selection is not None and name not in selection:
+                    continue
+                if compact and selection is None and name in self.compact_omit:
+                    continue
+                if compact and name == self.ref:
+                    field_map[f'{name}_id'] = fields.Integer(attribute=f'{name}.id')
+                else:
+                    field_map[name] = field
+            serializer = self._items[key] = compile_fields(field_map)
+        return serializer
+
+    def __call__(self, data, selection=None, compact=False):
+        if selection is None and not compact:
+            return self.serialize_page(data)
+        items = data[self.items_key]
+        body = self.serialize_rest(data)
+        body[self.items_key] = list(map(self._item_serializer(selection, compact), items))
+        if compact:
+            users = {}
+            if selection is None or self.ref in selection:
+                for item in items:
+                    referenced = getattr(item, self.ref, None)
+                    if referenced is not None and referenced.id not in users:
+                        users[referenced.id] = self.ref_serializer(referenced)
+            body['users'] = users
+        return body
+
+
+# --- Encoding ---
+
+def dumps(data):
+    """Encodes a response body as UTF-8 JSON bytes (orjson when installed), newline-terminated."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        if current_app and current_app.debug:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    return (json.dumps(data, ensure_ascii=False, separators=(',', ':')) + "\n").encode()
+
+
+def output_json(data, code, headers=None):
+    """flask_restful JSON representation using dumps(); registered on the Api in app.py."""
+    response = current_app.response_class(dumps(data), status=code, mimetype='application/json')
+    response.headers.extend(headers or {})
+    return response
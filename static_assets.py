@@ -0,0 +1,96 @@
+import mimetypes
+import os
+import re
+
+from flask import current_app, send_file
+
+from compression import PRECOMPRESSED_SUFFIXES, preferred_encoding
+
+# Vite emits assets/<name>-<content hash>.<ext>; a new build gets new names
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache' # index.html and unhashed files (favicon, robots.txt)
+
+
+class Asset:
+    def __init__(self, path, mimetype, etag, mtime, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.mtime = mtime
+        self.cache_control = cache_control
+        self.variants = {} # Content-Encoding -> path of the precompressed file
+
+
+class AssetManifest:
+    """
+    The files of the built frontend (frontend/dist), scanned once at startup so serving
+    one costs a dict lookup instead of filesystem checks. Precompressed .br/.gz files
+    next to an asset become its encoded variants rather than assets of their own.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.scan()
+
+    def scan(self):
+        assets = {}
+        suffixes = tuple(PRECOMPRESSED_SUFFIXES.values())
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                stat = os.stat(path)
+                asset = Asset(
+                    path=path,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    etag=f"{int(stat.st_mtime)}-{stat.st_size}",
+                    mtime=stat.st_mtime,
+                    cache_control=IMMUTABLE if HASHED_ASSET.match(name) else REVALIDATE,
+                )
+                for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+                    if os.path.isfile(path + suffix):
+                        asset.variants[encoding] = path + suffix
+                assets[name] = asset
+        self.assets = assets
+
+    def get(self, name):
+        return self.assets.get(name)
+
+
+def init_static_assets(app):
+    """Builds the frontend manifest (app.config['ASSET_MANIFEST']) from the static folder."""
+    manifest = AssetManifest(os.path.join(app.root_path, app.static_folder))
+    app.config['ASSET_MANIFEST'] = manifest
+    print(f"INFO: Frontend manifest: {len(manifest.assets)} files in {manifest.root}")
+    return manifest
+
+
+def lookup_asset(name):
+    """The manifest entry for `name`, or None. In debug mode a miss rescans, to pick up rebuilds."""
+    manifest = current_app.config['ASSET_MANIFEST']
+    asset = manifest.get(name)
+    if asset is None and current_app.debug:
+        manifest.scan()
+        asset = manifest.get(name)
+    return asset
+
+
+def send_asset(asset):
+    """
+    Serves a manifest entry, choosing its br or gzip variant by Accept-Encoding.
+    Each encoding has its own ETag; hashed assets are cacheable for a year.
+    """
+    encoding = preferred_encoding(asset.variants)
+    path = asset.variants[encoding] if encoding else asset.path
+    response = send_file(path, mimetype=asset.mimetype, etag=f"{asset.etag}-{encoding or 'identity'}",
+                         last_modified=asset.mtime, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = asset.cache_control
+    return response
@@ -0,0 +1,289 @@
+import os
+import io
+import json
+import shutil
+import mimetypes
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from werkzeug.security import safe_join
+
+# S3's DeleteObjects accepts at most this many keys per request.
+S3_DELETE_BATCH_SIZE = 1000
+
+# Salt for the signed tokens that authorize a PUT to the local storage route.
+LOCAL_UPLOAD_TOKEN_SALT = 'local-storage-put'
+
+
+class StorageError(Exception):
+    """Raised when a storage backend cannot complete an operation."""
+    pass
+
+
+class S3Storage:
+    """Storage backend for S3 and S3-compatible services (Cloudflare R2, MinIO)."""
+    name = 's3'
+
+    def __init__(self, client, bucket, public_base_url=None, endpoint_url=None, region=None):
+        self.client = client
+        self.bucket = bucket
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self.endpoint_url = endpoint_url
+        self.region = region
+
+    def put(self, key, data, content_type=None):
+        """Stores `data` (bytes) under `key`."""
+        extra = {'ContentType': content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
+
+    def put_stream(self, key, fileobj, content_type=None):
+        """Streams a file-like object to `key` (multipart for large bodies)."""
+        extra_args = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra_args)
+
+    def get(self, key):
+        """Returns the object's bytes."""
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            raise StorageError(f"Could not read {key}: {e}") from e
+
+    def download(self, key, fileobj):
+        """Writes the object into an open binary file-like object."""
+        try:
+            self.client.download_fileobj(self.bucket, key, fileobj)
+        except ClientError as e:
+            raise StorageError(f"Could not download {key}: {e}") from e
+
+    def head(self, key):
+        """Returns {'size', 'content_type'} for `key`, or None if it does not exist."""
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return None
+        return {'size': head.get('ContentLength'), 'content_type': head.get('ContentType')}
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys):
+        """Deletes keys in DeleteObjects batches. Returns the keys that could not be deleted."""
+        keys = list(keys)
+        failed = []
+        for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True}
+                )
+            except ClientError as e:
+                print(f"ERROR: Batch delete of {len(batch)} objects failed: {e}")
+                failed.extend(batch)
+                continue
+            failed.extend(err['Key'] for err in response.get('Errors', []))
+        return failed
+
+    def list_keys(self, prefix=''):
+        """Yields (key, last_modified) for every object under `prefix`, one ListObjectsV2 page at a time."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['LastModified']
+
+    def url(self, key):
+        """Public URL for `key`, or None if one cannot be built from the configuration."""
+        if not key:
+            return None
+        if self.public_base_url:
+            return f"{self.public_base_url}/{key}"
+        if self.endpoint_url:
+            # For R2 or MinIO like services, the URL is typically endpoint/bucket/key
+            return f"{self.endpoint_url}/{self.bucket}/{key}"
+        if not self.region or self.region == 'auto':
+            # 'auto' is specific to Cloudflare R2's SDK configuration, not for URL construction.
+            print(f"WARN: Cannot construct S3 URL for {key} with region '{self.region}' and no S3_ENDPOINT_URL or DOMAIN_NAME_IMAGES.")
+            return None
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def key_from_url(self, url):
+        """Inverse of url(): the key for one of our public URLs, or None for foreign URLs."""
+        for prefix in (self.public_base_url, f"{self.endpoint_url}/{self.bucket}" if self.endpoint_url else None,
+                       f"https://{self.bucket}.s3.{self.region}.amazonaws.com" if self.region and self.region != 'auto' else None):
+            if prefix and url and url.startswith(prefix + '/'):
+                return url[len(prefix) + 1:].split('?', 1)[0]
+        return None
+
+    def presign_put(self, key, content_type, size, expires_in):
+        """Presigned PUT URL with the content type and length signed in."""
+        return self.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ContentType': content_type, 'ContentLength': size},
+            ExpiresIn=expires_in
+        )
+
+
+class LocalStorage:
+    """
+    Storage backend that keeps objects on local disk under `root`.
+    Objects are served (and presigned uploads accepted) by the /storage/<key> route,
+    so the whole upload path works on a single machine without credentials.
+    Content types are kept in a sidecar JSON file under `root/.meta`.
+    """
+    name = 'local'
+    META_DIR = '.meta'
+
+    def __init__(self, root, base_url='/storage', secret_key=None):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/')
+        self.secret_key = secret_key
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key, meta=False):
+        if not key or key.startswith(self.META_DIR):
+            raise StorageError(f"Invalid storage key: {key!r}")
+        path = safe_join(self.root, self.META_DIR, key + '.json') if meta else safe_join(self.root, key)
+        if path is None:
+            raise StorageError(f"Invalid storage key: {key!r}")
+        return path
+
+    def _write_meta(self, key, content_type):
+        meta_path = self._path(key, meta=True)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        with open(meta_path, 'w') as f:
+            json.dump({'content_type': content_type or mimetypes.guess_type(key)[0]}, f)
+
+    def put(self, key, data, content_type=None):
+        self.put_stream(key, io.BytesIO(data), content_type)
+
+    def put_stream(self, key, fileobj, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.part"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, path) # Readers never see a half-written object
+        self._write_meta(key, content_type)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise StorageError(f"Could not read {key}: {e}") from e
+
+    def download(self, key, fileobj):
+        try:
+            with open(self._path(key), 'rb') as f:
+                shutil.copyfileobj(f, fileobj)
+        except OSError as e:
+            raise StorageError(f"Could not download {key}: {e}") from e
+
+    def head(self, key):
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        content_type = mimetypes.guess_type(key)[0]
+        try:
+            with open(self._path(key, meta=True)) as f:
+                content_type = json.load(f).get('content_type') or content_type
+        except (OSError, ValueError):
+            pass
+        return {'size': os.path.getsize(path), 'content_type': content_type}
+
+    def delete(self, key):
+        for path in (self._path(key), self._path(key, meta=True)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete_many(self, keys):
+        failed = []
+        for key in keys:
+            try:
+                self.delete(key)
+            except (OSError, StorageError) as e:
+                print(f"ERROR: Could not delete local object {key}: {e}")
+                failed.append(key)
+        return failed
+
+    def list_keys(self, prefix=''):
+        """Yields (key, last_modified) for every object whose key starts with `prefix`."""
+        for directory, dirnames, filenames in os.walk(self.root):
+            if directory == self.root:
+                dirnames[:] = [d for d in dirnames if d != self.META_DIR]
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    yield key, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+    def url(self, key):
+        if not key:
+            return None
+        return f"{self.base_url}/{key}"
+
+    def key_from_url(self, url):
+        if url and url.startswith(self.base_url + '/'):
+            return url[len(self.base_url) + 1:].split('?', 1)[0]
+        return None
+
+    def _serializer(self):
+        if not self.secret_key:
+            raise StorageError("Local storage uploads require SECRET_KEY to sign upload URLs.")
+        return URLSafeTimedSerializer(self.secret_key, salt=LOCAL_UPLOAD_TOKEN_SALT)
+
+    def presign_put(self, key, content_type, size, expires_in):
+        """Signed URL for the local PUT route; mirrors an S3 presigned PUT."""
+        token = self._serializer().dumps({'key': key, 'content_type': content_type, 'size': size, 'expires_in': expires_in})
+        return f"{self.url(key)}?token={token}"
+
+    def verify_put_token(self, token, key):
+        """Returns the signed upload constraints for `key`, or None if the token is invalid or expired."""
+        try:
+            claims, signed_at = self._serializer().loads(token, return_timestamp=True)
+        except BadSignature:
+            return None
+        age = (datetime.now(timezone.utc) - signed_at).total_seconds()
+        if claims.get('key') != key or age > claims.get('expires_in', 0):
+            return None
+        return claims
+
+    def file_path(self, key):
+        """Absolute path of a stored object, for serving it from the storage route."""
+        return self._path(key)
+
+
+def init_storage(app, s3_client=None):
+    """
+    Picks the storage backend for the app and stores it in app.config['STORAGE'].
+    STORAGE_BACKEND may force 's3' or 'local'; by default S3 is used when a client
+    could be created from the configured credentials, otherwise local disk.
+    """
+    backend = (app.config.get('STORAGE_BACKEND') or '').lower()
+    if backend not in ('', 's3', 'local'):
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'. Use 's3' or 'local'.")
+
+    if backend == 's3' or (not backend and s3_client and app.config.get('S3_BUCKET')):
+        if not s3_client or not app.config.get('S3_BUCKET'):
+            raise ValueError("STORAGE_BACKEND is 's3' but S3 credentials or bucket are not configured.")
+        storage = S3Storage(
+            s3_client,
+            app.config['S3_BUCKET'],
+            public_base_url=app.config.get('DOMAIN_NAME_IMAGES'),
+            endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+            region=app.config.get('S3_REGION'),
+        )
+        print(f"INFO: Using S3 storage backend (bucket {storage.bucket}).")
+    else:
+        storage = LocalStorage(
+            app.config.get('LOCAL_STORAGE_ROOT') or os.path.join(app.instance_path, 'storage'),
+            base_url=app.config.get('LOCAL_STORAGE_URL', '/storage'),
+            secret_key=app.config.get('SECRET_KEY'),
+        )
+        print(f"INFO: Using local storage backend at {storage.root}.")
+
+    app.config['STORAGE'] = storage
+    return storage
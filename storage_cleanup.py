@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, update
+
+from models import db, Ampersound, AmpersoundStatus, Post, User, PendingUpload, StorageDeletion, dialect_insert
+from background import submit_task
+from storage import S3_DELETE_BATCH_SIZE
+
+DEFAULT_SWEEP_BATCH_SIZE = S3_DELETE_BATCH_SIZE # One DeleteObjects call per batch
+DEFAULT_MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 60 # Doubles with every failed attempt
+RETRY_MAX_SECONDS = 6 * 3600
+QUEUE_INSERT_CHUNK = 500 # Rows per INSERT, within SQLite's bound parameter limit
+
+# Key prefixes written by the app (uploads, derivatives, generated images); the orphan
+# scanner never looks outside them, so shared files such as default_profile.png are safe.
+MANAGED_PREFIXES = ('images/', 'ampersounds/', 'profile_pictures/', 'generated_images/', 'remixed_images/')
+DEFAULT_ORPHAN_GRACE = timedelta(hours=24) # Uploads and variants are written before their row commits
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None) # Stored as naive UTC
+
+
+def image_keys(storage, image_url, variants):
+    """Storage keys of an image URL and its derivatives ({name: {'webp': url, 'jpeg': url}})."""
+    urls = [image_url]
+    for entry in (variants or {}).values():
+        if isinstance(entry, dict):
+            urls.extend(entry.get(fmt) for fmt in ('webp', 'jpeg'))
+    keys = (storage.key_from_url(url) for url in urls if url)
+    return [key for key in keys if key]
+
+
+def queue_storage_deletions(keys):
+    """
+    Records keys in the deletion outbox as part of the caller's transaction, so the
+    objects are only deleted if the rows referencing them are. Keys already queued are
+    ignored. Call schedule_storage_sweep() after committing.
+    """
+    keys = sorted({key for key in keys if key})
+    if not keys:
+        return 0
+    now = _now()
+    insert = dialect_insert()
+    for start in range(0, len(keys), QUEUE_INSERT_CHUNK):
+        stmt = insert(StorageDeletion.__table__).values(
+            [{'key': key, 'created_at': now, 'attempts': 0, 'next_attempt_at': now} for key in keys[start:start + QUEUE_INSERT_CHUNK]]
+        ).on_conflict_do_nothing(index_elements=['key'])
+        db.session.execute(stmt)
+    return len(keys)
+
+
+def schedule_storage_sweep():
+    """Drains the outbox on the background pool (scripts/sweep_storage.py also retries stragglers)."""
+    if current_app.config.get('STORAGE') is not None:
+        submit_task(sweep_storage_deletions)
+
+
+def upload_confirm_cutoff():
+    """Pending uploads issued before this (naive UTC) can no longer be confirmed (UPLOAD_CONFIRM_WINDOW)."""
+    return _now() - timedelta(seconds=current_app.config.get('UPLOAD_CONFIRM_WINDOW', 3600))
+
+
+def expire_pending_uploads(batch_size=QUEUE_INSERT_CHUNK):
+    """
+    Deletes pending uploads that were never confirmed within UPLOAD_CONFIRM_WINDOW and
+    queues their objects (if the client uploaded one) in the same transaction,
+    `batch_size` rows per transaction. Run sweep_storage_deletions() afterwards.
+    Returns the number of uploads expired.
+    """
+    cutoff = upload_confirm_cutoff()
+    expired = 0
+    while True:
+        rows = (
+            db.session.query(PendingUpload.id, PendingUpload.s3_key)
+            .filter(PendingUpload.timestamp < cutoff)
+            .order_by(PendingUpload.timestamp)
+            .limit(batch_size)
+            .all()
+        )
+        if rows:
+            queue_storage_deletions(key for _, key in rows)
+            db.session.execute(delete(PendingUpload).where(PendingUpload.id.in_([row_id for row_id, _ in rows])))
+            db.session.commit()
+        expired += len(rows)
+        if len(rows) < batch_size:
+            return expired
+
+
+def _still_referenced(storage, keys):
+    """
+    The keys a row points at again, e.g. written anew after being queued. Checked right
+    before deleting, so the sweep never removes a live file.
+    """
+    referenced = {path for (path,) in db.session.query(Ampersound.file_path).filter(
+        Ampersound.file_path.in_(keys), Ampersound.status != AmpersoundStatus.REJECTED)} # Rejected rows keep their old key
+    referenced.update(key for (key,) in db.session.query(PendingUpload.s3_key).filter(
+        PendingUpload.s3_key.in_(keys), PendingUpload.timestamp >= upload_confirm_cutoff())) # Expired ones can never be confirmed
+    keys_by_url = {storage.url(key): key for key in keys}
+    keys_by_url.pop(None, None)
+    if keys_by_url:
+        urls = list(keys_by_url)
+        referenced.update(keys_by_url[url] for (url,) in db.session.query(Post.image_url).filter(Post.image_url.in_(urls)))
+        referenced.update(keys_by_url[url] for (url,) in db.session.query(User.profile_picture).filter(User.profile_picture.in_(urls)))
+    return referenced
+
+
+def sweep_storage_deletions(batch_size=None, max_attempts=None):
+    """
+    Deletes the objects of due outbox entries, `batch_size` keys per storage.delete_many()
+    call (one S3 DeleteObjects request), and removes the entries that succeeded. Keys a
+    row references again are dropped from the outbox without being deleted. Failed keys
+    are retried with exponential backoff until `max_attempts`, then left in the outbox
+    with their last error for inspection. Returns (deleted, failed).
+    """
+    config = current_app.config
+    storage = config.get('STORAGE')
+    if storage is None:
+        return 0, 0
+    batch_size = batch_size or config.get('STORAGE_SWEEP_BATCH_SIZE', DEFAULT_SWEEP_BATCH_SIZE)
+    max_attempts = max_attempts or config.get('STORAGE_DELETE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+    deleted = failed_total = 0
+    while True:
+        entries = (
+            db.session.query(StorageDeletion.id, StorageDeletion.key, StorageDeletion.attempts)
+            .filter(StorageDeletion.next_attempt_at <= _now(), StorageDeletion.attempts < max_attempts)
+            .order_by(StorageDeletion.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not entries:
+            break
+        live = _still_referenced(storage, [entry.key for entry in entries])
+        if live:
+            current_app.logger.info(f"Storage sweep: skipped {len(live)} key(s) in use again: {sorted(live)[:10]}")
+        to_delete = [entry.key for entry in entries if entry.key not in live]
+        try:
+            failed = set(storage.delete_many(to_delete)) if to_delete else set()
+            error = "Delete failed"
+        except Exception as e: # Whole batch failed (network, credentials)
+            failed = set(to_delete)
+            error = str(e)
+
+        done = [entry.id for entry in entries if entry.key not in failed] # Includes the skipped keys
+        if done:
+            db.session.execute(delete(StorageDeletion).where(StorageDeletion.id.in_(done)))
+        for attempts in {entry.attempts for entry in entries if entry.key in failed}:
+            ids = [entry.id for entry in entries if entry.key in failed and entry.attempts == attempts]
+            delay = min(RETRY_BASE_SECONDS * 2 ** attempts, RETRY_MAX_SECONDS)
+            db.session.execute(
+                update(StorageDeletion).where(StorageDeletion.id.in_(ids))
+                .values(attempts=attempts + 1, next_attempt_at=_now() + timedelta(seconds=delay), last_error=error)
+            )
+        db.session.commit()
+
+        deleted += len(done) - len(live)
+        failed_total += len(failed)
+        if len(entries) < batch_size:
+            break
+        if failed and not done:
+            break # Storage is failing; leave the rest for the next sweep
+    if failed_total:
+        current_app.logger.warning(f"Storage sweep: {deleted} object(s) deleted, {failed_total} failed and will be retried")
+    return deleted, failed_total
+
+
+def referenced_storage_keys(storage):
+    """
+    Every key the database points at: live ampersounds, post images, profile pictures,
+    uploads that can still be confirmed and queued deletions.
+    """
+    keys = set()
+    keys.update(path for (path,) in db.session.query(Ampersound.file_path).filter(Ampersound.status != AmpersoundStatus.REJECTED).yield_per(1000))
+    for image_url, variants in db.session.query(Post.image_url, Post.image_variants).filter(Post.image_url.isnot(None)).yield_per(1000):
+        keys.update(image_keys(storage, image_url, variants))
+    for picture, variants in db.session.query(User.profile_picture, User.profile_picture_variants).filter(User.profile_picture.isnot(None)).yield_per(1000):
+        keys.update(image_keys(storage, picture, variants))
+    keys.update(key for (key,) in db.session.query(PendingUpload.s3_key).filter(PendingUpload.timestamp >= upload_confirm_cutoff()).yield_per(1000))
+    keys.update(key for (key,) in db.session.query(StorageDeletion.key).yield_per(1000))
+    return keys
+
+
+def find_orphaned_keys(prefixes=MANAGED_PREFIXES, grace=DEFAULT_ORPHAN_GRACE):
+    """
+    Reconciles storage listings (storage.list_keys) with the database: keys under the
+    managed prefixes that nothing references and that are older than `grace`. Includes
+    the objects of expired pending uploads; queue them with queue_orphaned_keys().
+    """
+    storage = current_app.config['STORAGE']
+    referenced = referenced_storage_keys(storage)
+    cutoff = datetime.now(timezone.utc) - grace
+    orphans = []
+    for prefix in prefixes:
+        for key, last_modified in storage.list_keys(prefix):
+            if key not in referenced and last_modified < cutoff:
+                orphans.append(key)
+    return orphans
+
+
+def queue_orphaned_keys(keys):
+    """
+    Queues keys found by find_orphaned_keys() for deletion, deleting the expired pending
+    uploads they belong to in the same transaction. Does not commit. Returns the number queued.
+    """
+    keys = list(keys)
+    cutoff = upload_confirm_cutoff()
+    for start in range(0, len(keys), QUEUE_INSERT_CHUNK):
+        db.session.execute(delete(PendingUpload).where(
+            PendingUpload.s3_key.in_(keys[start:start + QUEUE_INSERT_CHUNK]), PendingUpload.timestamp < cutoff))
+    return queue_storage_deletions(keys)
@@ -15,10 +15,13 @@ def app():
     """Create and configure a new app instance for each test session."""
     db_fd, db_path = tempfile.mkstemp()
     temp_upload_folder = tempfile.mkdtemp()
+    temp_storage_root = tempfile.mkdtemp()
 
     test_config_overrides = {
         'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
         'UPLOAD_FOLDER': temp_upload_folder,
+        'LOCAL_STORAGE_ROOT': temp_storage_root, # No S3 in tests, so the local storage backend is used
+        'REMIX_SOURCE_CACHE_DIR': os.path.join(temp_upload_folder, 'remix_source_cache'),
         'JWT_SECRET_KEY': 'test_secret_key',
         'INVITE_ONLY': False,
         'MAIL_SERVER': 'localhost', # Test-friendly mail setup
@@ -53,6 +56,7 @@ def app():
     os.unlink(db_path)
     if os.path.exists(temp_upload_folder):
         shutil.rmtree(temp_upload_folder)
+    shutil.rmtree(temp_storage_root, ignore_errors=True)
 
 @pytest.fixture(scope='function')
 def client(app):
@@ -11,6 +11,14 @@ from models import User # Import User model to check DB later if needed
 #     assert response.status_code == 200
 #     assert b'Welcome' in response.data # Adjust this assertion based on your actual homepage content
 
+# --- App Creation Tests ---
+def test_unsupported_database_fails_at_startup(capsys):
+    """Upserts need PostgreSQL or SQLite, so other databases are rejected when the app is created."""
+    from app import create_app
+    assert create_app(config_name='testing', overrides={'SQLALCHEMY_DATABASE_URI': 'mysql://user@localhost/app'}) is None
+    assert "Unsupported database 'mysql'" in capsys.readouterr().out
+
+# --- Registration Tests ---
 def test_user_registration_success(client):
     """Test successful user registration."""
     response = client.post('/api/v1/register', json={
@@ -601,8 +609,6 @@ def test_get_own_profile_success(client):
     assert 'user' in profile_data
     assert profile_data['user']['username'] == 'profileowner'
     assert profile_data['user']['email'] == 'po@example.com' # Own profile should show email
-    assert 'posts' in profile_data
-    assert isinstance(profile_data['posts'], list)
     assert 'interests' in profile_data
     assert isinstance(profile_data['interests'], list)
     assert profile_data['friendship_status'] == 'SELF'
@@ -626,14 +632,17 @@ def test_get_other_user_profile_success(client):
 
     assert 'user' in profile_data
     assert profile_data['user']['username'] == 'profileowner_other'
-    # Email might be hidden for other users - check resource logic if needed
-    # assert 'email' not in profile_data['user'] or profile_data['user']['email'] is None
-    assert 'posts' in profile_data
-    assert len(profile_data['posts']) >= 1 # Should see the public post
-    assert profile_data['posts'][0]['content'] == 'Public post by profileowner_other'
+    assert 'email' not in profile_data['user'] # Only shown on your own profile
     assert 'interests' in profile_data
     assert profile_data['friendship_status'] == 'NONE' # Not friends yet
 
+    # Posts are paginated separately
+    posts_resp = client.get('/api/v1/profiles/profileowner_other/posts')
+    assert posts_resp.status_code == 200
+    posts_data = posts_resp.get_json()
+    assert len(posts_data['posts']) >= 1 # Should see the public post
+    assert posts_data['posts'][0]['content'] == 'Public post by profileowner_other'
+
 def test_get_profile_not_logged_in(client):
     """Test fetching a profile fails if not logged in."""
     # 1. Register a user whose profile we want to view
@@ -1082,4 +1091,4 @@ def test_invite_endpoints_not_logged_in(client):
     # Expect 401 Unauthorized as endpoint is @login_required
     assert gen_resp.status_code == 401
 
-# --- End of File ---
\ No newline at end of file
+# --- End of File ---
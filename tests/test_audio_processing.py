@@ -0,0 +1,52 @@
+import math
+import os
+import struct
+import tempfile
+import wave
+
+import pytest
+
+from audio_processing import compute_waveform_peaks, normalize_audio, ffmpeg_available
+
+
+def _pcm_from_samples(samples):
+    return struct.pack(f'<{len(samples)}h', *samples)
+
+
+def test_waveform_peaks_are_scaled_to_loudest_bucket():
+    """Quiet first half, loud second half -> peaks scaled 0-100 relative to the loudest bucket."""
+    samples = [1000, -1000] * 50 + [-20000, 20000] * 50
+    peaks = compute_waveform_peaks(_pcm_from_samples(samples), buckets=4)
+    assert peaks == [5, 5, 100, 100]
+
+def test_waveform_peaks_empty_audio():
+    """No samples (or a dangling odd byte) yields an empty waveform."""
+    assert compute_waveform_peaks(b'') == []
+    assert compute_waveform_peaks(b'\x01') == []
+
+def test_normalize_audio_disabled_by_config():
+    """AMPERSOUND_TRANSCODE=False skips normalization so the original is stored as-is."""
+    assert normalize_audio('/nonexistent.webm', {'AMPERSOUND_TRANSCODE': False}) is None
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg is not installed")
+def test_normalize_audio_transcodes_wav():
+    """A one second tone is transcoded to m4a with duration and waveform extracted."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source_path = os.path.join(tmpdir, 'tone.wav')
+        with wave.open(source_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(44100)
+            wav.writeframes(_pcm_from_samples(
+                [int(8000 * math.sin(2 * math.pi * 440 * i / 44100)) for i in range(44100)]
+            ))
+
+        result = normalize_audio(source_path, {'AMPERSOUND_WAVEFORM_BUCKETS': 16})
+
+    assert result is not None
+    assert result['extension'] == '.m4a'
+    assert result['content_type'] == 'audio/mp4'
+    assert result['data']
+    assert 900 <= result['duration_ms'] <= 1100
+    assert len(result['waveform']) == 16
+    assert max(result['waveform']) == 100
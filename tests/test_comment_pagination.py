@@ -0,0 +1,100 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import User, Post, Comment, Ampersound, PostPrivacy
+from utils import format_text_with_ampersounds, resolve_ampersound_tags
+
+
+@pytest.fixture
+def post_with_comments(app):
+    """A public post with 7 comments; the middle three share one timestamp to exercise the id tie-break."""
+    with app.app_context():
+        suffix = uuid.uuid4().hex[:8]
+        user = User(username=f"pager_{suffix}", email=f"pager_{suffix}@example.com", password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        post = Post(content='busy post', user_id=user.id, privacy=PostPrivacy.PUBLIC)
+        db.session.add(post)
+        db.session.flush()
+        base = datetime(2026, 1, 1, 12, 0, 0)
+        offsets = [0, 1, 2, 2, 2, 3, 4]
+        for i, offset in enumerate(offsets):
+            db.session.add(Comment(content=f"comment {i}", user_id=user.id, post_id=post.id, timestamp=base + timedelta(minutes=offset)))
+        db.session.commit()
+        return post.id
+
+
+def _collect(client, post_id, **params):
+    contents = []
+    cursor = None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        data = client.get(f"/api/v1/posts/{post_id}/comments", query_string=query).get_json()
+        contents.extend(c['content'] for c in data['comments'])
+        if not data['has_more']:
+            assert data['next_cursor'] is None
+            return contents
+        cursor = data['next_cursor']
+
+
+def test_oldest_first_pages_cover_every_comment_once(client, post_with_comments):
+    assert _collect(client, post_with_comments, limit=2) == [f"comment {i}" for i in range(7)]
+
+
+def test_newest_first_pages(client, post_with_comments):
+    assert _collect(client, post_with_comments, limit=3, order='newest') == [f"comment {i}" for i in reversed(range(7))]
+
+
+def test_preview_returns_latest_in_chronological_order(client, post_with_comments):
+    data = client.get(f"/api/v1/posts/{post_with_comments}/comments?preview=3").get_json()
+    assert [c['content'] for c in data['comments']] == ['comment 4', 'comment 5', 'comment 6']
+    assert data['has_more'] is True
+
+    older = client.get(f"/api/v1/posts/{post_with_comments}/comments", query_string={'order': 'newest', 'cursor': data['next_cursor']}).get_json()
+    assert [c['content'] for c in older['comments']] == ['comment 3', 'comment 2', 'comment 1', 'comment 0']
+
+
+def test_invalid_cursor_is_rejected(client, post_with_comments):
+    response = client.get(f"/api/v1/posts/{post_with_comments}/comments?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_tags_resolve_in_one_batch(app):
+    with app.app_context():
+        suffix = uuid.uuid4().hex[:8]
+        owner = User(username=f"sounds_{suffix}", email=f"sounds_{suffix}@example.com", password_hash='x')
+        other = User(username=f"other_{suffix}", email=f"other_{suffix}@example.com", password_hash='x')
+        db.session.add_all([owner, other])
+        db.session.flush()
+        db.session.add_all([
+            Ampersound(user_id=owner.id, name=f"unique{suffix}", file_path='a.mp3'),
+            Ampersound(user_id=owner.id, name=f"shared{suffix}", file_path='b.mp3'),
+            Ampersound(user_id=other.id, name=f"shared{suffix}", file_path='c.mp3'),
+        ])
+        db.session.commit()
+
+        texts = [
+            f"hi &unique{suffix}",
+            f"ambiguous &shared{suffix} but &{other.username}.shared{suffix} is fine",
+            "no tags & <b>markup</b>",
+        ]
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            resolved = resolve_ampersound_tags(texts)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 2
+
+        rendered = [format_text_with_ampersounds(text, owner.username, resolved) for text in texts]
+        assert f'data-username="{owner.username}" data-soundname="unique{suffix}"' in rendered[0]
+        assert f'&amp;shared{suffix} but' in rendered[1] # Ambiguous: left as escaped text
+        assert f'data-username="{other.username}" data-soundname="shared{suffix}"' in rendered[1]
+        assert rendered[2] == 'no tags &amp; &lt;b&gt;markup&lt;/b&gt;'
+        # Without a prefetched map the formatter resolves the text on its own, with the same result
+        assert format_text_with_ampersounds(texts[1], owner.username) == rendered[1]
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from static_assets import AssetManifest, send_asset, IMMUTABLE, REVALIDATE
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_text('<html>app</html>')
+    (tmp_path / 'index.html.gz').write_bytes(gzip.compress(b'<html>app</html>'))
+    (tmp_path / 'assets' / 'index-BxYz12_a.js').write_text('console.log(1)')
+    (tmp_path / 'assets' / 'index-BxYz12_a.js.br').write_bytes(b'brotli bytes')
+    (tmp_path / 'favicon.ico').write_bytes(b'icon')
+    return tmp_path
+
+
+def test_manifest_groups_precompressed_variants(dist):
+    manifest = AssetManifest(str(dist))
+    assert set(manifest.assets) == {'index.html', 'assets/index-BxYz12_a.js', 'favicon.ico'}
+    script = manifest.get('assets/index-BxYz12_a.js')
+    assert script.cache_control == IMMUTABLE
+    assert script.variants == {'br': os.path.join(str(dist), 'assets', 'index-BxYz12_a.js.br')}
+    assert manifest.get('index.html').cache_control == REVALIDATE
+    assert manifest.get('favicon.ico').variants == {}
+    assert manifest.get('../app.py') is None
+
+
+def test_send_asset_negotiates_encoding(app, dist):
+    manifest = AssetManifest(str(dist))
+    script = manifest.get('assets/index-BxYz12_a.js')
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip, br'}):
+        response = send_asset(script)
+        response.direct_passthrough = False
+        assert response.headers['Content-Encoding'] == 'br'
+        assert response.get_data() == b'brotli bytes'
+        assert response.headers['Cache-Control'] == IMMUTABLE
+        assert 'Accept-Encoding' in response.vary
+        brotli_etag = response.get_etag()[0]
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = send_asset(script)
+        response.direct_passthrough = False
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == b'console.log(1)'
+        assert response.get_etag()[0] != brotli_etag
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = send_asset(manifest.get('index.html'))
+        response.direct_passthrough = False
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()) == b'<html>app</html>'
+
+
+def _login(client, name):
+    client.post('/api/v1/register', json={'username': name, 'email': f'{name}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': name, 'password': 'p'})
+
+
+def test_large_json_responses_are_gzipped(client, app):
+    _login(client, 'gzip_user')
+    for i in range(8):
+        client.post('/api/v1/posts', data={'content': f'compressible post {i} ' * 10, 'privacy': 'PUBLIC'})
+
+    plain = client.get('/api/v1/posts')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.vary
+
+    compressed = client.get('/api/v1/posts', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert len(compressed.data) < len(plain.data)
+
+
+def test_compressed_responses_revalidate_with_weak_etag(client):
+    _login(client, 'weak_etag_user')
+    created = client.post('/api/v1/posts', data={'content': 'long post ' * 200, 'privacy': 'PUBLIC'})
+    url = f"/api/v1/posts/{created.get_json()['post']['id']}"
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    cached = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert cached.status_code == 304
+
+
+def test_small_json_responses_are_not_compressed(client):
+    response = client.get('/api/v1/posts/999999999', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
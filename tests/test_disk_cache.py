@@ -0,0 +1,51 @@
+import base64
+
+from disk_cache import DiskLRUCache
+from models import Post
+from resources.image_remix import load_remix_source_base64
+
+
+def test_lru_eviction_and_restart(tmp_path):
+    """Least recently used entries are evicted past the byte budget; the index survives a restart."""
+    cache = DiskLRUCache(tmp_path, max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+    assert cache.get('a') == b'1234' # 'a' is now most recently used
+    cache.put('c', b'90ab')
+
+    assert cache.get('b') is None
+    assert cache.get('c') == b'90ab'
+    assert cache.size_bytes == 8
+
+    reopened = DiskLRUCache(tmp_path, max_bytes=10)
+    assert reopened.get('a') == b'1234' and reopened.get('c') == b'90ab'
+
+def test_bound_holds_across_processes_sharing_the_directory(tmp_path):
+    """Two caches on one directory (two gunicorn workers) stay within max_bytes together."""
+    first = DiskLRUCache(tmp_path, max_bytes=10)
+    second = DiskLRUCache(tmp_path, max_bytes=10)
+    first.put('a', b'1234')
+    second.put('b', b'5678')
+    assert second.get('a') == b'1234' # Entries written by one worker are hits for the other
+    first.put('c', b'90ab')
+
+    assert first.size_bytes == second.size_bytes == 8
+    assert first.get('b') is None
+    assert second.get('a') == b'1234' and second.get('c') == b'90ab'
+
+def test_remix_source_read_from_storage_and_cached(app):
+    """Remix sources in our storage are read by key, then served from the local cache."""
+    storage = app.config['STORAGE']
+    cache = app.config['REMIX_SOURCE_CACHE']
+    storage.put('images/remix-source.jpg', b'original-bytes', 'image/jpeg')
+    post = Post(content='x', image_url=storage.url('images/remix-source.jpg'))
+
+    with app.test_request_context('/'):
+        first = load_remix_source_base64(post)
+        storage.delete('images/remix-source.jpg') # A cache hit must not touch storage
+        hits_before = cache.hits
+        second = load_remix_source_base64(post)
+
+    assert base64.b64decode(first) == b'original-bytes'
+    assert second == first
+    assert cache.hits == hits_before + 1
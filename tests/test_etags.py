@@ -0,0 +1,69 @@
+import uuid
+
+
+def _login_new_user(client):
+    username = f"etag_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+    return username
+
+
+def _create_post(client, content='etag post'):
+    response = client.post('/api/v1/posts', data={'content': content, 'privacy': 'PUBLIC'})
+    return response.get_json()['post']['id']
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_post_returns_304_until_it_changes(client):
+    _login_new_user(client)
+    post_id = _create_post(client)
+    url = f'/api/v1/posts/{post_id}'
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    cached = _revalidate(client, url, etag)
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+
+    client.post(f'/api/v1/posts/{post_id}/like')
+    liked = _revalidate(client, url, etag)
+    assert liked.status_code == 200
+    assert liked.get_json()['likes_count'] == 1
+
+    client.put(url, json={'content': 'edited'})
+    edited = _revalidate(client, url, liked.headers['ETag'])
+    assert edited.status_code == 200
+    assert edited.get_json()['content'] == 'edited'
+
+
+def test_comment_page_etag_changes_with_new_comments(client):
+    _login_new_user(client)
+    post_id = _create_post(client)
+    url = f'/api/v1/posts/{post_id}/comments'
+    client.post(url, json={'content': 'first'})
+
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert _revalidate(client, url, etag).status_code == 304
+
+    client.post(url, json={'content': 'second'})
+    changed = _revalidate(client, url, etag)
+    assert changed.status_code == 200
+    assert [c['content'] for c in changed.get_json()['comments']] == ['first', 'second']
+
+
+def test_feed_and_ampersound_lists_revalidate(client):
+    _login_new_user(client)
+    _create_post(client)
+
+    for url in ('/api/v1/feed?sort_by=recency', '/api/v1/ampersounds', '/api/v1/ampersounds/my'):
+        first = client.get(url)
+        assert first.status_code == 200, url
+        assert _revalidate(client, url, first.headers['ETag']).status_code == 304, url
@@ -0,0 +1,235 @@
+import base64
+import threading
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from extensions import db
+from models import User, Post, GenerationJob, GenerationJobKind, GenerationJobStatus, UserImageGenerationStats
+from resources.image_generation import DAILY_GENERATION_LIMIT
+import generation_jobs
+from generation_jobs import FairJobScheduler, expire_stale_job, expire_stale_jobs
+from openai import APIError
+
+
+class FakeImagesAPI:
+    def __init__(self, b64=None, error=None):
+        self.b64 = b64
+        self.error = error
+
+    def generate(self, **kwargs):
+        if self.error:
+            raise self.error
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=self.b64)])
+
+
+class ExpiringImagesAPI(FakeImagesAPI):
+    """Lets the job time out (as a poll would) while the upstream call is in progress."""
+    def generate(self, **kwargs):
+        job = GenerationJob.query.filter_by(prompt=kwargs['prompt']).one()
+        job.started_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.session.commit()
+        assert expire_stale_job(job)
+        return super().generate(**kwargs)
+
+
+class FakeHttpClients:
+    def __init__(self, images):
+        self.images = images
+
+    def openai(self, name, api_key, base_url=None):
+        return SimpleNamespace(images=self.images)
+
+
+def _login_new_user(client):
+    username = f"generator_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+    return username
+
+def test_scheduler_round_robins_between_users():
+    """A user with a long queue does not delay other users' first jobs."""
+    scheduler = FairJobScheduler(app=None, max_concurrency=0) # No workers: drive the queue by hand
+    for user_id, job_id in [(1, 'a'), (1, 'b'), (1, 'c'), (2, 'd'), (3, 'e')]:
+        scheduler.submit(user_id, job_id)
+
+    order = [scheduler.next_job() for _ in range(5)]
+
+    assert order == ['a', 'd', 'e', 'b', 'c']
+    assert scheduler.next_job() is None
+
+def test_scheduler_worker_survives_failing_jobs(app, monkeypatch):
+    """An exception escaping a job is logged; the worker goes on to the next job."""
+    ran = []
+    done = threading.Event()
+    def run(job_id):
+        if job_id == 'broken':
+            raise RuntimeError("database unavailable")
+        ran.append(job_id)
+        done.set()
+    monkeypatch.setattr(generation_jobs, 'run_generation_job', run)
+
+    scheduler = FairJobScheduler(app, max_concurrency=1)
+    scheduler.submit(1, 'broken')
+    scheduler.submit(2, 'fine')
+    assert done.wait(5)
+    assert ran == ['fine']
+    assert all(worker.is_alive() for worker in scheduler._workers)
+
+def test_generate_image_requires_login(client, app):
+    """Anonymous callers cannot spend the paid generation API."""
+    with app.app_context():
+        jobs_before = GenerationJob.query.count()
+    response = client.post('/api/v1/generate_image', json={'prompt': 'an anonymous lighthouse'})
+    assert response.status_code == 401
+    with app.app_context():
+        assert GenerationJob.query.count() == jobs_before
+
+def test_generate_image_returns_job_and_poll_reports_post(client, app, monkeypatch):
+    """POST queues a job (202); polling the job returns the created post."""
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(FakeImagesAPI(b64=base64.b64encode(b'png-bytes').decode())))
+    _login_new_user(client)
+
+    response = client.post('/api/v1/generate_image', json={'prompt': 'a lighthouse'})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    job = client.get(f"/api/v1/generation_jobs/{job_id}").get_json()
+    assert job['status'] == 'succeeded'
+    assert job['kind'] == 'generate'
+    with app.app_context():
+        post = db.session.get(Post, job['post_id'])
+        assert post.content == 'Generated image with prompt: a lighthouse'
+        assert post.image_url == job['image_url']
+
+def test_failed_generation_is_reported_on_the_job(client, app, monkeypatch):
+    error = APIError('model overloaded', request=SimpleNamespace(method='POST', url='https://api.example.com'), body=None)
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(FakeImagesAPI(error=error)))
+    _login_new_user(client)
+
+    job_id = client.post('/api/v1/generate_image', json={'prompt': 'a storm'}).get_json()['job_id']
+    job = client.get(f"/api/v1/generation_jobs/{job_id}").get_json()
+
+    assert job['status'] == 'failed'
+    assert 'model overloaded' in job['error']
+    assert job['post_id'] is None
+
+def test_active_job_cap_per_user(client, app):
+    """Users cannot queue more than GENERATION_MAX_ACTIVE_JOBS_PER_USER jobs at once."""
+    username = _login_new_user(client)
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        for _ in range(app.config['GENERATION_MAX_ACTIVE_JOBS_PER_USER']):
+            db.session.add(GenerationJob(user_id=user.id, kind=GenerationJobKind.GENERATE, prompt='x', status=GenerationJobStatus.QUEUED))
+        db.session.commit()
+
+    response = client.post('/api/v1/generate_image', json={'prompt': 'one more'})
+    assert response.status_code == 429
+
+def test_jobs_lost_to_a_restart_free_the_cap(client, app, monkeypatch):
+    """Queued jobs nobody will run (their process restarted) expire, are refunded and stop counting."""
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(FakeImagesAPI(b64=base64.b64encode(b'png-bytes').decode())))
+    username = _login_new_user(client)
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        user_id = user.id
+        stale = datetime.now(timezone.utc) - timedelta(seconds=app.config['GENERATION_JOB_TIMEOUT'] + 60)
+        cap = app.config['GENERATION_MAX_ACTIVE_JOBS_PER_USER']
+        for _ in range(cap):
+            db.session.add(GenerationJob(user_id=user_id, kind=GenerationJobKind.GENERATE, prompt='lost', status=GenerationJobStatus.QUEUED, created_at=stale))
+        db.session.add(UserImageGenerationStats(user_id=user_id, generation_date=stale.date(), count=cap))
+        db.session.commit()
+
+    response = client.post('/api/v1/generate_image', json={'prompt': 'after the deploy'})
+    assert response.status_code == 202
+
+    with app.app_context():
+        lost = GenerationJob.query.filter_by(user_id=user_id, prompt='lost').all()
+        assert {job.status for job in lost} == {GenerationJobStatus.FAILED}
+        assert all('timed out' in job.error for job in lost)
+        stats = UserImageGenerationStats.query.filter_by(user_id=user_id, generation_date=stale.date()).one()
+        assert stats.count == (1 if stale.date() == datetime.now(timezone.utc).date() else 0) # Only the new job
+        assert expire_stale_jobs() == 0
+
+def test_jobs_are_private(client, app):
+    _login_new_user(client)
+    with app.app_context():
+        owner = User.query.first()
+        job = GenerationJob(user_id=owner.id, kind=GenerationJobKind.GENERATE, prompt='secret')
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+    assert client.get(f"/api/v1/generation_jobs/{job_id}").status_code == 404
+
+def test_quota_reservation_stops_at_limit(app):
+    with app.app_context():
+        user = User(username=f"quota_{uuid.uuid4().hex[:8]}", email=f"quota_{uuid.uuid4().hex[:8]}@example.com", password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        today = date(2026, 1, 1)
+
+        counts = [UserImageGenerationStats.reserve(user.id, 3, today) for _ in range(4)]
+        assert counts == [1, 2, 3, None]
+
+        UserImageGenerationStats.release(user.id, today)
+        assert UserImageGenerationStats.reserve(user.id, 3, today) == 3
+        db.session.commit()
+        stats = UserImageGenerationStats.query.filter_by(user_id=user.id, generation_date=today).one()
+        assert stats.count == 3
+
+def test_failed_generation_gives_quota_back(client, app, monkeypatch):
+    error = APIError('model overloaded', request=SimpleNamespace(method='POST', url='https://api.example.com'), body=None)
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(FakeImagesAPI(error=error)))
+    username = _login_new_user(client)
+
+    client.post('/api/v1/generate_image', json={'prompt': 'a storm'})
+
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        stats = UserImageGenerationStats.query.filter_by(user_id=user.id).one()
+        assert stats.count == 0
+
+def test_daily_quota_is_enforced(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(FakeImagesAPI(b64=base64.b64encode(b'png-bytes').decode())))
+    username = _login_new_user(client)
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        user_id = user.id
+        db.session.add(UserImageGenerationStats(user_id=user_id, generation_date=datetime.now(timezone.utc).date(), count=DAILY_GENERATION_LIMIT))
+        db.session.commit()
+
+    response = client.post('/api/v1/generate_image', json={'prompt': 'one too many'})
+    assert response.status_code == 429
+    with app.app_context():
+        assert GenerationJob.query.filter_by(user_id=user_id).count() == 0
+
+def test_job_expired_while_running_does_not_post(client, app, monkeypatch):
+    """A job timed out (and refunded) while running is not turned into a free post when it finishes."""
+    monkeypatch.setitem(app.config, 'HTTP_CLIENTS', FakeHttpClients(ExpiringImagesAPI(b64=base64.b64encode(b'png-bytes').decode())))
+    username = _login_new_user(client)
+    prompt = f'slow lighthouse {username}'
+
+    job_id = client.post('/api/v1/generate_image', json={'prompt': prompt}).get_json()['job_id']
+    job = client.get(f"/api/v1/generation_jobs/{job_id}").get_json()
+
+    assert job['status'] == 'failed'
+    assert 'timed out' in job['error']
+    assert job['post_id'] is None
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        assert Post.query.filter_by(user_id=user.id).count() == 0
+        assert UserImageGenerationStats.query.filter_by(user_id=user.id).one().count == 0 # Refunded exactly once
+
+def test_timeout_of_running_job_counts_from_start(app):
+    with app.app_context():
+        user = User(username=f"timeout_{uuid.uuid4().hex[:8]}", email=f"timeout_{uuid.uuid4().hex[:8]}@example.com", password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        now = datetime.now(timezone.utc)
+        job = GenerationJob(user_id=user.id, kind=GenerationJobKind.GENERATE, prompt='queued for long',
+                            status=GenerationJobStatus.RUNNING, created_at=now - timedelta(hours=1), started_at=now)
+        db.session.add(job)
+        db.session.commit()
+
+        assert not expire_stale_job(job) # Waited in the queue for an hour, but only just started
+        assert job.status == GenerationJobStatus.RUNNING
@@ -0,0 +1,24 @@
+from http_clients import HttpClients
+
+
+def test_sessions_and_openai_clients_are_reused():
+    """The registry hands out the same pooled client for repeated calls to an endpoint."""
+    clients = HttpClients()
+    try:
+        assert clients.session('runware') is clients.session('runware')
+        assert clients.session('runware') is not clients.session('downloads')
+
+        first = clients.openai('deepinfra', api_key='key', base_url='https://api.example.com/v1')
+        assert clients.openai('deepinfra', api_key='key', base_url='https://api.example.com/v1') is first
+        assert clients.openai('deepinfra', api_key='other', base_url='https://api.example.com/v1') is not first
+        assert first.max_retries == 0 # Generation requests are billed; never replay them
+    finally:
+        clients.close()
+
+def test_settings_overrides_and_bounded_pool():
+    assert HttpClients().timeout('runware') == (5, 60)
+    clients = HttpClients({'runware': {'read_timeout': 120, 'max_connections': 4}})
+    assert clients.timeout('runware') == (5, 120)
+    adapter = clients.session('runware').get_adapter('https://api.runware.ai/v1')
+    assert adapter._pool_maxsize == 4 and adapter._pool_block
+    clients.close()
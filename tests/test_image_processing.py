@@ -0,0 +1,67 @@
+import io
+import uuid
+
+import pytest
+
+from image_processing import build_image_variants, variant_key, pillow_available, prepare_image_for_classification, POST_IMAGE_SIZES
+
+pytestmark = pytest.mark.skipif(not pillow_available(), reason="Pillow is not installed")
+
+
+def _png_bytes(width, height, mode='RGBA'):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new(mode, (width, height), (200, 10, 10, 128) if mode == 'RGBA' else (200, 10, 10)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_build_image_variants_sizes_without_upscaling():
+    """Each size keeps the aspect ratio, and originals smaller than a size are not upscaled."""
+    variants = build_image_variants(_png_bytes(1600, 800), POST_IMAGE_SIZES)
+
+    assert (variants['thumb']['width'], variants['thumb']['height']) == (320, 160)
+    assert (variants['feed']['width'], variants['feed']['height']) == (1080, 540)
+    assert (variants['full']['width'], variants['full']['height']) == (1600, 800)
+    assert variants['thumb']['webp'][:4] == b'RIFF'
+    assert variants['thumb']['jpeg'][:2] == b'\xff\xd8' # Transparent PNG flattened to JPEG
+
+def test_variant_key_sits_next_to_original():
+    assert variant_key('images/abc.png', 'thumb', 'webp') == 'images/abc.thumb.webp'
+
+def test_post_upload_records_variants(client, app):
+    """Uploading a post image stores derivatives and exposes their URLs on the post."""
+    username = f"variants_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+
+    response = client.post('/api/v1/posts', data={
+        'content': 'Picture post',
+        'privacy': 'PUBLIC',
+        'image': (io.BytesIO(_png_bytes(400, 300, 'RGB')), 'photo.png', 'image/png'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 201
+
+    post = response.get_json()['post']
+    variants = post['image_variants']
+    assert set(variants) == {'thumb', 'feed', 'full'}
+    assert variants['feed']['width'] == 400 # Smaller than the feed size, kept as-is
+    served = client.get(variants['thumb']['webp'])
+    assert served.status_code == 200
+    assert served.mimetype == 'image/webp'
+
+def test_prepare_image_for_classification_downscales_to_jpeg():
+    """Large images are shrunk to the classifier resolution and sent as JPEG."""
+    from PIL import Image
+    original = _png_bytes(2048, 1024, 'RGB')
+
+    prepared, content_type = prepare_image_for_classification(original, max_edge=896)
+
+    assert content_type == 'image/jpeg'
+    assert len(prepared) < len(original)
+    with Image.open(io.BytesIO(prepared)) as image:
+        assert image.size == (896, 448)
+
+def test_prepare_image_for_classification_keeps_unreadable_bytes():
+    prepared, content_type = prepare_image_for_classification(b'\x89PNG\r\n\x1a\nbroken')
+    assert prepared == b'\x89PNG\r\n\x1a\nbroken'
+    assert content_type == 'image/png'
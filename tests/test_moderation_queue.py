@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+from models import db, Report, ReportContentType, ReportStatus, PostPrivacy, Ampersound, AmpersoundStatus
+from moderation import review_pending_ampersounds
+
+
+def _report(reporter, item, content_type, reason, minutes_ago):
+    db.session.add(Report(
+        reporter_id=reporter.id, reported_user_id=item.user_id, content_type=content_type,
+        content_id=item.id, reason=reason, timestamp=datetime.now(timezone.utc) - timedelta(minutes=minutes_ago),
+    ))
+
+
+def _all_groups(client, limit):
+    groups, cursor = [], None
+    while True:
+        url = f'/api/v1/admin/reports/queue?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url).get_json()
+        groups.extend(body['groups'])
+        cursor = body['next_cursor']
+        if not body['has_more']:
+            return groups
+
+
+def test_queue_groups_and_prioritizes_pending_reports(client, create_user, create_post, create_comment, admin_user_auth_data):
+    author = create_user(username='QueueAuthor', email='queueauthor@example.com')
+    reporters = [create_user(username=f'QueueReporter{i}', email=f'queuereporter{i}@example.com') for i in range(5)]
+    hot_post = create_post(user_id=author.id, content='Reported a lot', privacy=PostPrivacy.PUBLIC)
+    old_post = create_post(user_id=author.id, content='Reported twice, long ago', privacy=PostPrivacy.PUBLIC)
+    new_post = create_post(user_id=author.id, content='Reported twice, recently', privacy=PostPrivacy.PUBLIC)
+    comment = create_comment(user_id=author.id, post_id=hot_post.id, content='Offensive comment')
+
+    for i, reporter in enumerate(reporters):
+        _report(reporter, hot_post, ReportContentType.POST, f'reason {i}', minutes_ago=10 - i)
+    for reporter in reporters[:2]:
+        _report(reporter, old_post, ReportContentType.POST, 'old', minutes_ago=500)
+        _report(reporter, new_post, ReportContentType.POST, '', minutes_ago=5)
+    _report(reporters[0], comment, ReportContentType.COMMENT, 'rude', minutes_ago=1)
+    db.session.commit()
+
+    groups = _all_groups(client, limit=1)
+    mine = [g for g in groups if g['reported_user'] and g['reported_user']['id'] == author.id]
+    assert [(g['content_type'], g['content_id'], g['report_count']) for g in mine] == [
+        ('post', hot_post.id, 5), ('post', old_post.id, 2), ('post', new_post.id, 2), ('comment', comment.id, 1),
+    ]
+    hot = mine[0]
+    assert hot['preview'] == 'Reported a lot'
+    assert hot['recent_reasons'] == ['reason 4', 'reason 3', 'reason 2']
+    assert mine[2]['recent_reasons'] == []
+    assert groups == _all_groups(client, limit=50) # Paging does not skip or repeat entries
+
+    # Resolving a group updates all its pending reports at once
+    response = client.post(f'/api/v1/admin/reports/queue/post/{hot_post.id}', json={'status': 'dismissed', 'admin_notes': 'fine'})
+    assert response.get_json()['updated'] == 5
+    assert Report.query.filter_by(content_id=hot_post.id, content_type=ReportContentType.POST, status=ReportStatus.DISMISSED).count() == 5
+    assert all(g['content_id'] != hot_post.id or g['content_type'] != 'post' for g in _all_groups(client, limit=50))
+
+    assert client.post(f'/api/v1/admin/reports/queue/post/{old_post.id}', json={'status': 'pending'}).status_code == 400
+    assert client.get('/api/v1/admin/reports/queue?cursor=bogus').status_code == 400
+
+
+def test_report_lists_are_paginated(client, create_user, create_post, regular_user_auth_data):
+    reporter = regular_user_auth_data['user']
+    author = create_user(username='ListAuthor', email='listauthor@example.com')
+    posts = [create_post(user_id=author.id, content=f'list {i}') for i in range(3)]
+    for i, post in enumerate(posts):
+        _report(reporter, post, ReportContentType.POST, f'mine {i}', minutes_ago=3 - i)
+    db.session.commit()
+
+    first = client.get('/api/v1/reports/mine?limit=2').get_json()
+    assert [r['reason'] for r in first['reports']] == ['mine 2', 'mine 1']
+    second = client.get(f"/api/v1/reports/mine?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [r['reason'] for r in second['reports']] == ['mine 0']
+    assert second['has_more'] is False
+
+    assert client.get('/api/v1/admin/reports').status_code == 403
+    assert client.get('/api/v1/admin/reports/queue').status_code == 403
+
+
+def test_admin_report_action_saves_notes(client, create_user, create_post, admin_user_auth_data):
+    reporter = create_user(username='NotesReporter', email='notesreporter@example.com')
+    post = create_post(user_id=create_user(username='NotesAuthor', email='notesauthor@example.com').id)
+    _report(reporter, post, ReportContentType.POST, 'spam', minutes_ago=1)
+    db.session.commit()
+    report = Report.query.filter_by(reporter_id=reporter.id).one()
+
+    response = client.patch(f'/api/v1/admin/reports/{report.id}', json={'status': 'resolved_manual', 'admin_notes': 'removed'})
+    assert response.status_code == 200
+    assert response.get_json()['report']['admin_notes'] == 'removed'
+    listed = client.get('/api/v1/admin/reports?status=resolved_manual').get_json()['reports']
+    assert report.id in [r['id'] for r in listed]
+
+
+def test_pending_ampersounds_are_paginated(client, create_user, create_ampersound, admin_user_auth_data):
+    owner = create_user(username='PendingOwner', email='pendingowner@example.com')
+    for i in range(3):
+        create_ampersound(user_id=owner.id, name=f'pending{i}', file_path=f'p{i}.mp3')
+
+    seen, cursor = [], None
+    while True:
+        body = client.get('/api/v1/admin/ampersounds/pending?limit=2' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen.extend(body['ampersounds'])
+        cursor = body['next_cursor']
+        if not body['has_more']:
+            break
+    mine = [a['name'] for a in seen if a['user_id'] == owner.id]
+    assert mine == ['pending0', 'pending1', 'pending2']
+    assert len({a['id'] for a in seen}) == len(seen)
+
+
+def test_bulk_ampersound_review(client, app, create_user, create_ampersound, admin_user_auth_data):
+    storage = app.config['STORAGE']
+    owner = create_user(username='BulkOwner', email='bulkowner@example.com')
+    other = create_user(username='BulkOther', email='bulkother@example.com')
+    sounds = []
+    for i in range(3):
+        key = f'ampersounds/bulk/{owner.id}_{i}.mp3'
+        storage.put(key, b'audio', 'audio/mpeg')
+        sounds.append(create_ampersound(user_id=owner.id, name=f'bulk{i}', file_path=key))
+    others = create_ampersound(user_id=other.id, name='bulkother', file_path='ampersounds/bulk/other.mp3')
+
+    approved = client.post('/api/v1/admin/ampersounds/bulk-action', json={'action': 'approve', 'ids': [sounds[0].id]})
+    assert approved.get_json()['ids'] == [sounds[0].id]
+
+    # Filter by uploader: the already approved one is skipped, the rest are rejected and their files queued for deletion
+    rejected = client.post('/api/v1/admin/ampersounds/bulk-action', json={'action': 'reject', 'user_id': owner.id})
+    assert rejected.status_code == 200
+    assert sorted(rejected.get_json()['ids']) == sorted([sounds[1].id, sounds[2].id])
+    for sound in sounds + [others]:
+        db.session.refresh(sound)
+    assert [s.status for s in sounds] == [AmpersoundStatus.APPROVED, AmpersoundStatus.REJECTED, AmpersoundStatus.REJECTED]
+    assert others.status == AmpersoundStatus.PENDING_APPROVAL
+    assert storage.head(sounds[0].file_path) is not None
+    assert storage.head(sounds[1].file_path) is None and storage.head(sounds[2].file_path) is None
+
+    assert client.post('/api/v1/admin/ampersounds/bulk-action', json={'action': 'approve'}).status_code == 400
+    assert client.post('/api/v1/admin/ampersounds/bulk-action', json={'action': 'approve', 'before': 'soon'}).status_code == 400
+
+
+def test_single_review_of_an_already_reviewed_ampersound_conflicts(client, create_user, create_ampersound, admin_user_auth_data, monkeypatch):
+    import resources.admin
+    owner = create_user(username='RaceOwner', email='raceowner@example.com')
+    sound = create_ampersound(user_id=owner.id, name='racesound', file_path='ampersounds/race/racesound.mp3')
+
+    real_review = resources.admin.review_pending_ampersounds
+    def review_after_another_admin(status, **kwargs):
+        # Another admin approves it between the status check and the UPDATE
+        db.session.execute(update(Ampersound).where(Ampersound.id == sound.id).values(status=AmpersoundStatus.APPROVED))
+        return real_review(status, **kwargs)
+    monkeypatch.setattr(resources.admin, 'review_pending_ampersounds', review_after_another_admin)
+
+    response = client.put(f'/api/v1/admin/ampersounds/{sound.id}/action', json={'action': 'reject'})
+    assert response.status_code == 409
+    db.session.refresh(sound)
+    assert sound.status == AmpersoundStatus.APPROVED
+
+
+def test_rejected_ampersounds_are_not_served_to_their_owner(client, create_ampersound, regular_user_auth_data):
+    owner = regular_user_auth_data['user']
+    kept = create_ampersound(user_id=owner.id, name='keptsound', file_path='ampersounds/mine/kept.mp3')
+    rejected = create_ampersound(user_id=owner.id, name='rejectedsound', file_path='ampersounds/mine/rejected.mp3')
+    review_pending_ampersounds(AmpersoundStatus.REJECTED, ids=[rejected.id])
+
+    mine = client.get('/api/v1/ampersounds/my').get_json()
+    assert [a['id'] for a in mine] == [kept.id]
+    assert client.get(f'/api/v1/ampersounds/{rejected.id}').status_code == 404
@@ -0,0 +1,112 @@
+import uuid
+
+import pytest
+
+import events
+from extensions import db
+from models import User, Post, Comment, PostPrivacy
+from notifications import notify_new_comment
+
+
+def test_broker_delivers_to_each_subscriber_until_unsubscribed():
+    broker = events.EventBroker(count_ttl=60, max_queue=2)
+    first, second = broker.subscribe(1), broker.subscribe(1)
+    broker.publish(1, 'unread_count', {'unread_count': 3})
+    broker.publish(2, 'unread_count', {'unread_count': 9}) # Nobody listening
+
+    assert first.get_nowait() == ('unread_count', {'unread_count': 3})
+    assert second.get_nowait() == ('unread_count', {'unread_count': 3})
+    assert broker.subscribed([1, 2]) == [1]
+
+    broker.unsubscribe(1, first)
+    broker.unsubscribe(1, second)
+    assert broker.subscribed([1]) == []
+
+
+def test_broker_drops_events_for_stalled_subscribers():
+    broker = events.EventBroker(count_ttl=60, max_queue=1)
+    stalled = broker.subscribe(1)
+    broker.publish(1, 'notification', {'post_id': 1})
+    broker.publish(1, 'notification', {'post_id': 2}) # Queue full: dropped, publisher not blocked
+    assert stalled.get_nowait() == ('notification', {'post_id': 1})
+    assert stalled.empty()
+
+
+def test_broker_caps_open_streams():
+    broker = events.EventBroker(count_ttl=60, max_streams=2)
+    first, second = broker.subscribe(1), broker.subscribe(2)
+    assert broker.subscribe(3) is None
+    broker.unsubscribe(1, first)
+    broker.unsubscribe(1, first) # Idempotent: the slot is only given back once
+    third = broker.subscribe(3)
+    assert third is not None
+    assert broker.subscribe(4) is None
+
+
+@pytest.fixture
+def reader(client, app):
+    """Logs the client in as a new user who owns a post; returns (user id, post id, commenter id)."""
+    username = f"stream_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+    with app.app_context():
+        user_id = User.query.filter_by(username=username).one().id
+        commenter = User(username=f"c_{username}", email=f"c_{username}@example.com", password_hash='x')
+        post = Post(content='mine', user_id=user_id, privacy=PostPrivacy.PUBLIC)
+        db.session.add_all([commenter, post])
+        db.session.commit()
+        return user_id, post.id, commenter.id
+
+
+def _comment_on(app, post_id, commenter_id):
+    with app.app_context():
+        comment = Comment(content='hello', user_id=commenter_id, post_id=post_id)
+        db.session.add(comment)
+        db.session.commit()
+        notify_new_comment(comment, db.session.get(Post, post_id))
+
+
+def test_stream_sends_initial_unread_count(client, app, reader, monkeypatch):
+    _, post_id, commenter_id = reader
+    _comment_on(app, post_id, commenter_id)
+    monkeypatch.setitem(app.config, 'NOTIFICATION_STREAM_MAX_AGE', 0)
+
+    response = client.get('/api/v1/notifications/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert 'event: unread_count\ndata: {"unread_count": 1}\n\n' in response.get_data(as_text=True)
+
+
+def test_stream_pushes_new_notifications(client, app, reader, monkeypatch):
+    user_id, post_id, commenter_id = reader
+    monkeypatch.setitem(app.config, 'NOTIFICATION_STREAM_MAX_AGE', 0.3)
+    monkeypatch.setitem(app.config, 'NOTIFICATION_STREAM_HEARTBEAT', 0.05)
+
+    response = client.get('/api/v1/notifications/stream', buffered=False)
+    _comment_on(app, post_id, commenter_id) # Published while the stream is subscribed
+    body = response.get_data(as_text=True)
+
+    assert 'data: {"unread_count": 0}' in body
+    assert 'data: {"unread_count": 1}' in body
+    assert 'event: notification' in body
+    assert app.config['EVENT_BROKER'].subscribed([user_id]) == [] # Unsubscribed when the stream ended
+
+
+def test_unread_count_is_served_from_cache_and_refreshed_on_read(client, app, reader):
+    user_id, post_id, commenter_id = reader
+    _comment_on(app, post_id, commenter_id)
+    assert client.get('/api/v1/notifications/unread_count').get_json() == {'unread_count': 1}
+
+    notification_id = client.get('/api/v1/notifications').get_json()['notifications'][0]['id']
+    client.patch(f'/api/v1/notifications/{notification_id}')
+    assert client.get('/api/v1/notifications/unread_count').get_json() == {'unread_count': 0}
+
+
+def test_stream_refused_when_too_many_are_open(client, app, reader, monkeypatch):
+    """Past NOTIFICATION_STREAM_MAX_OPEN the stream answers 503 instead of taking another request thread."""
+    monkeypatch.setattr(app.config['EVENT_BROKER'], 'max_streams', 0)
+    response = client.get('/api/v1/notifications/stream')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app.config['NOTIFICATION_STREAM_RETRY_AFTER'])
+    assert response.get_data(as_text=True).startswith('retry: ')
+    assert client.get('/api/v1/notifications/unread_count').status_code == 200 # Polling still works
@@ -0,0 +1,208 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import notifications
+from extensions import db
+from models import User, Post, Comment, Notification, NotificationType, PostPrivacy
+from utils import encode_cursor
+
+
+@pytest.fixture
+def thread(app):
+    """A post by `author` with comments from `a` (twice) and `b`. Returns ids."""
+    with app.app_context():
+        suffix = uuid.uuid4().hex[:8]
+        users = {}
+        for name in ('author', 'a', 'b', 'newcomer'):
+            user = User(username=f"{name}_{suffix}", email=f"{name}_{suffix}@example.com", password_hash='x')
+            db.session.add(user)
+            users[name] = user
+        db.session.flush()
+        post = Post(content='thread', user_id=users['author'].id, privacy=PostPrivacy.PUBLIC)
+        db.session.add(post)
+        db.session.flush()
+        for name in ('a', 'b', 'a'):
+            db.session.add(Comment(content='hi', user_id=users[name].id, post_id=post.id))
+        db.session.commit()
+        ids = {name: user.id for name, user in users.items()}
+        ids['post'] = post.id
+        return ids
+
+
+def _comment(ids, commenter):
+    comment = Comment(content='new', user_id=ids[commenter], post_id=ids['post'])
+    db.session.add(comment)
+    db.session.commit()
+    return comment
+
+
+def _recipients(comment_id):
+    return sorted(n.user_id for n in Notification.query.filter_by(comment_id=comment_id))
+
+
+def test_fan_out_notifies_each_participant_once(app, thread):
+    with app.app_context():
+        comment = _comment(thread, 'newcomer')
+        notifications.notify_new_comment(comment, db.session.get(Post, thread['post']))
+
+        assert _recipients(comment.id) == sorted([thread['author'], thread['a'], thread['b']])
+        notification = Notification.query.filter_by(comment_id=comment.id, user_id=thread['a']).one()
+        assert notification.actor_id == thread['newcomer']
+        assert notification.notification_type == NotificationType.COMMENT
+        assert notification.is_read is False
+
+
+def test_commenter_is_never_notified(app, thread):
+    with app.app_context():
+        by_author = _comment(thread, 'author')
+        notifications.notify_new_comment(by_author, db.session.get(Post, thread['post']))
+        assert _recipients(by_author.id) == sorted([thread['a'], thread['b']])
+
+        by_a = _comment(thread, 'a')
+        notifications.notify_new_comment(by_a, db.session.get(Post, thread['post']))
+        assert _recipients(by_a.id) == sorted([thread['author'], thread['b']])
+
+
+def test_large_threads_fan_out_in_background(app, thread, monkeypatch):
+    submitted = []
+    monkeypatch.setitem(app.config, 'NOTIFICATION_FANOUT_INLINE_LIMIT', 2)
+    monkeypatch.setattr(notifications, 'submit_task', lambda fn, *args: submitted.append((fn, args)))
+    with app.app_context():
+        comment = _comment(thread, 'newcomer')
+        notifications.notify_new_comment(comment, db.session.get(Post, thread['post']))
+
+        assert _recipients(comment.id) == [] # Nothing inserted inline
+        fn, args = submitted[0]
+        assert fn is notifications.fan_out_comment_notifications
+        assert fn(*args) == 3
+        assert _recipients(comment.id) == sorted([thread['author'], thread['a'], thread['b']])
+
+
+def test_comment_endpoint_creates_notifications(client, app, thread):
+    username = f"endpoint_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+
+    response = client.post(f"/api/v1/posts/{thread['post']}/comments", json={'content': 'joining in'})
+    assert response.status_code == 201
+    with app.app_context():
+        assert _recipients(response.get_json()['id']) == sorted([thread['author'], thread['a'], thread['b']])
+
+
+def _notify(ids, commenter):
+    comment = _comment(ids, commenter)
+    notifications.notify_new_comment(comment, db.session.get(Post, ids['post']))
+    return comment
+
+
+def test_unread_notifications_coalesce_per_post(app, thread):
+    with app.app_context():
+        first = _notify(thread, 'a')
+        latest = _notify(thread, 'b')
+
+        rows = Notification.query.filter_by(user_id=thread['author'], post_id=thread['post']).all()
+        assert len(rows) == 1
+        assert rows[0].comment_id == latest.id
+        assert rows[0].first_comment_id == first.id
+        assert rows[0].actor_id == thread['b']
+
+        rows[0].is_read = True
+        db.session.commit()
+        _notify(thread, 'newcomer')
+        assert Notification.query.filter_by(user_id=thread['author'], post_id=thread['post']).count() == 2
+
+
+def _login(client):
+    username = f"reader_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+    return User.query.filter_by(username=username).one().id
+
+
+def test_list_reports_actor_count_and_latest_actors(client, app, thread):
+    reader_id = _login(client)
+    with app.app_context():
+        post = Post(content='mine', user_id=reader_id, privacy=PostPrivacy.PUBLIC)
+        db.session.add(post)
+        db.session.commit()
+        ids = dict(thread, post=post.id)
+        for commenter in ('a', 'b', 'a', 'newcomer', 'author'):
+            _notify(ids, commenter)
+
+    data = client.get('/api/v1/notifications?unread=true').get_json()
+    assert len(data['notifications']) == 1
+    entry = data['notifications'][0]
+    assert entry['actor_count'] == 4
+    assert [actor['id'] for actor in entry['actors']] == [thread['author'], thread['newcomer'], thread['a']]
+    assert entry['actor']['id'] == thread['author']
+    assert data['has_more'] is False and data['next_cursor'] is None
+
+
+def test_list_paginates_with_cursor(client, app, thread):
+    reader_id = _login(client)
+    with app.app_context():
+        for _ in range(3):
+            post = Post(content='mine', user_id=reader_id, privacy=PostPrivacy.PUBLIC)
+            db.session.add(post)
+            db.session.commit()
+            _notify(dict(thread, post=post.id), 'a')
+
+    first = client.get('/api/v1/notifications?limit=2').get_json()
+    assert len(first['notifications']) == 2 and first['has_more'] is True
+    second = client.get(f"/api/v1/notifications?limit=2&cursor={first['next_cursor']}").get_json()
+    assert len(second['notifications']) == 1 and second['has_more'] is False
+    assert first['latest_cursor'] is not None
+    assert second['latest_cursor'] is None # Later pages do not start at the newest notification
+    seen = [n['id'] for n in first['notifications'] + second['notifications']]
+    assert len(set(seen)) == 3
+    assert seen == sorted(seen, reverse=True)
+
+    assert client.get('/api/v1/notifications?cursor=garbage').status_code == 400
+
+
+def test_mark_read_up_to_cursor_keeps_newer_notifications_unread(client, app, thread):
+    reader_id = _login(client)
+    with app.app_context():
+        for _ in range(3):
+            post = Post(content='mine', user_id=reader_id, privacy=PostPrivacy.PUBLIC)
+            db.session.add(post)
+            db.session.commit()
+            _notify(dict(thread, post=post.id), 'a')
+
+    page = client.get('/api/v1/notifications?limit=2').get_json()
+    shown = page['notifications'][1]['id'] # Mark up to the older of the two shown
+    with app.app_context():
+        older = db.session.get(Notification, shown)
+        up_to = encode_cursor(older.timestamp, older.id)
+
+    response = client.post('/api/v1/notifications/read', json={'up_to': up_to})
+    assert response.get_json() == {'marked_read': 2}
+    unread = client.get('/api/v1/notifications?unread=true').get_json()['notifications']
+    assert [n['id'] for n in unread] == [page['notifications'][0]['id']]
+
+    assert client.post('/api/v1/notifications/read', json={}).get_json() == {'marked_read': 1}
+    assert client.get('/api/v1/notifications/unread_count').get_json() == {'unread_count': 0}
+    assert client.post('/api/v1/notifications/read', json={'up_to': 'garbage'}).status_code == 400
+
+
+def test_prune_deletes_only_old_read_notifications(app, thread):
+    with app.app_context():
+        old = datetime.now(timezone.utc) - timedelta(days=100)
+        comment = _comment(thread, 'a')
+        rows = [
+            Notification(user_id=thread['author'], actor_id=thread['a'], post_id=thread['post'], comment_id=comment.id,
+                         timestamp=old, is_read=True)
+            for _ in range(5)
+        ]
+        kept_unread = Notification(user_id=thread['b'], actor_id=thread['a'], post_id=thread['post'], comment_id=comment.id,
+                                   timestamp=old, is_read=False)
+        recent_read = Notification(user_id=thread['newcomer'], actor_id=thread['a'], post_id=thread['post'], comment_id=comment.id,
+                                   is_read=True)
+        db.session.add_all(rows + [kept_unread, recent_read])
+        db.session.commit()
+
+        assert notifications.prune_read_notifications(older_than_days=90, batch_size=2) == 5
+        remaining = {n.id for n in Notification.query.filter_by(comment_id=comment.id)}
+        assert remaining == {kept_unread.id, recent_read.id}
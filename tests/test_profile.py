@@ -0,0 +1,92 @@
+import uuid
+
+from extensions import db
+from models import User, Post, PostPrivacy, UserInterest
+
+
+def _register(client, prefix):
+    username = f"{prefix}_{uuid.uuid4().hex[:8]}"
+    response = client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    return username, response.get_json()['user_id']
+
+
+def _login(client, username):
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+
+
+def test_profile_posts_are_paginated_and_respect_privacy(client, app):
+    owner, owner_id = _register(client, 'owner')
+    viewer, _ = _register(client, 'viewer')
+    with app.app_context():
+        for i in range(5):
+            privacy = PostPrivacy.FRIENDS if i == 2 else PostPrivacy.PUBLIC
+            db.session.add(Post(content=f'post {i}', user_id=owner_id, privacy=privacy))
+        db.session.commit()
+
+    _login(client, viewer)
+    first = client.get(f'/api/v1/profiles/{owner}/posts?limit=2').get_json()
+    assert [p['content'] for p in first['posts']] == ['post 4', 'post 3']
+    assert first['has_more'] is True
+    second = client.get(f"/api/v1/profiles/{owner}/posts?limit=2&cursor={first['next_cursor']}").get_json()
+    assert [p['content'] for p in second['posts']] == ['post 1', 'post 0'] # Friends-only post 2 is hidden
+    assert second['has_more'] is False
+    assert second['posts'][0]['author']['username'] == owner
+
+    _login(client, owner)
+    own = client.get(f'/api/v1/profiles/{owner}/posts').get_json()
+    assert len(own['posts']) == 5
+    assert client.get(f'/api/v1/profiles/{owner}/posts?cursor=bad').status_code == 400
+
+
+def test_profile_header_etag_and_invalidation(client, app):
+    owner, owner_id = _register(client, 'header')
+    _login(client, owner)
+
+    first = client.get(f'/api/v1/profiles/{owner}')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.get_json()['interests'] == []
+
+    cached = client.get(f'/api/v1/profiles/{owner}', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    with app.app_context():
+        db.session.add(UserInterest(user_id=owner_id, category='cats', score=1.0))
+        db.session.commit()
+
+    changed = client.get(f'/api/v1/profiles/{owner}', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['interests'] == [{'category': 'cats', 'score': 1.0}]
+
+
+def test_my_profile_returns_header_without_posts(client):
+    owner, _ = _register(client, 'me')
+    _login(client, owner)
+    data = client.get('/api/v1/profiles/me').get_json()
+    assert data['user']['username'] == owner
+    assert data['friendship_status'] == 'SELF'
+    assert 'posts' not in data
+
+
+def test_profile_posts_sparse_and_compact(client, app):
+    owner, owner_id = _register(client, 'sparse')
+    with app.app_context():
+        for i in range(2):
+            db.session.add(Post(content=f'post {i}', user_id=owner_id, privacy=PostPrivacy.PUBLIC,
+                                classification_scores={'art': 0.9}))
+        db.session.commit()
+    _login(client, owner)
+    url = f'/api/v1/profiles/{owner}/posts'
+
+    full = client.get(url)
+    compact = client.get(f'{url}?compact=true')
+    body = compact.get_json()
+    assert body['users'] == {str(owner_id): full.get_json()['posts'][0]['author']}
+    assert all(p['author_id'] == owner_id and 'classification_scores' not in p for p in body['posts'])
+    assert compact.headers['ETag'] != full.headers['ETag']
+
+    sparse = client.get(f'{url}?fields=content').get_json()
+    assert sparse['posts'][0] == {'id': sparse['posts'][0]['id'], 'content': 'post 1'}
+    assert client.get(f'{url}?fields=secret').status_code == 400
@@ -0,0 +1,114 @@
+import multiprocessing
+import time
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager, UserMixin, login_user
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from rate_limiting import SQLiteStorage, rate_limit_key
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return storage_from_string(f"sqlite:///{tmp_path / 'ratelimit.db'}")
+
+
+def test_storage_is_registered_for_sqlite_uris(storage):
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.check()
+
+
+def test_fixed_window_counts_and_expires(storage):
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("3 per second")
+
+    assert [limiter.hit(limit, 'client') for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(limit, 'other-client') # Keys are independent
+    assert storage.get_expiry(limit.key_for('client')) > time.time()
+
+    time.sleep(1.1)
+    assert storage.get(limit.key_for('client')) == 0
+    assert limiter.hit(limit, 'client')
+
+
+def test_clear_and_reset(storage):
+    storage.incr('a', 60)
+    storage.incr('b', 60, amount=2)
+    storage.clear('a')
+    assert storage.get('a') == 0
+    assert storage.get('b') == 2
+    assert storage.reset() == 1
+    assert storage.get('b') == 0
+
+
+def _hammer(path, hits):
+    storage = storage_from_string(f"sqlite:///{path}")
+    for _ in range(hits):
+        storage.incr('shared', 60)
+
+
+def test_counters_are_shared_between_processes(tmp_path):
+    """Workers (like gunicorn's) see one counter instead of one each, and no increments are lost."""
+    path = tmp_path / 'ratelimit.db'
+    storage_from_string(f"sqlite:///{path}") # Create the schema before forking
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_hammer, args=(str(path), 200)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert storage_from_string(f"sqlite:///{path}").get('shared') == 800
+
+
+def test_key_is_per_user_when_logged_in():
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    login_manager = LoginManager(app)
+
+    class FakeUser(UserMixin):
+        id = 42
+
+    login_manager.user_loader(lambda user_id: FakeUser())
+
+    with app.test_request_context(environ_base={'REMOTE_ADDR': '203.0.113.7'}):
+        assert rate_limit_key() == '203.0.113.7'
+        login_user(FakeUser())
+        assert rate_limit_key() == 'user:42'
+
+
+def test_login_is_limited_per_client_behind_the_proxy(tmp_path):
+    """Behind the router each client gets its own login bucket, keyed by X-Forwarded-For."""
+    from app import create_app
+    from extensions import db, limiter
+    # The limiter is a module-level singleton: give the session app its (disabled) state back afterwards
+    saved_state = dict(vars(limiter))
+    try:
+        _check_login_limit_per_client(create_app, db, tmp_path)
+    finally:
+        vars(limiter).clear()
+        vars(limiter).update(saved_state)
+
+
+def _check_login_limit_per_client(create_app, db, tmp_path):
+    app = create_app(config_name='testing', overrides={
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'LOCAL_STORAGE_ROOT': str(tmp_path / 'storage'),
+        'REMIX_SOURCE_CACHE_DIR': str(tmp_path / 'remix_cache'),
+        'RATELIMIT_ENABLED': True,
+        'LOGIN_RATE_LIMIT': '3 per minute',
+    })
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    def login(ip):
+        return client.post('/api/v1/login', json={'identifier': 'nobody', 'password': 'x'},
+                           headers={'X-Forwarded-For': ip}, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code
+
+    assert [login('198.51.100.1') for _ in range(4)] == [401, 401, 401, 429]
+    assert login('198.51.100.2') == 401 # Another client behind the same router is unaffected
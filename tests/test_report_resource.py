@@ -453,6 +453,42 @@ def test_admin_report_on_already_restricted_content(
 
 # Removed previous placeholders as these cover the admin scenarios more specifically
 
-# Consider edge cases:
-# - What if reported user has no posts/comments/ampersounds? (should not error)
-# - Admin reporting content that is ALREADY friends-only (should remain friends-only, report still RESOLVED_AUTO) 
\ No newline at end of file
+
+def test_admin_restore_reverts_only_restricted_content(
+    client, create_user, create_post, create_comment, create_ampersound, admin_user_auth_data
+):
+    """Restoring makes public again what the admin report restricted, not what the user chose."""
+    reported_user = create_user(username='UserToRestore', email='restore@example.com')
+    public_post = create_post(user_id=reported_user.id, content="Public", privacy=PostPrivacy.PUBLIC)
+    friends_post = create_post(user_id=reported_user.id, content="Chosen friends-only", privacy=PostPrivacy.FRIENDS)
+    parent_owner = create_user(username='RestoreParentOwner', email='restoreparent@example.com')
+    parent_post = create_post(user_id=parent_owner.id, content="Parent")
+    comment = create_comment(user_id=reported_user.id, post_id=parent_post.id, content="c", visibility=CommentVisibility.PUBLIC)
+    amp = create_ampersound(user_id=reported_user.id, name='restoreSound', file_path='r.mp3', privacy='public')
+    db.session.commit()
+
+    response = client.post('/api/v1/reports', json={'content_type': 'post', 'content_id': public_post.id})
+    assert response.status_code == 201
+    assert response.get_json()['restricted'] == {'posts': 1, 'comments': 1, 'ampersounds': 1}
+
+    response = client.post(f'/api/v1/admin/users/{reported_user.id}/restore-content')
+    assert response.status_code == 200
+    assert response.get_json()['restored'] == {'posts': 1, 'comments': 1, 'ampersounds': 1}
+
+    for item in (public_post, friends_post, comment, amp):
+        db.session.refresh(item)
+    assert public_post.privacy == PostPrivacy.PUBLIC
+    assert friends_post.privacy == PostPrivacy.FRIENDS
+    assert comment.visibility == CommentVisibility.PUBLIC
+    assert amp.privacy == 'public'
+    assert not public_post.restricted_by_moderation
+
+    # Nothing left to restore
+    again = client.post(f'/api/v1/admin/users/{reported_user.id}/restore-content')
+    assert again.get_json()['restored'] == {'posts': 0, 'comments': 0, 'ampersounds': 0}
+
+
+def test_restore_requires_admin(client, create_user, regular_user_auth_data):
+    target = create_user(username='RestoreTarget', email='restoretarget@example.com')
+    response = client.post(f'/api/v1/admin/users/{target.id}/restore-content')
+    assert response.status_code == 403
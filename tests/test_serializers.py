@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from flask_restful import fields, marshal
+
+import pytest
+
+import serializers
+from serializers import compile_fields, dumps, PageSerializer
+from resources.post import post_fields, post_list_fields
+from resources.feed import feed_response_fields
+from resources.comment import comment_page_fields
+from resources.notification import notification_page_fields
+
+WHEN = datetime(2024, 5, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+
+
+def _author(user_id=1, picture='pic.jpg'):
+    return SimpleNamespace(id=user_id, username=f'user{user_id}', profile_picture=picture,
+                           profile_picture_variants={'thumb': {'webp': 'a.webp'}} if picture else None)
+
+
+def _post(post_id, author=None, **overrides):
+    post = SimpleNamespace(
+        id=post_id, content='hi &bell', rendered_content='hi <span>&bell</span>', image_url=None,
+        image_variants=None, timestamp=WHEN, privacy=SimpleNamespace(name='PUBLIC'),
+        author=author if author is not None else _author(), classification_scores={'art': 0.5},
+        comments_count=3, likes_count=0, is_liked=None,
+    )
+    post.__dict__.update(overrides)
+    return post
+
+
+def _same(field_map, obj):
+    # Same keys, order and values as marshal(), compared through the stdlib encoder
+    expected = json.dumps(marshal(obj, field_map))
+    assert json.dumps(compile_fields(field_map)(obj)) == expected
+    assert json.loads(dumps(compile_fields(field_map)(obj))) == json.loads(expected)
+
+
+def test_post_and_list_fields_match_marshal():
+    _same(post_fields, _post(1))
+    _same(post_fields, _post(2, is_liked=True, image_url='https://x/y.jpg', timestamp=None, author=_author(2, picture=None)))
+    _same(post_list_fields, {'posts': [_post(1), _post(2)], 'page': 1, 'per_page': 20, 'total': 2})
+    _same(post_list_fields, {'posts': [], 'page': 3, 'per_page': 20, 'total': None})
+
+
+def test_feed_comment_and_notification_pages_match_marshal():
+    _same(feed_response_fields, {'posts': [_post(1)], 'page': 1, 'per_page': 10,
+                                 'total_items': 1, 'total_pages': 1, 'message': None})
+
+    comment = SimpleNamespace(id=7, content='nice', rendered_content='nice', timestamp=WHEN, author=_author(), post_id=1)
+    _same(comment_page_fields, {'comments': [comment], 'next_cursor': None, 'has_more': False})
+
+    notification = SimpleNamespace(
+        id=5, notification_type=SimpleNamespace(value='comment'), post_id=1, comment_id=7,
+        timestamp=WHEN, is_read=False, actor=_author(3), actors=[_author(3), _author(4)], actor_count=2,
+    )
+    _same(notification_page_fields, {'notifications': [notification], 'next_cursor': 'abc',
+                                     'has_more': True, 'latest_cursor': 'abc'})
+
+
+def test_field_options_match_marshal():
+    field_map = {
+        'renamed': fields.String(attribute='inner.name'),
+        'missing': fields.Integer(default=4),
+        'nullable': fields.Nested({'id': fields.Integer}, allow_null=True),
+        'filled': fields.Nested({'id': fields.Integer}),
+        'rfc': fields.DateTime(dt_format='rfc822'),
+        'ratio': fields.Float,
+        'url_less': fields.Url,
+    }
+    # fields.Url has no fast path and needs a request; drop it after checking the fallback is compiled
+    compile_fields(field_map)
+    del field_map['url_less']
+    _same(field_map, SimpleNamespace(inner={'name': 'n'}, nullable=None, filled=None, rfc=WHEN, ratio=2))
+
+
+def test_page_serializer_sparse_and_compact():
+    serialize = PageSerializer(post_list_fields)
+    shared = _author(1)
+    page = {'posts': [_post(1, author=shared), _post(2, author=shared), _post(3, author=_author(2))],
+            'page': 1, 'per_page': 3, 'total': 3}
+
+    assert serialize(page) == marshal(page, post_list_fields)
+
+    sparse = serialize(page, serialize.parse_selection('content, likes_count'))
+    assert sparse['total'] == 3
+    assert sparse['posts'][0] == {'id': 1, 'content': 'hi <span>&bell</span>', 'likes_count': 0}
+    assert 'users' not in sparse
+
+    compact = serialize(page, compact=True)
+    assert set(compact['users']) == {1, 2}
+    assert compact['users'][1] == marshal(shared, post_fields['author'].nested)
+    assert [p['author_id'] for p in compact['posts']] == [1, 1, 2]
+    assert 'author' not in compact['posts'][0] and 'classification_scores' not in compact['posts'][0]
+
+    with_scores = serialize(page, serialize.parse_selection('author_id,classification_scores'), compact=True)
+    assert with_scores['posts'][2] == {'id': 3, 'author_id': 2, 'classification_scores': {'art': 0.5}}
+    assert set(with_scores['users']) == {1, 2}
+    assert serialize(page, serialize.parse_selection('content'), compact=True)['users'] == {}
+
+    assert serialize.parse_selection('') is None
+    with pytest.raises(ValueError):
+        serialize.parse_selection('content,password')
+
+
+def test_dumps_without_orjson(monkeypatch):
+    monkeypatch.setattr(serializers, 'orjson', None)
+    assert dumps({'text': 'héllo', 'n': [1, None]}) == '{"text":"héllo","n":[1,null]}\n'.encode()
+
+
+def test_api_responses_are_encoded_by_output_json(client):
+    response = client.get('/api/v1/posts/999999999')
+    assert response.status_code == 404
+    assert response.mimetype == 'application/json'
+    assert response.data.endswith(b'\n')
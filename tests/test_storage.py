@@ -0,0 +1,70 @@
+import io
+
+from storage import S3Storage, LocalStorage, StorageError, S3_DELETE_BATCH_SIZE
+
+
+class RecordingS3Client:
+    """Records delete_objects batches; reports one key per batch as failed."""
+    def __init__(self):
+        self.batches = []
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.batches.append(keys)
+        return {'Deleted': [{'Key': k} for k in keys[1:]], 'Errors': [{'Key': keys[0], 'Code': 'InternalError'}]}
+
+
+def test_s3_delete_many_uses_batches():
+    """Batch delete splits keys into DeleteObjects calls of at most 1000 and returns failures."""
+    client = RecordingS3Client()
+    storage = S3Storage(client, 'bucket')
+    keys = [f"images/{i}.png" for i in range(S3_DELETE_BATCH_SIZE + 5)]
+
+    failed = storage.delete_many(keys)
+
+    assert [len(b) for b in client.batches] == [S3_DELETE_BATCH_SIZE, 5]
+    assert failed == ['images/0.png', f"images/{S3_DELETE_BATCH_SIZE}.png"]
+
+def test_s3_url_prefers_public_domain():
+    storage = S3Storage(None, 'bucket', public_base_url='https://cdn.example.com/', endpoint_url='https://r2.example.com')
+    assert storage.url('images/a.png') == 'https://cdn.example.com/images/a.png'
+    assert S3Storage(None, 'bucket', endpoint_url='https://r2.example.com').url('a.png') == 'https://r2.example.com/bucket/a.png'
+
+def test_local_storage_round_trip(tmp_path):
+    """Put, head, get, delete_many against the local backend; keys cannot escape the root."""
+    storage = LocalStorage(tmp_path, secret_key='k')
+    storage.put('ampersounds/1/hi.m4a', b'abc', 'audio/mp4')
+    storage.put_stream('images/x.bin', io.BytesIO(b'12345'), 'image/webp')
+
+    assert storage.head('ampersounds/1/hi.m4a') == {'size': 3, 'content_type': 'audio/mp4'}
+    assert storage.get('images/x.bin') == b'12345'
+    assert storage.url('images/x.bin') == '/storage/images/x.bin'
+
+    assert storage.delete_many(['ampersounds/1/hi.m4a', 'images/x.bin', 'missing.png']) == []
+    assert storage.head('images/x.bin') is None
+
+    for bad_key in ('../outside.txt', '.meta/images/x.bin.json'):
+        try:
+            storage.put(bad_key, b'x')
+        except StorageError:
+            continue
+        raise AssertionError(f"{bad_key} was accepted")
+
+def test_list_keys(tmp_path):
+    """Local listing skips the metadata directory; S3 listing walks every ListObjectsV2 page."""
+    storage = LocalStorage(tmp_path, secret_key='k')
+    storage.put('images/a.png', b'a', 'image/png')
+    storage.put('images/b/c.png', b'c', 'image/png')
+    storage.put('ampersounds/d.mp3', b'd', 'audio/mpeg')
+    assert sorted(key for key, _ in storage.list_keys('images/')) == ['images/a.png', 'images/b/c.png']
+    assert all(modified.tzinfo is not None for _, modified in storage.list_keys())
+
+    class PagingClient:
+        def get_paginator(self, name):
+            assert name == 'list_objects_v2'
+            return self
+
+        def paginate(self, Bucket, Prefix):
+            return [{'Contents': [{'Key': f'{Prefix}1', 'LastModified': 1}]}, {'Contents': [{'Key': f'{Prefix}2', 'LastModified': 2}]}, {}]
+
+    assert list(S3Storage(PagingClient(), 'bucket').list_keys('images/')) == [('images/1', 1), ('images/2', 2)]
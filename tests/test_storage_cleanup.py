@@ -0,0 +1,136 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from models import db, Post, StorageDeletion, PendingUpload, UploadKind
+from storage_cleanup import queue_storage_deletions, sweep_storage_deletions, find_orphaned_keys, expire_pending_uploads, queue_orphaned_keys
+
+
+def test_deleting_content_removes_stored_files(client, app, create_ampersound, regular_user_auth_data):
+    storage = app.config['STORAGE']
+    user = regular_user_auth_data['user']
+
+    sound_key = f'ampersounds/cleanup/{user.id}.mp3'
+    storage.put(sound_key, b'audio', 'audio/mpeg')
+    sound = create_ampersound(user_id=user.id, name='cleanupsound', file_path=sound_key)
+    assert client.delete(f'/api/v1/ampersounds/{sound.id}').status_code == 200
+    assert storage.head(sound_key) is None
+
+    image_keys = [f'images/cleanup/{user.id}{suffix}' for suffix in ('.png', '_feed.webp', '_feed.jpg')]
+    for key in image_keys:
+        storage.put(key, b'img', 'image/png')
+    post = Post(user_id=user.id, content='with image', image_url=storage.url(image_keys[0]),
+                image_variants={'feed': {'webp': storage.url(image_keys[1]), 'jpeg': storage.url(image_keys[2]), 'width': 10}})
+    db.session.add(post)
+    db.session.commit()
+    assert client.delete(f'/api/v1/posts/{post.id}').status_code == 200
+    assert all(storage.head(key) is None for key in image_keys)
+    assert StorageDeletion.query.filter(StorageDeletion.key.in_([sound_key] + image_keys)).count() == 0
+
+
+def test_sweep_retries_failed_deletions(app, monkeypatch):
+    storage = app.config['STORAGE']
+    keys = [f'images/sweep/{i}.png' for i in range(5)]
+    for key in keys:
+        storage.put(key, b'x')
+    queue_storage_deletions(keys)
+    queue_storage_deletions(keys[:2]) # Already queued keys are ignored
+    db.session.commit()
+
+    real_delete_many = storage.delete_many
+    monkeypatch.setattr(storage, 'delete_many', lambda batch: [key for key in batch if key.endswith('4.png')])
+    assert sweep_storage_deletions(batch_size=2) == (4, 1)
+    stuck = StorageDeletion.query.filter_by(key=keys[4]).one()
+    assert stuck.attempts == 1 and stuck.next_attempt_at > datetime.now(timezone.utc).replace(tzinfo=None)
+    assert sweep_storage_deletions() == (0, 0) # Not due again until its backoff has passed
+
+    monkeypatch.setattr(storage, 'delete_many', real_delete_many)
+    stuck.next_attempt_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+    db.session.commit()
+    assert sweep_storage_deletions(max_attempts=1) == (0, 0) # Gave up after max_attempts
+    assert sweep_storage_deletions() == (1, 0)
+    assert storage.head(keys[4]) is None
+    assert StorageDeletion.query.filter(StorageDeletion.key.in_(keys)).count() == 0
+
+
+def test_sweep_skips_keys_written_again(app, create_ampersound, create_user):
+    """A key re-used by a new row after being queued is dropped from the outbox, not deleted."""
+    storage = app.config['STORAGE']
+    owner = create_user(username='ReuseOwner', email='reuseowner@example.com')
+    key = 'ampersounds/reuse/foo.mp3'
+    queue_storage_deletions([key])
+    db.session.commit()
+    storage.put(key, b'new recording')
+    create_ampersound(user_id=owner.id, name='foo', file_path=key)
+
+    assert sweep_storage_deletions() == (0, 0)
+    assert storage.get(key) == b'new recording'
+    assert StorageDeletion.query.filter_by(key=key).count() == 0
+
+
+def test_expire_pending_uploads(app, create_user):
+    """Uploads never confirmed within UPLOAD_CONFIRM_WINDOW lose their row and their object."""
+    storage = app.config['STORAGE']
+    owner = create_user(username='UnconfirmedOwner', email='unconfirmedowner@example.com')
+    issued = {
+        'stale': datetime.now(timezone.utc) - timedelta(seconds=app.config['UPLOAD_CONFIRM_WINDOW'] + 60),
+        'never_uploaded': datetime.now(timezone.utc) - timedelta(days=3),
+        'fresh': datetime.now(timezone.utc),
+    }
+    for name, timestamp in issued.items():
+        db.session.add(PendingUpload(user_id=owner.id, kind=UploadKind.POST_IMAGE, s3_key=f'images/pending/{name}.png',
+                                     content_type='image/png', size=3, timestamp=timestamp))
+    db.session.commit()
+    for name in ('stale', 'fresh'):
+        storage.put(f'images/pending/{name}.png', b'img')
+
+    assert expire_pending_uploads(batch_size=1) == 2
+    assert sweep_storage_deletions() == (2, 0)
+    assert [upload.s3_key for upload in PendingUpload.query.filter_by(user_id=owner.id)] == ['images/pending/fresh.png']
+    assert storage.head('images/pending/stale.png') is None
+    assert storage.get('images/pending/fresh.png') == b'img'
+
+
+def test_ampersound_keys_are_unique_per_upload(app):
+    from resources.ampersound import ampersound_key
+    first, second = ampersound_key(1, 'foo', '.m4a'), ampersound_key(1, 'foo', '.m4a')
+    assert first != second
+    assert first.startswith('ampersounds/1/foo-') and first.endswith('.m4a')
+
+
+def test_find_orphaned_keys(app, create_ampersound, create_user):
+    storage = app.config['STORAGE']
+    owner = create_user(username='OrphanOwner', email='orphanowner@example.com')
+    for name in ('kept', 'orphan', 'fresh'):
+        storage.put(f'ampersounds/orphans/{name}.mp3', b'audio')
+    create_ampersound(user_id=owner.id, name='kept', file_path='ampersounds/orphans/kept.mp3')
+    old = time.time() - 2 * 86400
+    for name in ('kept', 'orphan'):
+        os.utime(os.path.join(storage.root, 'ampersounds', 'orphans', f'{name}.mp3'), (old, old))
+
+    assert find_orphaned_keys(prefixes=('ampersounds/orphans/',)) == ['ampersounds/orphans/orphan.mp3']
+    assert sorted(find_orphaned_keys(prefixes=('ampersounds/orphans/',), grace=timedelta(0))) == [
+        'ampersounds/orphans/fresh.mp3', 'ampersounds/orphans/orphan.mp3',
+    ]
+
+
+def test_orphan_scan_reclaims_expired_pending_uploads(app, create_user):
+    """Objects of uploads past the confirm window count as orphans; uploads still confirmable do not."""
+    storage = app.config['STORAGE']
+    owner = create_user(username='AbandonOwner', email='abandonowner@example.com')
+    old = datetime.now(timezone.utc) - timedelta(days=2)
+    for name, timestamp in (('abandoned', old), ('in_flight', datetime.now(timezone.utc))):
+        key = f'images/abandoned/{name}.png'
+        db.session.add(PendingUpload(user_id=owner.id, kind=UploadKind.POST_IMAGE, s3_key=key,
+                                     content_type='image/png', size=3, timestamp=timestamp))
+        storage.put(key, b'img')
+        os.utime(os.path.join(storage.root, 'images', 'abandoned', f'{name}.png'), (old.timestamp(), old.timestamp()))
+    db.session.commit()
+
+    orphans = find_orphaned_keys(prefixes=('images/abandoned/',))
+    assert orphans == ['images/abandoned/abandoned.png']
+    assert queue_orphaned_keys(orphans) == 1
+    db.session.commit()
+    assert sweep_storage_deletions() == (1, 0)
+    assert storage.head('images/abandoned/abandoned.png') is None
+    assert [upload.s3_key for upload in PendingUpload.query.filter_by(user_id=owner.id)] == ['images/abandoned/in_flight.png']
@@ -0,0 +1,148 @@
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from extensions import db
+from models import User, Post, PendingUpload
+from storage import S3Storage
+
+
+class FakeS3Client:
+    """Minimal in-memory stand-in for the boto3 S3 client calls used by the upload flow."""
+    def __init__(self):
+        self.objects = {}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://storage.example.com/{Params['Bucket']}/{Params['Key']}?signed=1"
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = (Body, ContentType)
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        body, content_type = self.objects[Key]
+        return {'ContentLength': len(body), 'ContentType': content_type}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        self.put_object(Bucket, Key, Fileobj.read(), (ExtraArgs or {}).get('ContentType'))
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+@pytest.fixture
+def fake_s3(app, monkeypatch):
+    fake = FakeS3Client()
+    monkeypatch.setitem(app.config, 'STORAGE', S3Storage(fake, 'test-bucket', public_base_url='https://images.example.com'))
+    return fake
+
+def _login_new_user(client):
+    username = f"uploader_{uuid.uuid4().hex[:8]}"
+    client.post('/api/v1/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'p'})
+    client.post('/api/v1/login', json={'identifier': username, 'password': 'p'})
+    return username
+
+def test_upload_request_requires_login(client):
+    """Requesting an upload URL is only available to authenticated users."""
+    client.delete('/api/v1/login')
+    response = client.post('/api/v1/uploads', json={'kind': 'post_image', 'content_type': 'image/png', 'size': 10})
+    assert response.status_code == 401
+
+def test_upload_request_rejects_oversized_file(client, fake_s3):
+    """Declared size above the per-kind limit is refused before any URL is issued."""
+    _login_new_user(client)
+    response = client.post('/api/v1/uploads', json={'kind': 'post_image', 'content_type': 'image/png', 'size': 4 * 1024 * 1024})
+    assert response.status_code == 413
+
+def test_upload_request_rejects_wrong_content_type(client, fake_s3):
+    """An audio upload cannot be declared with an image content type."""
+    _login_new_user(client)
+    response = client.post('/api/v1/uploads', json={'kind': 'ampersound', 'content_type': 'image/png', 'size': 100})
+    assert response.status_code == 400
+
+def test_confirm_before_upload_fails(client, fake_s3):
+    """Confirming without the object in storage returns 400 and keeps the pending upload."""
+    _login_new_user(client)
+    issued = client.post('/api/v1/uploads', json={'kind': 'profile_picture', 'content_type': 'image/png', 'size': 5}).get_json()
+    response = client.post(f"/api/v1/uploads/{issued['upload_id']}/confirm")
+    assert response.status_code == 400
+
+def test_expired_confirm_discards_the_upload(client, app):
+    """Confirming after UPLOAD_CONFIRM_WINDOW returns 410 and deletes the pending row and the object."""
+    _login_new_user(client)
+    storage = app.config['STORAGE']
+    data = client.post('/api/v1/uploads', json={'kind': 'profile_picture', 'content_type': 'image/png', 'size': 5}).get_json()
+    assert client.put(data['upload_url'], data=b'\x89PNG!', headers=data['headers']).status_code == 200
+    with app.app_context():
+        pending = db.session.get(PendingUpload, data['upload_id'])
+        key = pending.s3_key
+        pending.timestamp = datetime.now(timezone.utc) - timedelta(seconds=app.config['UPLOAD_CONFIRM_WINDOW'] + 60)
+        db.session.commit()
+
+    response = client.post(f"/api/v1/uploads/{data['upload_id']}/confirm")
+    assert response.status_code == 410
+    with app.app_context():
+        assert db.session.get(PendingUpload, data['upload_id']) is None
+    assert storage.head(key) is None
+
+def test_profile_picture_direct_upload_flow(client, fake_s3, app):
+    """Request URL, upload to storage, confirm -> profile picture updated."""
+    username = _login_new_user(client)
+    issued = client.post('/api/v1/uploads', json={'kind': 'profile_picture', 'content_type': 'image/png', 'size': 5, 'filename': 'me.png'})
+    assert issued.status_code == 201
+    data = issued.get_json()
+    assert data['method'] == 'PUT'
+    assert data['headers'] == {'Content-Type': 'image/png'}
+
+    with app.app_context():
+        key = db.session.get(PendingUpload, data['upload_id']).s3_key
+    assert key.startswith('profile_pictures/') and key.endswith('.png')
+    fake_s3.put_object(Bucket='test-bucket', Key=key, Body=b'\x89PNG!', ContentType='image/png')
+
+    response = client.post(f"/api/v1/uploads/{data['upload_id']}/confirm")
+    assert response.status_code == 200
+    assert response.get_json()['profile_picture'] == f"https://images.example.com/{key}"
+    with app.app_context():
+        assert User.query.filter_by(username=username).first().profile_picture == f"https://images.example.com/{key}"
+        assert db.session.get(PendingUpload, data['upload_id']) is None
+
+def test_post_image_direct_upload_flow(client, fake_s3, app):
+    """Confirming a post image upload creates the post with the stored image URL."""
+    _login_new_user(client)
+    data = client.post('/api/v1/uploads', json={'kind': 'post_image', 'content_type': 'image/jpeg', 'size': 4}).get_json()
+    with app.app_context():
+        key = db.session.get(PendingUpload, data['upload_id']).s3_key
+    fake_s3.put_object(Bucket='test-bucket', Key=key, Body=b'jpeg', ContentType='image/jpeg')
+
+    response = client.post(f"/api/v1/uploads/{data['upload_id']}/confirm", json={'content': 'Direct upload', 'privacy': 'PUBLIC'})
+    assert response.status_code == 201
+    post_data = response.get_json()['post']
+    assert post_data['content'] == 'Direct upload'
+    assert post_data['image_url'] == f"https://images.example.com/{key}"
+    with app.app_context():
+        assert db.session.get(Post, post_data['id']) is not None
+
+def test_local_storage_direct_upload_flow(client, app):
+    """Without S3 credentials the local backend accepts the presigned PUT and serves the file."""
+    assert app.config['STORAGE'].name == 'local'
+    _login_new_user(client)
+    data = client.post('/api/v1/uploads', json={'kind': 'profile_picture', 'content_type': 'image/png', 'size': 5}).get_json()
+
+    rejected = client.put(data['upload_url'].replace('token=', 'token=x'), data=b'\x89PNG!', headers=data['headers'])
+    assert rejected.status_code == 403
+    put_response = client.put(data['upload_url'], data=b'\x89PNG!', headers=data['headers'])
+    assert put_response.status_code == 200
+
+    response = client.post(f"/api/v1/uploads/{data['upload_id']}/confirm")
+    assert response.status_code == 200
+    served = client.get(response.get_json()['profile_picture'])
+    assert served.status_code == 200
+    assert served.data == b'\x89PNG!'
+    assert served.mimetype == 'image/png'
@@ -0,0 +1,69 @@
+import uuid
+
+import pytest
+
+from extensions import db
+from models import User, UserType
+from user_cache import SessionUser, UserCache, load_session_user
+
+
+@pytest.fixture
+def cached_user(app):
+    with app.app_context():
+        suffix = uuid.uuid4().hex[:8]
+        user = User(username=f"cached_{suffix}", email=f"cached_{suffix}@example.com", password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def test_loader_serves_snapshot_without_query(app, cached_user):
+    with app.app_context():
+        first = load_session_user(cached_user)
+        assert isinstance(first, SessionUser)
+    with app.app_context():
+        second = load_session_user(cached_user)
+        assert second._record is None # Served from the cache, no ORM load
+        assert second.username == first.username
+        assert second.get_id() == str(cached_user)
+
+
+def test_committed_change_invalidates_snapshot(app, cached_user):
+    with app.app_context():
+        assert load_session_user(cached_user).user_type == UserType.USER
+    with app.app_context():
+        db.session.get(User, cached_user).user_type = UserType.ADMIN
+        db.session.commit()
+    with app.app_context():
+        assert load_session_user(cached_user).user_type == UserType.ADMIN
+
+
+def test_rolled_back_change_keeps_snapshot(app, cached_user):
+    with app.app_context():
+        load_session_user(cached_user)
+        version = app.config['USER_CACHE'].version(cached_user)
+        db.session.get(User, cached_user).username = 'renamed'
+        db.session.flush()
+        db.session.rollback()
+        assert app.config['USER_CACHE'].version(cached_user) == version
+        assert app.config['USER_CACHE'].get(cached_user) is not None
+
+
+def test_stale_read_is_not_cached():
+    """A loader that read before a concurrent commit must not store its (old) snapshot."""
+    cache = UserCache(ttl=30)
+    version = cache.version(1)
+    cache.invalidate(1) # Commit happened while the loader was reading
+    cache.put(1, {'id': 1}, version)
+    assert cache.get(1) is None
+
+
+def test_snapshot_is_read_only_and_forwards_to_record(app, cached_user):
+    with app.app_context():
+        load_session_user(cached_user)
+    with app.app_context():
+        user = load_session_user(cached_user)
+        with pytest.raises(AttributeError):
+            user.profile_picture = 'elsewhere.png'
+        assert user.get_friend_ids() == set() # ORM method, loads the record
+        assert user.record() is db.session.get(User, cached_user)
@@ -0,0 +1,171 @@
+import threading
+import time
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, User, UserInterest
+
+# Columns copied into the per-request user snapshot. Changing any of them invalidates the cache.
+CACHED_USER_FIELDS = (
+    'id', 'username', 'email', 'profile_picture', 'profile_picture_variants', 'user_type', 'invites_left',
+)
+
+
+class SessionUser(UserMixin):
+    """
+    The logged-in user as returned by the user loader: a read-only snapshot of
+    CACHED_USER_FIELDS, so checks like current_user.id / .user_type need no query.
+    Anything else (friendship methods, relationships) is forwarded to the ORM User,
+    which is loaded once per request on first use. To change the user, call
+    record() and modify the ORM object.
+    """
+
+    def __init__(self, fields, record=None):
+        self.__dict__.update(fields)
+        self.__dict__['_record'] = record
+
+    def get_id(self):
+        return str(self.id)
+
+    def record(self):
+        """The ORM User for this request, loaded on first call."""
+        if self._record is None:
+            self.__dict__['_record'] = db.session.get(User, self.id)
+        return self._record
+
+    def __getattr__(self, name):
+        # Only called for attributes missing from the snapshot
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record(), name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"current_user is a read-only snapshot; set '{name}' on current_user.record() instead.")
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+class UserCache:
+    """
+    Per-process TTL cache of user snapshots, keyed by user id.
+    Every user has a version number that is bumped when a change to their cached
+    fields is committed; a loader only stores its snapshot if the version did not
+    move while it was reading, so a slow read can never cache pre-commit data.
+    Other processes see a change after at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {} # user_id -> (expires_at, fields)
+        self._versions = {} # user_id -> int
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def version(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def put(self, user_id, fields, version):
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {uid: entry for uid, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + self.ttl, fields)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+
+def _snapshot(user):
+    return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+
+def load_session_user(user_id):
+    """Flask-Login user loader: the cached snapshot if fresh, otherwise one query."""
+    cache = current_app.config.get('USER_CACHE')
+    if cache is None:
+        user = db.session.get(User, user_id)
+        return SessionUser(_snapshot(user), record=user) if user else None
+
+    fields = cache.get(user_id)
+    if fields is not None:
+        return SessionUser(fields)
+
+    version = cache.version(user_id)
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    fields = _snapshot(user)
+    cache.put(user_id, fields, version)
+    return SessionUser(fields, record=user)
+
+
+def init_user_cache(app):
+    """
+    Creates the user snapshot cache (app.config['USER_CACHE']) and the profile header
+    cache (app.config['PROFILE_HEADER_CACHE']); a TTL of 0 disables either.
+    """
+    ttl = app.config.get('USER_CACHE_TTL', 30)
+    cache = UserCache(ttl) if ttl > 0 else None
+    app.config['USER_CACHE'] = cache
+    header_ttl = app.config.get('PROFILE_HEADER_CACHE_TTL', 60)
+    app.config['PROFILE_HEADER_CACHE'] = UserCache(header_ttl) if header_ttl > 0 else None
+    return cache
+
+
+# --- Invalidation: any committed change to a cached column, from any code path ---
+# The profile header cache (resources/profile.py) also holds the user's interests.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('user_cache_changed', set())
+    interests_changed = session.info.setdefault('user_interests_changed', set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in CACHED_USER_FIELDS):
+                changed.add(obj.id)
+    for objects in (session.new, session.dirty, session.deleted):
+        for obj in objects:
+            if isinstance(obj, UserInterest):
+                interests_changed.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop('user_cache_changed', None) or set()
+    interests_changed = session.info.pop('user_interests_changed', None) or set()
+    if not (changed or interests_changed) or not has_app_context():
+        return
+    cache = current_app.config.get('USER_CACHE')
+    if cache is not None:
+        for user_id in changed:
+            cache.invalidate(user_id)
+    header_cache = current_app.config.get('PROFILE_HEADER_CACHE')
+    if header_cache is not None:
+        for user_id in changed | interests_changed:
+            header_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('user_cache_changed', None)
+    session.info.pop('user_interests_changed', None)
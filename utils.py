@@ -1,106 +1,140 @@
 import re
 import html # Import the html module for escaping
-from models import User, Ampersound
-from sqlalchemy.orm import joinedload
+import base64
+from datetime import datetime
+from models import db, User, Ampersound
+from sqlalchemy import func, tuple_, and_, or_
 
-# Helper function to generate S3 file URL
-# Moved from app.py and made more generic
+# Helper function to generate the public URL of a stored file
+# Delegates to the configured storage backend (see storage.py)
 def generate_s3_file_url(app_config, s3_key):
     if not s3_key:
         return None
 
-    s3_client = app_config.get('S3_CLIENT') # S3_CLIENT should be in app_config
-    s3_bucket = app_config.get('S3_BUCKET')
-    domain_name_images = app_config.get('DOMAIN_NAME_IMAGES')
-    s3_endpoint_url = app_config.get('S3_ENDPOINT_URL')
-    s3_region = app_config.get('S3_REGION', 'us-east-1') # Default to us-east-1
-
-    file_url = None
-    if s3_client and s3_bucket: # Check if S3 client and bucket are configured
-        try:
-            if domain_name_images:
-                file_url = f"{domain_name_images}/{s3_key}"
-            elif s3_endpoint_url:
-                # For R2 or MinIO like services, the URL is typically endpoint/bucket/key
-                file_url = f"{s3_endpoint_url}/{s3_bucket}/{s3_key}"
-            else: # Assuming AWS S3 default URL structure
-                if s3_region == 'auto':
-                    # 'auto' is specific to Cloudflare R2's SDK configuration,
-                    # not for URL construction. S3_ENDPOINT_URL should be used for R2.
-                    # If this is AWS S3 and region is 'auto', it's a misconfiguration.
-                    print(f"WARN: Cannot construct S3 URL for {s3_key} with 'auto' region and no S3_ENDPOINT_URL. Ensure S3_ENDPOINT_URL is set for non-AWS S3 services or S3_REGION is explicit for AWS S3.")
-                    return None
-                file_url = f"https://{s3_bucket}.s3.{s3_region}.amazonaws.com/{s3_key}"
-        except Exception as e:
-            print(f"ERROR: Error generating S3 URL for key {s3_key}: {e}")
-            return None
-    else:
-        # This case implies S3 is not configured (e.g. S3_CLIENT is None or S3_BUCKET is None)
-        print(f"WARN: S3 client or bucket not configured in app_config. Cannot generate URL for {s3_key}.")
+    storage = app_config.get('STORAGE')
+    if not storage:
+        print(f"WARN: Storage backend not configured in app_config. Cannot generate URL for {s3_key}.")
+        return None
+    try:
+        return storage.url(s3_key)
+    except Exception as e:
+        print(f"ERROR: Error generating storage URL for key {s3_key}: {e}")
         return None
-    return file_url
 
-def format_text_with_ampersounds(text_content, author_username):
-    # author_username is the author of the post/comment containing the text,
-    # used potentially for context later, but not directly for resolving tags now.
-    if not text_content:
-        return text_content
+# --- Keyset (cursor) pagination on (timestamp, id) ---
 
-    # 1. Escape the entire original text_content first to prevent XSS from non-ampersand parts.
-    escaped_text_content = html.escape(text_content)
+def encode_cursor(timestamp, row_id):
+    """Opaque cursor pointing just after the row with this (timestamp, id)."""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
 
-    # Regex to find patterns: 
-    # 1. &username.soundname (Groups 1 and 2)
-    # 2. &soundname (Group 3)
-    # Ensures names start with alphanumeric/underscore, allows hyphens within.
-    ampersand_pattern = r"&([a-zA-Z0-9_][a-zA-Z0-9_-]*)\.([a-zA-Z0-9_][a-zA-Z0-9_-]+)|&([a-zA-Z0-9_][a-zA-Z0-9_-]+)"
+def decode_cursor(cursor):
+    """Returns (timestamp, id) from encode_cursor(); raises ValueError if malformed."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+def keyset_page(query, timestamp_column, id_column, cursor, limit, newest_first):
+    """
+    Applies cursor, ordering and limit to `query` and runs it.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        cursor_timestamp, cursor_id = decode_cursor(cursor)
+        if newest_first:
+            query = query.filter(or_(timestamp_column < cursor_timestamp, and_(timestamp_column == cursor_timestamp, id_column < cursor_id)))
+        else:
+            query = query.filter(or_(timestamp_column > cursor_timestamp, and_(timestamp_column == cursor_timestamp, id_column > cursor_id)))
+    if newest_first:
+        query = query.order_by(timestamp_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(timestamp_column.asc(), id_column.asc())
 
-    def replace_tag(match):
-        # The matched tag (e.g., &user.sound) is already HTML-escaped from the initial step.
-        original_escaped_tag = match.group(0)
+    rows = query.limit(limit + 1).all() # One extra row tells us whether another page exists
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
 
-        target_username_unescaped = match.group(1) # Username if &user.sound format (from original, unescaped input via regex groups)
-        sound_name_for_user_unescaped = match.group(2) # Soundname if &user.sound format (from original, unescaped input via regex groups)
-        single_sound_name_unescaped = match.group(3) # Soundname if &sound format (from original, unescaped input via regex groups)
+# Ampersound tags:
+# 1. &username.soundname (Groups 1 and 2)
+# 2. &soundname (Group 3)
+# Ensures names start with alphanumeric/underscore, allows hyphens within.
+AMPERSAND_PATTERN = re.compile(r"&([a-zA-Z0-9_][a-zA-Z0-9_-]*)\.([a-zA-Z0-9_][a-zA-Z0-9_-]+)|&([a-zA-Z0-9_][a-zA-Z0-9_-]+)")
 
-        ampersound_entry = None
-        db_owner_username = None # Username fetched from DB (trusted)
-        db_resolved_sound_name = None # Sound name fetched from DB or validated against DB (trusted)
+def _tag_key(match):
+    # (username, soundname) for &username.soundname, (None, soundname) for &soundname
+    if match.group(1):
+        return (match.group(1), match.group(2))
+    return (None, match.group(3))
 
-        if target_username_unescaped and sound_name_for_user_unescaped:
-            # Case 1: &username.soundname specified
-            ampersound_entry = Ampersound.query.join(User).filter(
-                User.username == target_username_unescaped,
-                Ampersound.name == sound_name_for_user_unescaped
-            ).first()
-            if ampersound_entry:
-                db_owner_username = ampersound_entry.user.username # From DB
-                db_resolved_sound_name = ampersound_entry.name # From DB
-        
-        elif single_sound_name_unescaped:
-            # Case 2: &soundname specified, check for uniqueness
-            query = Ampersound.query.filter(Ampersound.name == single_sound_name_unescaped)
-            count = query.count()
+def resolve_ampersound_tags(texts):
+    """
+    Resolves every ampersound tag found in `texts` with at most two queries, however
+    many texts and tags there are. Returns {tag_key: (owner_username, sound_name)} for
+    the tags that resolve; pass it to format_text_with_ampersounds when rendering a list.
+    """
+    pairs = set()
+    single_names = set()
+    for text in texts:
+        if not text:
+            continue
+        for match in AMPERSAND_PATTERN.finditer(text):
+            username, sound_name = _tag_key(match)
+            if username:
+                pairs.add((username, sound_name))
+            else:
+                single_names.add(sound_name)
 
+    resolved = {}
+    if pairs:
+        rows = db.session.query(User.username, Ampersound.name).join(User, Ampersound.user_id == User.id).filter(
+            tuple_(User.username, Ampersound.name).in_(list(pairs))
+        ).all()
+        for username, sound_name in rows:
+            resolved[(username, sound_name)] = (username, sound_name)
+    if single_names:
+        # &soundname only resolves if the name is globally unique
+        rows = db.session.query(Ampersound.name, func.count(Ampersound.id), func.min(User.username)).join(
+            User, Ampersound.user_id == User.id
+        ).filter(Ampersound.name.in_(single_names)).group_by(Ampersound.name).all()
+        for sound_name, count, owner_username in rows:
             if count == 1:
-                # Globally unique sound name found
-                ampersound_entry = query.options(joinedload(Ampersound.user)).first() # Eager load owner
-                if ampersound_entry and ampersound_entry.user:
-                     db_owner_username = ampersound_entry.user.username # From DB
-                     db_resolved_sound_name = ampersound_entry.name # From DB
-            # else: (count is 0 or > 1) - Ambiguous or not found, leave as text
+                resolved[(None, sound_name)] = (owner_username, sound_name)
+    return resolved
 
-        # If we found a valid, resolvable ampersound entry
-        if ampersound_entry and db_owner_username and db_resolved_sound_name:
+def format_text_with_ampersounds(text_content, author_username, resolved_tags=None):
+    # author_username is the author of the post/comment containing the text,
+    # used potentially for context later, but not directly for resolving tags now.
+    # resolved_tags: result of resolve_ampersound_tags() covering this text; looked up here if omitted.
+    if not text_content:
+        return text_content
+
+    if resolved_tags is None:
+        resolved_tags = resolve_ampersound_tags([text_content])
+
+    # Tags are matched on the original text (escaping would turn "&" into "&amp;" first);
+    # every piece is HTML-escaped on output, so nothing from the input reaches the page unescaped.
+    parts = []
+    position = 0
+    for match in AMPERSAND_PATTERN.finditer(text_content):
+        parts.append(html.escape(text_content[position:match.start()]))
+        escaped_tag = html.escape(match.group(0))
+        resolved = resolved_tags.get(_tag_key(match))
+
+        # If we found a valid, resolvable ampersound entry (owner and name come from the DB)
+        if resolved:
+            db_owner_username, db_resolved_sound_name = resolved
             # Escape the database values before putting them into HTML attributes
             attr_owner_username = html.escape(db_owner_username, quote=True)
             attr_resolved_sound_name = html.escape(db_resolved_sound_name, quote=True)
-            
-            # The content of the span is original_escaped_tag, which is already safe.
-            return f'<span class="ampersound-tag" data-username="{attr_owner_username}" data-soundname="{attr_resolved_sound_name}">{original_escaped_tag}</span>'
+            parts.append(f'<span class="ampersound-tag" data-username="{attr_owner_username}" data-soundname="{attr_resolved_sound_name}">{escaped_tag}</span>')
         else:
-            # Not found, ambiguous, or invalid format - return the original *escaped* matched text
-            return original_escaped_tag 
-
-    # Perform substitution on the fully escaped content
-    return re.sub(ampersand_pattern, replace_tag, escaped_text_content)
\ No newline at end of file
+            # Not found, ambiguous, or invalid format - keep the escaped text
+            parts.append(escaped_tag)
+        position = match.end()
+    parts.append(html.escape(text_content[position:]))
+    return ''.join(parts)